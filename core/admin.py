@@ -1,17 +1,181 @@
 from django.contrib import admin
-from .models import Profile, Listing, Booking
+from django.contrib.auth.models import User
+from django.db.models import Q
+from django.urls import reverse
+from django.utils.html import format_html
+
+from .bookings import approve_bookings, decline_bookings
+from .gallery import set_cover
+from .images import VARIANTS, variant_url
+from .models import Profile, Listing, ListingImage, Booking, Job
+from .pagination import EstimatedCountPaginator
+from .search import keyword_search
+from .stats import refresh_listing_stats
+
+# Admin search resolves to at most this many listings (best ranked first).
+SEARCH_LISTING_LIMIT = 500
+
+
+def _search_ids(queryset, term):
+    """Listing ids matching `term` in the full-text index, and ids of users named exactly `term`.
+
+    Admin search runs on these instead of icontains, which scans every row.
+    """
+    listings = keyword_search(Listing.objects.using(queryset.db), term)
+    listing_ids = list(listings.order_by("-search_rank").values_list("pk", flat=True)[:SEARCH_LISTING_LIMIT])
+    user_ids = list(User.objects.using(queryset.db).filter(username=term).values_list("pk", flat=True))
+    return listing_ids, user_ids
+
+
+def _pk_term(term):
+    return int(term) if term.isdigit() and len(term) < 19 else None
+
 
 @admin.register(Profile)
 class ProfileAdmin(admin.ModelAdmin):
     list_display = ("user", "role")
+    list_select_related = ("user",)
+    autocomplete_fields = ("user",)
+    list_filter = ("role",)
+    search_fields = ("=user__username",)
+
+
+class ListingImageInline(admin.TabularInline):
+    model = ListingImage
+    fields = ("preview", "image", "is_cover", "sort_order")
+    readonly_fields = ("preview",)
+    extra = 0
+
+    def get_queryset(self, request):
+        # each row's label is "Image for <listing title>"
+        return super().get_queryset(request).select_related("listing")
+
+    @admin.display(description="Preview")
+    def preview(self, obj):
+        url = obj.image and variant_url(obj.image, VARIANTS["thumb"])
+        return format_html('<img src="{}" width="120" alt="">', url) if url else "-"
+
 
 @admin.register(Listing)
 class ListingAdmin(admin.ModelAdmin):
-    list_display = ("title", "city", "host", "price_per_night", "created_at")
-    search_fields = ("title", "city", "host__username")
-    
+    list_display = ("title", "city", "host", "price_per_night", "created_at", "bookings")
+    list_select_related = ("host",)
+    autocomplete_fields = ("host",)
+    search_fields = ("title", "city", "host__username")  # see get_search_results
+    ordering = ("-id",)
+    inlines = [ListingImageInline]
+    actions = ["refresh_stats"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        listing_ids, user_ids = _search_ids(queryset, term)
+        condition = Q(pk__in=listing_ids) | Q(host_id__in=user_ids)
+        pk = _pk_term(term)
+        if pk is not None:
+            condition |= Q(pk=pk)
+        return queryset.filter(condition), False
+
+    @admin.display(description="Bookings")
+    def bookings(self, obj):
+        # scoped to one listing, the booking filters run on its (listing, status, check_in, check_out) index
+        url = reverse("admin:core_booking_changelist") + f"?listing__id__exact={obj.pk}"
+        return format_html('<a href="{}">Bookings</a>', url)
+
+    @admin.action(description="Recompute dashboard counters", permissions=["change"])
+    def refresh_stats(self, request, queryset):
+        refreshed = refresh_listing_stats(list(queryset.values_list("pk", flat=True)))
+        self.message_user(request, f"Recomputed counters for {len(refreshed)} listing(s).")
+
+
+@admin.register(ListingImage)
+class ListingImageAdmin(admin.ModelAdmin):
+    list_display = ("id", "listing", "is_cover", "sort_order", "created_at")
+    list_select_related = ("listing",)
+    autocomplete_fields = ("listing",)
+    list_filter = ("is_cover",)
+    search_fields = ("=listing__id",)
+    ordering = ("-id",)
+    actions = ["make_cover"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @admin.action(description="Make cover of its listing", permissions=["change"])
+    def make_cover(self, request, queryset):
+        # one cover per listing: the first selected image in gallery order
+        covers = {}
+        for image in queryset.select_related("listing").order_by("sort_order", "id"):
+            covers.setdefault(image.listing_id, image)
+        for image in covers.values():
+            set_cover(image.listing, image.pk)
+        self.message_user(request, f"Updated the cover of {len(covers)} listing(s).")
+
+
+def _by_host(queryset):
+    """[(host, [booking ids])] for the selected bookings; the booking services act per host."""
+    groups = {}
+    for pk, host_id in queryset.values_list("pk", "listing__host_id"):
+        groups.setdefault(host_id, []).append(pk)
+    hosts = User.objects.in_bulk(groups)
+    return [(hosts[host_id], ids) for host_id, ids in groups.items()]
+
+
 @admin.register(Booking)
 class BookingAdmin(admin.ModelAdmin):
     list_display = ("listing", "guest", "check_in", "check_out", "status", "created_at")
     list_filter = ("status",)
-    search_fields = ("listing__title", "guest__username")
+    list_select_related = ("listing", "guest")
+    autocomplete_fields = ("listing", "guest")
+    date_hierarchy = "check_in"
+    search_fields = ("listing__title", "guest__username")  # see get_search_results
+    ordering = ("-id",)  # newest first along the primary key; -created_at would sort every row
+    actions = ["approve", "decline"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_readonly_fields(self, request, obj=None):
+        # status changes go through the actions, which keep booked nights,
+        # counters and notifications consistent and settle overlaps; an
+        # approved stay holds its booked nights, so it cannot be moved either
+        if obj is not None and obj.status == Booking.Status.APPROVED:
+            return ("status", "listing", "check_in", "check_out")
+        return ("status",)
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if not term:
+            return queryset, False
+        listing_ids, user_ids = _search_ids(queryset, term)
+        condition = Q(listing_id__in=listing_ids) | Q(guest_id__in=user_ids)
+        pk = _pk_term(term)
+        if pk is not None:
+            condition |= Q(pk=pk)
+        return queryset.filter(condition), False
+
+    @admin.action(description="Approve selected pending bookings", permissions=["change"])
+    def approve(self, request, queryset):
+        approved, declined = [], []
+        for host, ids in _by_host(queryset):
+            host_approved, host_declined = approve_bookings(host, ids)
+            approved += host_approved
+            declined += host_declined
+        self.message_user(request, f"Approved {len(approved)} booking(s); declined {len(declined)} overlapping request(s).")
+
+    @admin.action(description="Decline selected bookings", permissions=["change"])
+    def decline(self, request, queryset):
+        declined = []
+        for host, ids in _by_host(queryset):
+            declined += decline_bookings(host, ids)
+        self.message_user(request, f"Declined {len(declined)} booking(s).")
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ("task", "status", "attempts", "run_at", "locked_by", "created_at")
+    list_filter = ("status",)
+    search_fields = ("task",)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
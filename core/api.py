@@ -0,0 +1,251 @@
+"""Read-only JSON API over listings.
+
+Rows are fetched with .values() (no model instances), bodies use compact JSON
+and every endpoint answers conditional GETs without rendering the body: the
+detail ETag and Last-Modified come from the listing's updated_at (which
+gallery changes advance too), the feed ETag from the search generation in the
+shared cache (core.caching, bumped on commit of any change to search results)
+and the availability ETag from the blocked ranges themselves. Where a delete
+or the passing of a day can change a response without leaving a timestamp
+behind, there is no Last-Modified. A client revalidating an unchanged
+resource gets an empty 304.
+"""
+import hashlib
+import math
+from datetime import date, datetime, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import OuterRef, Subquery
+from django.http import Http404, JsonResponse
+from django.urls import reverse
+from django.views.decorators.http import condition, require_safe
+
+from .availability import blocked_nights, blocked_ranges
+from .caching import cache_anonymous_response, search_generation
+from .images import VARIANTS, variant_url
+from .models import Listing, ListingImage
+from .pagination import KeysetPaginator
+from .routers import read_from_replica
+from .search import DATE_FMT, search_keys, search_listings
+from .transfer import chunked, streaming_response
+
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+AVAILABILITY_DAYS = 90
+AVAILABILITY_MAX_DAYS = 366
+STREAM_CHUNK_SIZE = 500
+
+SUMMARY_FIELDS = ('id', 'title', 'city', 'price_per_night', 'capacity', 'created_at', 'image', 'image_url',
+                  'latitude', 'longitude')
+DETAIL_FIELDS = SUMMARY_FIELDS + ('description', 'address', 'updated_at', 'host__username')
+
+_COMPACT = {'separators': (',', ':')}
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, json_dumps_params=_COMPACT)
+
+
+def _etag(*parts):
+    return hashlib.md5('|'.join(str(p) for p in parts).encode()).hexdigest()
+
+
+def _thumb(row):
+    # same precedence as the card template: gallery cover, legacy upload, legacy URL
+    image = row.get('cover') or row.get('image')
+    if image:
+        return variant_url(image, VARIANTS['thumb']) or None
+    return row.get('image_url') or None
+
+
+def _summary(row):
+    data = {
+        'id': row['id'],
+        'title': row['title'],
+        'city': row['city'],
+        'price_per_night': str(row['price_per_night']),
+        'capacity': row['capacity'],
+        'location': [row['latitude'], row['longitude']] if row['latitude'] is not None else None,
+        'thumb': _thumb(row),
+        'url': reverse('listing_detail', args=[row['id']]),
+    }
+    if row.get('distance_sq') is not None:
+        data['distance_km'] = round(math.sqrt(row['distance_sq']), 2)
+    return data
+
+
+def _feed_fields(keys, listings):
+    # keyset cursors are encoded from the row, so the sort keys must be selected
+    fields = SUMMARY_FIELDS + tuple(k.lstrip('-') for k in keys if k.lstrip('-') not in SUMMARY_FIELDS)
+    if 'distance_sq' in listings.query.annotations and 'distance_sq' not in fields:
+        fields += ('distance_sq',)
+    return fields + ('cover',)
+
+
+def _with_cover(listings):
+    cover = ListingImage.objects.filter(listing=OuterRef('pk')).order_by('-is_cover', 'sort_order', '-created_at')
+    return listings.annotate(cover=Subquery(cover.values('image')[:1]))
+
+
+# Feed
+
+def _feed_etag(request):
+    # one cache read: the generation moves whenever a search result may have changed
+    return _etag(request.get_full_path(), search_generation())
+
+
+def _page_size(params):
+    try:
+        return max(1, min(int(params.get('limit', API_PAGE_SIZE)), API_MAX_PAGE_SIZE))
+    except ValueError:
+        return API_PAGE_SIZE
+
+
+def _stream_feed(rows):
+    encoder = DjangoJSONEncoder(**_COMPACT)
+    yield from chunked(encoder.encode(_summary(row)) + '\n' for row in rows.iterator(chunk_size=STREAM_CHUNK_SIZE))
+
+
+@read_from_replica
+@require_safe
+@condition(etag_func=_feed_etag)
+@cache_anonymous_response
+def listings_feed(request):
+    """Search results as JSON; accepts the `home` filters plus `cursor` and `limit`.
+
+    `?format=ndjson` streams every match, one listing per line, without paging.
+    """
+    keys = search_keys(request.GET)
+    listings = search_listings(request.GET)
+    rows = _with_cover(listings).values(*_feed_fields(keys, listings))
+    if request.GET.get('format') == 'ndjson':
+        # rows are read while the response streams, after read_from_replica
+        # has returned, so fix the database now
+        return streaming_response(request, _stream_feed(rows.order_by(*keys).using(rows.db)), 'application/x-ndjson')
+    paginator = KeysetPaginator(rows, _page_size(request.GET), keys)
+    page_obj = paginator.get_page(request.GET.get('cursor'))
+    return _json({
+        'results': [_summary(row) for row in page_obj],
+        'next': page_obj.next_cursor,
+    })
+
+
+# Detail
+
+def _detail_stamps(request, pk):
+    if not hasattr(request, '_api_stamps'):
+        row = Listing.objects.filter(pk=pk).values_list('updated_at', 'host__username').first()
+        if row is None:
+            raise Http404('No such listing.')
+        request._api_stamps = row
+    return request._api_stamps
+
+
+def _detail_etag(request, pk):
+    return _etag(pk, *_detail_stamps(request, pk))
+
+
+def _detail_last_modified(request, pk):
+    # covers the listing and its gallery; a renamed host only changes the ETag
+    return _detail_stamps(request, pk)[0]
+
+
+def _detail_row(pk):
+    return _with_cover(Listing.objects.filter(pk=pk)).values(*DETAIL_FIELDS, 'cover')
+
+
+def _detail_images(pk):
+    return ListingImage.objects.filter(listing_id=pk).values('id', 'image', 'is_cover')
+
+
+def _detail(row, images):
+    pk = row['id']
+    data = _summary(row)
+    data.update({
+        'description': row['description'],
+        'address': row['address'],
+        'host': row['host__username'],
+        'created_at': row['created_at'],
+        'updated_at': row['updated_at'],
+        'images': [
+            {
+                'id': img['id'],
+                'is_cover': img['is_cover'],
+                'thumb': variant_url(img['image'], VARIANTS['thumb']) or None,
+                'full': variant_url(img['image'], VARIANTS['full']) or None,
+            }
+            for img in images
+        ],
+        'availability': reverse('api_listing_availability', args=[pk]),
+    })
+    return data
+
+
+@read_from_replica
+@require_safe
+@condition(etag_func=_detail_etag, last_modified_func=_detail_last_modified)
+def listing_detail(request, pk):
+    row = _detail_row(pk).first()
+    if row is None:
+        raise Http404('No such listing.')
+    return _json(_detail(row, _detail_images(pk)))
+
+
+# Availability
+
+def _availability_window(params):
+    """(start, end) from `from`/`to` (YYYY-MM-DD); defaults to the next AVAILABILITY_DAYS days."""
+    try:
+        start = datetime.strptime(params['from'], DATE_FMT).date() if params.get('from') else date.today()
+        end = (datetime.strptime(params['to'], DATE_FMT).date() if params.get('to')
+               else start + timedelta(days=AVAILABILITY_DAYS))
+    except ValueError:
+        return None, None
+    if start >= end or (end - start).days > AVAILABILITY_MAX_DAYS:
+        return None, None
+    return start, end
+
+
+def _availability_ranges(request, pk, start, end):
+    if not hasattr(request, '_api_ranges'):
+        if not Listing.objects.filter(pk=pk).exists():
+            raise Http404('No such listing.')
+        request._api_ranges = blocked_ranges(pk, start, end)
+    return request._api_ranges
+
+
+def _availability_etag(request, pk):
+    # tagged by content: cancelled stays leave no timestamp, and the default
+    # window moves with the date
+    start, end = _availability_window(request.GET)
+    if start is None:
+        return None
+    return _etag(pk, start, end, *_availability_ranges(request, pk, start, end))
+
+
+def _bad_window():
+    return _json({'error': f'Use from/to as YYYY-MM-DD, at most {AVAILABILITY_MAX_DAYS} days apart.'}, status=400)
+
+
+def _availability(pk, start, end, ranges):
+    calendar = {}
+    for night in sorted(blocked_nights(ranges, start, end)):
+        calendar.setdefault(night.strftime('%Y-%m'), []).append(night.day)
+    return {
+        'listing': pk,
+        'from': start,
+        'to': end,
+        'blocked': [[check_in, check_out] for check_in, check_out in ranges],
+        'calendar': calendar,
+    }
+
+
+@read_from_replica
+@require_safe
+@condition(etag_func=_availability_etag)
+def listing_availability(request, pk):
+    """Booked nights in [from, to): merged [check_in, check_out) ranges plus a per-month calendar."""
+    start, end = _availability_window(request.GET)
+    if start is None:
+        return _bad_window()
+    return _json(_availability(pk, start, end, _availability_ranges(request, pk, start, end)))
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        # connect cache invalidation, gallery, geocoding, listing stats and upload receivers
+        from . import availability, caching, facets, gallery, geo, stats, uploads  # noqa: F401
@@ -0,0 +1,180 @@
+"""Async versions of the read-heavy views, served instead of the sync ones when
+ASYNC_VIEWS is on (the ASGI deployment, see render.yaml).
+
+Queries use the async ORM and cache lookups the cache's async API, so while a
+request waits on the database or cache the worker's event loop serves others.
+Helpers that run raw SQL (keyword search, facets, blocked ranges) and template
+rendering, which still touches the session and fragment cache synchronously,
+are handed to a thread with sync_to_async. Writes (booking POSTs) are
+delegated to the sync views unchanged.
+"""
+import datetime
+from datetime import date
+from functools import partial, wraps
+
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import render
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from . import views
+from .api import (
+    STREAM_CHUNK_SIZE, _COMPACT, _availability, _availability_etag, _availability_ranges, _availability_window,
+    _bad_window, _detail, _detail_etag, _detail_images, _detail_last_modified, _detail_row, _feed_etag,
+    _feed_fields, _json, _page_size, _summary, _with_cover,
+)
+from .availability import availability_calendar
+from .caching import aattach_cache_versions, alisting_versions, cache_anonymous_response
+from .facets import city_facets
+from .forms import BookingForm, ListingImageUploadForm
+from .models import Listing
+from .pagination import KeysetPaginator
+from .routers import read_from_replica
+from .search import PLACE_NAMES, RADIUS_CHOICES, geo_radius, search_keys, search_listings
+from .uploads import upload_status
+
+_render = sync_to_async(render)
+
+
+def async_condition(etag_func, last_modified_func=None):
+    """`condition` for async views; the (sync, querying) tag functions share one thread hop."""
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            def tags():
+                last_modified = last_modified_func(request, *args, **kwargs) if last_modified_func else None
+                return etag_func(request, *args, **kwargs), last_modified
+            etag, last_modified = await sync_to_async(tags)()
+            etag = quote_etag(etag) if etag is not None else None
+            if last_modified is not None:
+                if timezone.is_naive(last_modified):
+                    last_modified = timezone.make_aware(last_modified, datetime.timezone.utc)
+                last_modified = int(last_modified.timestamp())
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if last_modified and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return inner
+    return decorator
+
+
+# Pages
+
+@read_from_replica
+@cache_anonymous_response
+async def home(request):
+    params = request.GET
+    try:
+        listings = await sync_to_async(search_listings)(params)
+        # galleries are loaded by {% listing_cards %}, only for cards it has to render
+        listings = listings.select_related('host')
+        page_obj = await KeysetPaginator(listings, views.PAGE_SIZE, search_keys(params)).aget_page(params.get('cursor'))
+        cities = await sync_to_async(city_facets)()
+    except Exception:
+        # same fallback as views.home
+        return await sync_to_async(views.home.__wrapped__)(request)
+
+    next_query = ''
+    query = params.copy()
+    query.pop('cursor', None)
+    first_query = query.urlencode()
+    if page_obj.has_next:
+        query['cursor'] = page_obj.next_cursor
+        next_query = query.urlencode()
+
+    request.user = await request.auser()
+    return await _render(request, 'core/home.html', {
+        'listings': await aattach_cache_versions(page_obj.object_list),
+        'page_obj': page_obj,
+        'next_query': next_query,
+        'first_query': first_query,
+        'cities': cities,
+        'destination': params.get('destination', '').strip(),
+        'check_in': params.get('check_in', '').strip(),
+        'check_out': params.get('check_out', '').strip(),
+        'guests': params.get('guests', '').strip(),
+        'q': params.get('q', '').strip(),
+        'near': params.get('near', '').strip(),
+        'radius': geo_radius(params),
+        'radius_choices': RADIUS_CHOICES,
+        'places': PLACE_NAMES,
+        'bbox': params.get('bbox', '').strip(),
+    })
+
+
+@read_from_replica
+async def listing_detail(request, pk):
+    if request.method != 'GET':
+        return await sync_to_async(views.listing_detail)(request, pk)
+    try:
+        listing = await Listing.objects.aget(pk=pk)
+    except Listing.DoesNotExist:
+        raise Http404('No Listing matches the given query.')
+    listing.cache_version = (await alisting_versions([listing.pk]))[listing.pk]
+    user = request.user = await request.auser()
+    return await _render(request, 'core/listing_detail.html', {
+        'listing': listing,
+        'form': BookingForm(),
+        'image_form': ListingImageUploadForm(),
+        'is_host': user.is_authenticated and listing.host_id == user.id,
+        'availability': partial(availability_calendar, listing.pk),
+        'today': date.today(),
+        'uploads': partial(upload_status, listing.pk),  # host only
+    })
+
+
+# JSON API (response shapes and conditional-GET tags are shared with core.api)
+
+async def _stream_feed(rows):
+    encoder = DjangoJSONEncoder(**_COMPACT)
+    async for row in rows.aiterator(chunk_size=STREAM_CHUNK_SIZE):
+        yield encoder.encode(_summary(row)) + '\n'
+
+
+@read_from_replica
+@require_safe
+@async_condition(_feed_etag)
+@cache_anonymous_response
+async def listings_feed(request):
+    keys = search_keys(request.GET)
+    listings = await sync_to_async(search_listings)(request.GET)
+    rows = _with_cover(listings).values(*_feed_fields(keys, listings))
+    if request.GET.get('format') == 'ndjson':
+        # read while streaming, after read_from_replica has returned
+        return StreamingHttpResponse(_stream_feed(rows.order_by(*keys).using(rows.db)),
+                                     content_type='application/x-ndjson')
+    page_obj = await KeysetPaginator(rows, _page_size(request.GET), keys).aget_page(request.GET.get('cursor'))
+    return _json({
+        'results': [_summary(row) for row in page_obj],
+        'next': page_obj.next_cursor,
+    })
+
+
+@read_from_replica
+@require_safe
+@async_condition(_detail_etag, _detail_last_modified)
+async def api_listing_detail(request, pk):
+    row = await _detail_row(pk).afirst()
+    if row is None:
+        raise Http404('No such listing.')
+    return _json(_detail(row, [img async for img in _detail_images(pk)]))
+
+
+@read_from_replica
+@require_safe
+@async_condition(_availability_etag)
+async def api_listing_availability(request, pk):
+    start, end = _availability_window(request.GET)
+    if start is None:
+        return _bad_window()
+    ranges = await sync_to_async(_availability_ranges)(request, pk, start, end)
+    return _json(_availability(pk, start, end, ranges))
@@ -0,0 +1,120 @@
+import calendar
+from datetime import date, timedelta
+from functools import partial
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Booking
+
+# Merged approved stays per listing for the calendar window (this month plus
+# the next CALENDAR_MONTHS - 1), cached until a booking on the listing is
+# approved, declined or deleted. The set-based paths in core.bookings use
+# update(), which sends no signals, so they call invalidate_blocked_ranges.
+# The entry is dropped once the change commits, and a reader in between can
+# re-cache the old ranges, so they are for display: booking requests are
+# checked against BookedNight when they are written.
+CALENDAR_MONTHS = 12
+CACHE_TIMEOUT = 60 * 60 * 24
+
+_KEY = 'blocked-ranges:{}'
+
+
+def calendar_window(today=None, months=CALENDAR_MONTHS):
+    """[first day of this month, first day of the month `months` later)."""
+    start = (today or date.today()).replace(day=1)
+    year, month = divmod(start.month - 1 + months, 12)
+    return start, date(start.year + year, month + 1, 1)
+
+
+def _merge(stays):
+    # stays sorted by check_in; back-to-back stays collapse into one range
+    merged = []
+    for check_in, check_out in stays:
+        if merged and check_in <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], check_out)
+        else:
+            merged.append([check_in, check_out])
+    return [tuple(r) for r in merged]
+
+
+def _query(listing_id, start, end):
+    # from the primary: the cached ranges must not start out behind a replica
+    return _merge(Booking.objects.using(DEFAULT_DB_ALIAS)
+                  .filter(listing_id=listing_id, status=Booking.Status.APPROVED,
+                          check_in__lt=end, check_out__gt=start)
+                  .order_by('check_in')
+                  .values_list('check_in', 'check_out'))
+
+
+def blocked_ranges(listing_id, start=None, end=None):
+    """Merged [check_in, check_out) ranges of approved stays overlapping [start, end).
+
+    Defaults to the calendar window, which is served from the cache; a window
+    inside it is filtered from the cached ranges, anything else is one query.
+    """
+    window = calendar_window()
+    if start is None:
+        start, end = window
+    if not (window[0] <= start and end <= window[1]):
+        return _query(listing_id, start, end)
+    key = _KEY.format(listing_id)
+    cached = cache.get(key)
+    if cached is None or cached[0] != window:
+        cached = (window, _query(listing_id, *window))
+        cache.set(key, cached, CACHE_TIMEOUT)
+    return [(a, b) for a, b in cached[1] if a < end and b > start]
+
+
+def invalidate_blocked_ranges(listing_id):
+    transaction.on_commit(partial(cache.delete, _KEY.format(listing_id)))
+
+
+def blocked_nights(ranges, start, end):
+    """Set of booked nights from `ranges`, limited to [start, end)."""
+    nights = set()
+    for check_in, check_out in ranges:
+        day = max(check_in, start)
+        while day < min(check_out, end):
+            nights.add(day)
+            day += timedelta(days=1)
+    return nights
+
+
+def availability_calendar(listing_id, today=None):
+    """Month grids for core/includes/availability_calendar.html, plus the ranges they show."""
+    today = today or date.today()
+    start, end = calendar_window(today)
+    ranges = blocked_ranges(listing_id)
+    taken = blocked_nights(ranges, start, end)
+    months = []
+    day = start
+    while day < end:
+        weeks = [
+            [
+                {'date': d, 'blocked': d in taken, 'past': d < today} if d.month == day.month else None
+                for d in week
+            ]
+            for week in calendar.Calendar().monthdatescalendar(day.year, day.month)
+        ]
+        months.append({'month': day, 'weeks': weeks})
+        day = calendar_window(day, 1)[1]
+    return {
+        'months': months,
+        'blocked': [[a.isoformat(), b.isoformat()] for a, b in ranges],
+    }
+
+
+@receiver(post_save, sender=Booking)
+def _booking_saved(sender, instance, created, raw=False, **kwargs):
+    # a new request stays pending and blocks nothing
+    if raw or (created and instance.status == Booking.Status.PENDING):
+        return
+    invalidate_blocked_ranges(instance.listing_id)
+
+
+@receiver(post_delete, sender=Booking)
+def _booking_deleted(sender, instance, **kwargs):
+    invalidate_blocked_ranges(instance.listing_id)
@@ -0,0 +1,20 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+UserModel = get_user_model()
+
+
+class ProfileBackend(ModelBackend):
+    """ModelBackend that loads the session user together with their profile.
+
+    Host checks in the views and the navbar in base.html read
+    `user.profile.role` on most pages; with the join that is one query per
+    request instead of two.
+    """
+
+    def get_user(self, user_id):
+        try:
+            user = UserModel._default_manager.select_related('profile').get(pk=user_id)
+        except UserModel.DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
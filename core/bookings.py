@@ -0,0 +1,112 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Min, Q
+from django.utils import timezone
+
+from .availability import invalidate_blocked_ranges
+from .caching import bump_listing_version
+from .jobs import enqueue_many
+from .models import BookedNight, Booking
+from .stats import refresh_listing_stats
+from .tasks import notify_booking_status
+
+
+def _overlaps(bookings):
+    condition = Q()
+    for b in bookings:
+        condition |= Q(listing_id=b.listing_id, check_in__lt=b.check_out, check_out__gt=b.check_in)
+    return condition
+
+
+def _touched(bookings, booked_nights_changed):
+    # search results only change where approved nights were taken or released
+    for listing_id in {b.listing_id for b in bookings}:
+        bump_listing_version(listing_id, search=listing_id in booked_nights_changed)
+        invalidate_blocked_ranges(listing_id)
+
+
+class _Changed(Exception):
+    """A booking's status changed between reading and approving it."""
+
+
+def _approve_if_pending(booking):
+    with transaction.atomic():
+        current = Booking.objects.select_for_update().filter(pk=booking.pk, status=Booking.Status.PENDING).first()
+        return current is not None and current.approve()
+
+
+def approve_bookings(host, booking_ids):
+    """Approve the host's pending `booking_ids`, oldest request first.
+
+    Overlaps are resolved in memory against one query for the nights already
+    taken; requests that collide with those (or with an earlier request in the
+    batch) are left pending, then every pending request overlapping a newly
+    approved stay is declined. Returns (approved, declined) lists of ids.
+    """
+    pending = list(Booking.objects
+                   .filter(pk__in=booking_ids, listing__host=host, status=Booking.Status.PENDING)
+                   .order_by('created_at', 'id'))
+    if not pending:
+        return [], []
+    span = Booking.objects.filter(pk__in=[b.pk for b in pending]).aggregate(start=Min('check_in'), end=Max('check_out'))
+    taken = set(BookedNight.objects
+                .filter(listing_id__in={b.listing_id for b in pending}, night__gte=span['start'], night__lt=span['end'])
+                .values_list('listing_id', 'night'))
+
+    accepted, nights = [], []
+    for booking in pending:
+        stay = {(booking.listing_id, night) for night in booking.stay_dates()}
+        if stay & taken:
+            continue
+        taken |= stay
+        accepted.append(booking)
+        nights.extend(BookedNight(listing_id=booking.listing_id, booking=booking, night=night)
+                      for _, night in sorted(stay))
+    if not accepted:
+        return [], []
+
+    try:
+        with transaction.atomic():
+            # only rows still pending: one declined since it was read stays declined
+            updated = (Booking.objects.filter(pk__in=[b.pk for b in accepted], status=Booking.Status.PENDING)
+                       .update(status=Booking.Status.APPROVED, updated_at=timezone.now()))
+            if updated != len(accepted):
+                raise _Changed
+            BookedNight.objects.bulk_create(nights)
+            refresh_listing_stats({b.listing_id for b in accepted})
+    except (IntegrityError, _Changed):
+        # a concurrent approval took some of these nights, or a request was
+        # declined meanwhile; settle them one by one
+        accepted = [b for b in accepted if _approve_if_pending(b)]
+    approved_ids = [b.pk for b in accepted]
+
+    declined_ids = []
+    if accepted:
+        with transaction.atomic():
+            declined_ids = list(Booking.objects
+                                .filter(_overlaps(accepted), status=Booking.Status.PENDING)
+                                .exclude(pk__in=approved_ids)
+                                .values_list('pk', flat=True))
+            Booking.objects.filter(pk__in=declined_ids).update(status=Booking.Status.DECLINED, updated_at=timezone.now())
+            refresh_listing_stats({b.listing_id for b in accepted})
+
+    enqueue_many(notify_booking_status, [{'booking_id': pk} for pk in approved_ids + declined_ids])
+    _touched(pending, {b.listing_id for b in accepted})
+    return approved_ids, declined_ids
+
+
+def decline_bookings(host, booking_ids):
+    """Decline the host's `booking_ids` (releasing nights of approved ones); returns the declined ids."""
+    bookings = list(Booking.objects
+                    .filter(pk__in=booking_ids, listing__host=host)
+                    .exclude(status=Booking.Status.DECLINED)
+                    .only('id', 'listing_id', 'status'))
+    ids = [b.pk for b in bookings]
+    if not ids:
+        return []
+    with transaction.atomic():
+        Booking.objects.filter(pk__in=ids).update(status=Booking.Status.DECLINED, updated_at=timezone.now())
+        BookedNight.objects.filter(booking_id__in=ids).delete()
+        refresh_listing_stats({b.listing_id for b in bookings})
+    enqueue_many(notify_booking_status, [{'booking_id': pk} for pk in ids])
+    _touched(bookings, {b.listing_id for b in bookings if b.status == Booking.Status.APPROVED})
+    return ids
@@ -0,0 +1,223 @@
+import hashlib
+import time
+from datetime import timedelta
+from functools import partial, wraps
+
+from asgiref.sync import iscoroutinefunction
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .jobs import enqueue
+from .models import Booking, Listing, ListingImage
+from .routers import REPLICA
+
+# Cache keys embed version numbers instead of being deleted: a save bumps the
+# listing's version (and, if search results can change, the global search
+# generation), so every fragment or response rendered from the old state
+# simply stops being looked up. Bumps
+# land when the saving transaction commits: bumped earlier, a concurrent
+# reader could still see the old rows and cache them under the new version.
+RESPONSE_TIMEOUT = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60 * 5)
+
+_LISTING_KEY = 'listing-version:{}'
+_SEARCH_KEY = 'search-generation'
+MESSAGES_COOKIE = CookieStorage.cookie_name
+
+
+def _fresh_version():
+    # an evicted counter must not restart at a value older fragments used
+    return int(time.time() * 1000)
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _fresh_version(), None)
+
+
+def _bump(key):
+    transaction.on_commit(partial(_incr, key))
+
+
+def listing_versions(ids):
+    """Map listing id -> cache version, creating missing counters."""
+    keys = {_LISTING_KEY.format(pk): pk for pk in ids}
+    found = cache.get_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, None)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+async def alisting_versions(ids):
+    keys = {_LISTING_KEY.format(pk): pk for pk in ids}
+    found = await cache.aget_many(keys)
+    missing = {key: _fresh_version() for key in keys if key not in found}
+    if missing:
+        await cache.aset_many(missing, None)
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def attach_cache_versions(listings):
+    """Set `cache_version` on each listing (for `{% cache ... l.cache_version %}`); returns a list."""
+    listings = list(listings)
+    versions = listing_versions([l.pk for l in listings])
+    for l in listings:
+        l.cache_version = versions[l.pk]
+    return listings
+
+
+async def aattach_cache_versions(listings):
+    listings = list(listings)
+    versions = await alisting_versions([l.pk for l in listings])
+    for l in listings:
+        l.cache_version = versions[l.pk]
+    return listings
+
+
+def bump_listing_version(listing_id, search=True, replica_recheck=True):
+    """Expire the listing's cached fragments, and cached search responses if `search`.
+
+    Pass search=False for changes search results do not show (a pending
+    request, an image behind the cover).
+    """
+    _bump(_LISTING_KEY.format(listing_id))
+    if search:
+        bump_search_generation()
+    if replica_recheck and REPLICA in settings.DATABASES:
+        # readers served by a lagging replica can cache pre-change data under
+        # the new version; bump again once the lag window has passed
+        delay = timedelta(seconds=getattr(settings, 'REPLICA_STICKY_SECONDS', 15))
+        enqueue('core.tasks.expire_replica_reads', run_at=timezone.now() + delay,
+                listing_id=listing_id, search=search)
+
+
+def bump_search_generation():
+    """Expire cached search responses only: for new listings, which have no fragments yet."""
+    _bump(_SEARCH_KEY)
+
+
+def search_generation():
+    generation = cache.get(_SEARCH_KEY)
+    if generation is None:
+        generation = _fresh_version()
+        cache.add(_SEARCH_KEY, generation, None)
+    return generation
+
+
+async def asearch_generation():
+    generation = await cache.aget(_SEARCH_KEY)
+    if generation is None:
+        generation = _fresh_version()
+        await cache.aadd(_SEARCH_KEY, generation, None)
+    return generation
+
+
+def _response_key(view, request, generation):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'response:{view.__name__}:{generation}:{path}'
+
+
+def _cacheable(response, request):
+    return (response.status_code == 200 and not response.streaming and not response.cookies
+            and not len(messages.get_messages(request)))
+
+
+def cache_anonymous_response(view):
+    """Cache GET responses for anonymous visitors, keyed by full path and search generation.
+
+    Every change a search result shows (a listing, its cover image, the nights
+    approved bookings take) bumps the generation, so a cached page never
+    outlives the data it was rendered from (e.g. availability after an approval). Responses carrying flash messages or cookies are not cached.
+    Works on async views too, using the cache's async API.
+    """
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            # pending messages always arrive in the cookie (session storage only
+            # holds the overflow), so this check never loads the session
+            if request.method != 'GET' or MESSAGES_COOKIE in request.COOKIES \
+                    or (await request.auser()).is_authenticated:
+                return await view(request, *args, **kwargs)
+            key = _response_key(view, request, await asearch_generation())
+            cached = await cache.aget(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+            response = await view(request, *args, **kwargs)
+            if _cacheable(response, request):
+                await cache.aset(key, (response.content, response['Content-Type']), RESPONSE_TIMEOUT)
+            return response
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'GET' or request.user.is_authenticated or len(messages.get_messages(request)):
+            return view(request, *args, **kwargs)
+        key = _response_key(view, request, search_generation())
+        cached = cache.get(key)
+        if cached is not None:
+            content, content_type = cached
+            return HttpResponse(content, content_type=content_type)
+        response = view(request, *args, **kwargs)
+        if _cacheable(response, request):
+            cache.set(key, (response.content, response['Content-Type']), RESPONSE_TIMEOUT)
+        return response
+    return wrapper
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def _listing_changed(sender, instance, **kwargs):
+    bump_listing_version(instance.pk)
+
+
+# the fields that decide which image is a listing's cover (see core.api._with_cover)
+_COVER_FIELDS = {'image', 'is_cover', 'sort_order'}
+
+
+def _leads_gallery(image):
+    """Whether `image` is (or, just deleted, was) its listing's cover in search results."""
+    others = ListingImage.objects.filter(listing_id=image.listing_id).exclude(pk=image.pk)
+    if image.is_cover:
+        ahead = Q(is_cover=True, sort_order__lt=image.sort_order)
+    else:
+        ahead = Q(is_cover=True) | Q(sort_order__lt=image.sort_order)
+    return not others.filter(ahead).exists()
+
+
+@receiver(post_save, sender=ListingImage)
+def _image_saved(sender, instance, created, update_fields=None, **kwargs):
+    if created:
+        search = _leads_gallery(instance)
+    else:
+        # the old values are unknown, so any edit that may move the cover counts
+        search = update_fields is None or not _COVER_FIELDS.isdisjoint(update_fields)
+    bump_listing_version(instance.listing_id, search=search)
+
+
+@receiver(post_delete, sender=ListingImage)
+def _image_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Listing):
+        return  # the listing's own receiver bumps
+    bump_listing_version(instance.listing_id, search=_leads_gallery(instance))
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+def _booking_changed(sender, instance, **kwargs):
+    # search filters on approved nights only; pending requests never show
+    approved = Booking.Status.APPROVED
+    bump_listing_version(instance.listing_id, search=approved in (instance.status, instance.saved_status))
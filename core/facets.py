@@ -0,0 +1,45 @@
+import threading
+import time
+
+from django.conf import settings
+from django.db.models import Count, Max, Min
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Listing
+
+# Process-level cache of the search facets shown on `home`. Saves and deletes
+# in this process drop it immediately; the TTL bounds how long other worker
+# processes can keep serving a stale copy.
+FACET_TTL = getattr(settings, 'FACET_CACHE_TTL', 60)
+
+_lock = threading.Lock()
+_facets = None
+_loaded_at = 0.0
+
+
+def city_facets():
+    """Per-city listing count and price range, ordered by city."""
+    global _facets, _loaded_at
+    with _lock:
+        if _facets is None or time.monotonic() - _loaded_at > FACET_TTL:
+            _facets = list(Listing.objects
+                           .values('city')
+                           .annotate(count=Count('id'),
+                                     min_price=Min('price_per_night'),
+                                     max_price=Max('price_per_night'))
+                           .order_by('city'))
+            _loaded_at = time.monotonic()
+        return _facets
+
+
+def invalidate_facets():
+    global _facets
+    with _lock:
+        _facets = None
+
+
+@receiver(post_save, sender=Listing)
+@receiver(post_delete, sender=Listing)
+def _listing_changed(sender, **kwargs):
+    invalidate_facets()
@@ -1,4 +1,7 @@
+import re
+
 from django import forms
+from django.core.validators import URLValidator
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
 from .models import Profile, Listing, Booking, ListingImage
@@ -6,6 +9,15 @@ class MultiFileInput(forms.ClearableFileInput):
     allow_multiple_selected = True
 
 
+class MultiFileField(forms.FileField):
+    def clean(self, data, initial=None):
+        # the widget hands back a list; validate each file on its own
+        single_clean = super().clean
+        if isinstance(data, (list, tuple)):
+            return [single_clean(d, initial) for d in data]
+        return [single_clean(data, initial)]
+
+
 class SignUpForm(UserCreationForm):
     email = forms.EmailField(required=True)
     role = forms.ChoiceField(choices=Profile.Role.choices, initial=Profile.Role.GUEST)
@@ -23,6 +35,13 @@ class ListingForm(forms.ModelForm):
             if img.size > self.MAX_IMAGE_MB * 1024 * 1024:
                 raise forms.ValidationError(f"Image must be <= {self.MAX_IMAGE_MB}MB.")
         return img
+
+    def save(self, commit=True):
+        # a new city/address is geocoded again on save (core.geo)
+        if {'city', 'address'} & set(self.changed_data):
+            self.instance.latitude = self.instance.longitude = None
+        return super().save(commit)
+
     class Meta:
         model = Listing
         fields = ("title", "description", "city", "address", "price_per_night", "capacity", "image")
@@ -36,6 +55,40 @@ class ListingForm(forms.ModelForm):
             "image": forms.ClearableFileInput(attrs={"class": "form-control", "accept": "image/*"}),
         }
 
+class ListingImportForm(forms.ModelForm):
+    """One row of a bulk listing import (core.transfer). Validation runs no queries."""
+    MAX_IMAGES = 10
+    # whitespace- or |-separated; downloaded later by a background job
+    image_urls = forms.CharField(required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["capacity"].required = False
+
+    def clean_capacity(self):
+        return self.cleaned_data.get("capacity") or 1
+
+    def clean_image_urls(self):
+        urls = re.split(r"[\s|]+", self.cleaned_data.get("image_urls", "").strip())
+        urls = [url for url in urls if url]
+        if len(urls) > self.MAX_IMAGES:
+            raise forms.ValidationError(f"At most {self.MAX_IMAGES} images per listing.")
+        validate = URLValidator(schemes=["http", "https"])
+        for url in urls:
+            validate(url)
+        return urls
+
+    def clean(self):
+        cleaned = super().clean()
+        lat, lng = cleaned.get("latitude"), cleaned.get("longitude")
+        if (lat is not None and not -90 <= lat <= 90) or (lng is not None and not -180 <= lng <= 180):
+            raise forms.ValidationError("Latitude/longitude out of range.")
+        return cleaned
+
+    class Meta:
+        model = Listing
+        fields = ("title", "description", "city", "address", "price_per_night", "capacity", "latitude", "longitude")
+
 class DateInput(forms.DateInput):
     input_type = 'date'
 
@@ -59,7 +112,7 @@ class BookingForm(forms.ModelForm):
 
 
 class ListingImageUploadForm(forms.Form):
-    images = forms.FileField(widget=MultiFileInput(attrs={"class": "form-control", "accept": "image/*", "multiple": True}), required=True)
+    images = MultiFileField(widget=MultiFileInput(attrs={"class": "form-control", "accept": "image/*", "multiple": True}), required=True)
     MAX_FILES = 10
     MAX_IMAGE_MB = 5
 
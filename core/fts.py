@@ -0,0 +1,45 @@
+from django.db import migrations
+
+# SQLite keeps core_listing_fts (migration 0007) in sync with triggers on
+# core_listing. The SQLite schema editor rebuilds the table for most ALTERs
+# (AddField, AlterField, ...), which silently drops those triggers, so every
+# migration that alters Listing must end with `restore_listing_fts()` and, to
+# survive being unapplied, start with `restore_listing_fts(on_reverse=True)`.
+
+SQLITE_TRIGGERS = [
+    """
+    CREATE TRIGGER IF NOT EXISTS core_listing_fts_ai AFTER INSERT ON core_listing BEGIN
+        INSERT INTO core_listing_fts(rowid, title, city, description)
+        VALUES (new.id, new.title, new.city, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_listing_fts_ad AFTER DELETE ON core_listing BEGIN
+        INSERT INTO core_listing_fts(core_listing_fts, rowid, title, city, description)
+        VALUES ('delete', old.id, old.title, old.city, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS core_listing_fts_au AFTER UPDATE OF title, city, description ON core_listing BEGIN
+        INSERT INTO core_listing_fts(core_listing_fts, rowid, title, city, description)
+        VALUES ('delete', old.id, old.title, old.city, old.description);
+        INSERT INTO core_listing_fts(rowid, title, city, description)
+        VALUES (new.id, new.title, new.city, new.description);
+    END
+    """,
+    # rows written while the triggers were missing
+    "INSERT INTO core_listing_fts(core_listing_fts) VALUES ('rebuild')",
+]
+
+
+def _reinstall(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in SQLITE_TRIGGERS:
+            schema_editor.execute(sql)
+
+
+def restore_listing_fts(on_reverse=False):
+    """Migration operation recreating the FTS triggers after core_listing was rebuilt."""
+    if on_reverse:
+        return migrations.RunPython(migrations.RunPython.noop, _reinstall)
+    return migrations.RunPython(_reinstall, migrations.RunPython.noop)
@@ -0,0 +1,57 @@
+from django.db import transaction
+from django.db.models import BooleanField, Case, F, PositiveIntegerField, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .caching import bump_listing_version
+from .models import Listing, ListingImage
+
+
+# A listing's updated_at also moves when its gallery changes (images have no
+# timestamp of their own that survives a delete or a bulk UPDATE), so it is
+# the modification time of everything the listing API returns (core.api).
+def touch_listing(listing_id):
+    Listing.objects.filter(pk=listing_id).update(updated_at=timezone.now())
+
+
+def reorder_images(listing, image_ids):
+    """Give `image_ids` sort orders 0..n and make the first the cover, in one UPDATE.
+
+    Returns False without changing anything if the ids are not all images of
+    `listing`. Images left out of `image_ids` keep their order but lose the cover.
+    """
+    if not image_ids or len(set(image_ids)) != len(image_ids):
+        return False
+    images = ListingImage.objects.filter(listing=listing)
+    with transaction.atomic():
+        if images.filter(id__in=image_ids).count() != len(image_ids):
+            return False
+        images.update(
+            sort_order=Case(
+                *[When(id=pk, then=Value(index)) for index, pk in enumerate(image_ids)],
+                default=F('sort_order'), output_field=PositiveIntegerField(),
+            ),
+            is_cover=Case(When(id=image_ids[0], then=Value(True)), default=Value(False), output_field=BooleanField()),
+        )
+        touch_listing(listing.pk)
+    # update() sends no post_save, so invalidate cached cards here
+    bump_listing_version(listing.pk)
+    return True
+
+
+def set_cover(listing, image_id):
+    """Make `image_id` the listing's only cover image with a single UPDATE."""
+    with transaction.atomic():
+        ListingImage.objects.filter(listing=listing).update(
+            is_cover=Case(When(id=image_id, then=Value(True)), default=Value(False), output_field=BooleanField()),
+        )
+        touch_listing(listing.pk)
+    bump_listing_version(listing.pk)
+
+
+@receiver(post_save, sender=ListingImage)
+@receiver(post_delete, sender=ListingImage)
+def _image_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        touch_listing(instance.listing_id)
@@ -0,0 +1,192 @@
+import math
+import re
+import unicodedata
+
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+
+from .models import Listing
+
+# Offline geocoding: coordinates of Egyptian cities, districts and landmarks,
+# matched against a listing's address (most specific first) and then its city.
+# Listings are also bucketed into a lat/lng grid (`geo_cell`) so radius and
+# viewport searches are an indexed IN (...) over a handful of cells on any
+# database, without PostGIS.
+PLACES = {
+    # cities and resorts
+    'Cairo': (30.0444, 31.2357),
+    'Giza': (30.0131, 31.2089),
+    'Alexandria': (31.2001, 29.9187),
+    'Hurghada': (27.2579, 33.8116),
+    'Sharm El Sheikh': (27.9158, 34.3300),
+    'North Coast': (30.8300, 28.9500),
+    'Dahab': (28.5091, 34.5136),
+    'Luxor': (25.6872, 32.6396),
+    'Aswan': (24.0889, 32.8998),
+    'El Gouna': (27.3949, 33.6782),
+    'Marsa Alam': (25.0676, 34.8790),
+    'Port Said': (31.2653, 32.3019),
+    'Ismailia': (30.5965, 32.2715),
+    'Suez': (29.9668, 32.5498),
+    'Ain Sokhna': (29.6000, 32.3167),
+    'Siwa': (29.2032, 25.5195),
+    'Fayoum': (29.3084, 30.8428),
+    'Mansoura': (31.0409, 31.3785),
+    'Tanta': (30.7865, 31.0004),
+    'Zagazig': (30.5877, 31.5020),
+    'Minya': (28.1099, 30.7503),
+    'Asyut': (27.1783, 31.1859),
+    'Sohag': (26.5569, 31.6948),
+    'Qena': (26.1551, 32.7160),
+    'Nuweiba': (29.0333, 34.6667),
+    'Taba': (29.4925, 34.8969),
+    'Safaga': (26.7292, 33.9365),
+    'El Quseir': (26.1040, 34.2779),
+    'Marsa Matruh': (31.3543, 27.2373),
+    'Damietta': (31.4165, 31.8133),
+    'Ras Sudr': (29.5833, 32.7000),
+    'Saint Catherine': (28.5559, 33.9760),
+    'El Alamein': (30.8333, 28.9500),
+    # districts
+    'New Cairo': (30.0300, 31.4700),
+    '6th of October': (29.9285, 30.9188),
+    'Sheikh Zayed': (30.0400, 30.9800),
+    'Zamalek': (30.0609, 31.2197),
+    'Maadi': (29.9602, 31.2569),
+    'Heliopolis': (30.0911, 31.3225),
+    'Nasr City': (30.0561, 31.3301),
+    'Garden City': (30.0364, 31.2319),
+    'Downtown Cairo': (30.0478, 31.2394),
+    'Dokki': (30.0384, 31.2123),
+    'Mohandessin': (30.0566, 31.2007),
+    'Naama Bay': (27.9120, 34.3290),
+    # landmarks
+    'Pyramids of Giza': (29.9792, 31.1342),
+    'Great Sphinx': (29.9753, 31.1376),
+    'Grand Egyptian Museum': (29.9946, 31.1197),
+    'Egyptian Museum': (30.0478, 31.2336),
+    'Tahrir Square': (30.0444, 31.2357),
+    'Khan el-Khalili': (30.0477, 31.2623),
+    'Cairo Citadel': (30.0299, 31.2611),
+    'Cairo Tower': (30.0459, 31.2243),
+    'Bibliotheca Alexandrina': (31.2089, 29.9092),
+    'Qaitbay Citadel': (31.2140, 29.8856),
+    'Montaza Palace': (31.2885, 30.0160),
+    'Karnak Temple': (25.7188, 32.6573),
+    'Luxor Temple': (25.6995, 32.6390),
+    'Valley of the Kings': (25.7402, 32.6014),
+    'Philae Temple': (24.0254, 32.8844),
+    'Abu Simbel': (22.3372, 31.6258),
+    'Blue Hole': (28.5720, 34.5370),
+    'Mount Sinai': (28.5392, 33.9750),
+}
+ALIASES = {
+    'Cairo': ['القاهرة', 'al qahirah', 'el qahira'],
+    'Giza': ['الجيزة', 'el giza'],
+    'Alexandria': ['alex', 'الإسكندرية', 'al iskandariyah'],
+    'Hurghada': ['hurgada', 'ghardaqa', 'al ghardaqa', 'الغردقة'],
+    'Sharm El Sheikh': ['sharm', 'sharm el-sheikh', 'sharm al sheikh', 'شرم الشيخ'],
+    'North Coast': ['sahel', 'el sahel', 'sahel north coast', 'الساحل الشمالي'],
+    'Dahab': ['دهب'],
+    'Luxor': ['الأقصر', 'el uqsur'],
+    'Aswan': ['أسوان'],
+    'El Gouna': ['gouna', 'الجونة'],
+    'Ain Sokhna': ['sokhna', 'el sokhna', 'العين السخنة'],
+    'Siwa': ['siwa oasis', 'سيوة'],
+    'Fayoum': ['faiyum', 'الفيوم'],
+    'Marsa Matruh': ['matrouh', 'marsa matrouh', 'مرسى مطروح'],
+    'Saint Catherine': ['st catherine', 'sainte catherine'],
+    '6th of October': ['october', '6 october', 'sixth of october', '6th october'],
+    'Downtown Cairo': ['downtown', 'wust el balad', 'وسط البلد'],
+    'Mohandessin': ['mohandeseen', 'el mohandessin'],
+    'Heliopolis': ['masr el gedida', 'مصر الجديدة'],
+    'Pyramids of Giza': ['pyramids', 'giza pyramids', 'the pyramids', 'great pyramid', 'الأهرامات'],
+    'Great Sphinx': ['sphinx'],
+    'Grand Egyptian Museum': ['gem'],
+    'Khan el-Khalili': ['khan el khalili', 'khan al khalili'],
+    'Cairo Citadel': ['citadel', 'saladin citadel'],
+    'Valley of the Kings': ['kings valley'],
+}
+
+EARTH_KM_PER_DEG_LAT = 110.574
+EARTH_KM_PER_DEG_LNG = 111.320  # at the equator; scaled by cos(latitude)
+
+CELL_DEG = 0.1        # ~11 km grid cells
+MAX_CELLS = 400       # larger viewports skip the cell filter and use the lat/lng index alone
+MAX_RADIUS_KM = 100
+
+_COLUMNS = int(360 / CELL_DEG)
+
+
+def normalize(text):
+    """Lowercase, strip accents/punctuation and unify Arabic alef forms, for matching."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = re.sub('[أإآ]', 'ا', text.lower())
+    return ' '.join(re.findall(r'\w+', text))
+
+
+def _index():
+    names = {normalize(name): name for name in PLACES}
+    for name, aliases in ALIASES.items():
+        names.update((normalize(alias), name) for alias in aliases)
+    # longest first, so "new cairo" wins over "cairo" inside an address
+    return sorted(names.items(), key=lambda item: -len(item[0]))
+
+
+_NAMES = _index()
+_EXACT = dict(_NAMES)
+
+
+def lookup(name):
+    """Coordinates of a known place name or alias (exact match), or None."""
+    place = _EXACT.get(normalize(name))
+    return PLACES[place] if place else None
+
+
+def geocode(city, address=''):
+    """(lat, lng) for a listing: the most specific known place in its address, else its city."""
+    text = f' {normalize(address)} '
+    for key, place in _NAMES:
+        if f' {key} ' in text:
+            return PLACES[place]
+    return lookup(city)
+
+
+def cell_for(lat, lng):
+    return int((lat + 90) // CELL_DEG) * _COLUMNS + int((lng + 180) // CELL_DEG)
+
+
+def cells_in_bbox(south, west, north, east):
+    """Grid cells covering the box, or None when there are more than MAX_CELLS."""
+    rows = range(int((south + 90) // CELL_DEG), int((north + 90) // CELL_DEG) + 1)
+    cols = range(int((west + 180) // CELL_DEG), int((east + 180) // CELL_DEG) + 1)
+    if len(rows) * len(cols) > MAX_CELLS:
+        return None
+    return [row * _COLUMNS + col for row in rows for col in cols]
+
+
+def bbox_around(lat, lng, radius_km):
+    dlat = radius_km / EARTH_KM_PER_DEG_LAT
+    dlng = radius_km / (EARTH_KM_PER_DEG_LNG * math.cos(math.radians(lat)))
+    return lat - dlat, lng - dlng, lat + dlat, lng + dlng
+
+
+def locate(listing):
+    """Fill in missing coordinates from city/address and keep `geo_cell` in step."""
+    if listing.latitude is None or listing.longitude is None:
+        point = geocode(listing.city, listing.address)
+        if point:
+            listing.latitude, listing.longitude = point
+    if listing.latitude is not None and listing.longitude is not None:
+        listing.geo_cell = cell_for(listing.latitude, listing.longitude)
+    else:
+        listing.geo_cell = None
+    return listing
+
+
+@receiver(pre_save, sender=Listing)
+def _locate_listing(sender, instance, raw=False, **kwargs):
+    # clear latitude/longitude to have a listing geocoded again
+    if not raw:
+        locate(instance)
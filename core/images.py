@@ -0,0 +1,94 @@
+import base64
+import io
+import logging
+import os
+
+import cloudinary
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+
+logger = logging.getLogger(__name__)
+
+# Named widths for listing photos; srcset offers every width up to the variant's.
+VARIANTS = {'thumb': 320, 'card': 640, 'full': 1280}
+SRCSET_WIDTHS = (320, 480, 640, 960, 1280)
+PLACEHOLDER_WIDTH = 24
+
+
+def cloudinary_enabled():
+    return bool(cloudinary.config().cloud_name)
+
+
+def _source_name(image):
+    """Storage name of a locally stored image (see core.uploads.local_backend)."""
+    if isinstance(image, str):
+        # as returned by the backend, before the field parses it
+        return image
+    public_id = getattr(image, 'public_id', None) or str(image)
+    fmt = getattr(image, 'format', None)
+    return f'{public_id}.{fmt}' if fmt else public_id
+
+
+def _variant_name(image, width):
+    return f'variants/{width}/{os.path.splitext(_source_name(image))[0]}.webp'
+
+
+def build_local_variants(image):
+    """Write Pillow-made WebP copies of a locally stored image at every srcset width and the placeholder's.
+
+    Runs when the image is stored (core.uploads); pages only look the files up.
+    """
+    storage = FileSystemStorage()
+    source = _source_name(image)
+    try:
+        from PIL import Image
+        with storage.open(source) as fh, Image.open(fh) as img:
+            img = img.convert('RGB')
+            for width in (*SRCSET_WIDTHS, PLACEHOLDER_WIDTH):
+                variant = img.copy()
+                variant.thumbnail((width, width * 4))
+                out = io.BytesIO()
+                variant.save(out, 'WEBP', quality=75)
+                name = _variant_name(image, width)
+                storage.delete(name)
+                storage.save(name, ContentFile(out.getvalue()))
+    except Exception:
+        # pages fall back to the original file
+        logger.exception("Could not build variants of %s", source)
+
+
+def _built_variant(image, width):
+    storage = FileSystemStorage()
+    name = _variant_name(image, width)
+    return name if storage.exists(name) else None
+
+
+def variant_url(image, width):
+    """URL of `image` (a CloudinaryField value) scaled down to `width` px in a modern format."""
+    if cloudinary_enabled():
+        return image.build_url(width=width, crop='limit', fetch_format='auto', quality='auto', secure=True)
+    storage = FileSystemStorage()
+    name = _built_variant(image, width) or _source_name(image)
+    return storage.url(name) if storage.exists(name) else ''
+
+
+def srcset(image, max_width):
+    widths = [w for w in SRCSET_WIDTHS if w <= max_width]
+    if cloudinary_enabled():
+        urls = [(variant_url(image, w), w) for w in widths]
+    else:
+        # only the widths built at upload: the original fits no width in particular
+        urls = [(FileSystemStorage().url(name), w) for w in widths if (name := _built_variant(image, w))]
+    return ', '.join(f'{url} {w}w' for url, w in urls if url)
+
+
+def placeholder_url(image):
+    """Tiny blurred preview shown as the <img> background until the real image loads."""
+    if cloudinary_enabled():
+        return image.build_url(width=PLACEHOLDER_WIDTH, crop='limit', effect='blur:1000',
+                               quality=1, fetch_format='auto', secure=True)
+    name = _built_variant(image, PLACEHOLDER_WIDTH)
+    if not name:
+        return ''
+    with FileSystemStorage().open(name) as fh:
+        return 'data:image/webp;base64,' + base64.b64encode(fh.read()).decode()
@@ -0,0 +1,136 @@
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_MAX_ATTEMPTS = getattr(settings, 'JOB_MAX_ATTEMPTS', 5)
+JOB_BACKOFF_SECONDS = getattr(settings, 'JOB_BACKOFF_SECONDS', 10)
+JOB_BACKOFF_MAX_SECONDS = getattr(settings, 'JOB_BACKOFF_MAX_SECONDS', 3600)
+JOB_LOCK_TIMEOUT = getattr(settings, 'JOB_LOCK_TIMEOUT', 600)
+JOB_RETENTION_DAYS = getattr(settings, 'JOB_RETENTION_DAYS', 7)
+PRUNE_BATCH_SIZE = 1000
+
+
+def enqueue(task, run_at=None, max_attempts=None, **payload):
+    """Queue `task` (a function or its dotted path) to run as task(**payload).
+
+    The job row is written in the caller's transaction, so work queued from a
+    view that rolls back is never run. Payload values must be JSON-serializable.
+    """
+    if callable(task):
+        task = f"{task.__module__}.{task.__qualname__}"
+    return Job.objects.create(
+        task=task,
+        payload=payload,
+        run_at=run_at or timezone.now(),
+        max_attempts=max_attempts or JOB_MAX_ATTEMPTS,
+    )
+
+
+def enqueue_many(task, payloads, run_at=None, max_attempts=None):
+    """Queue one job per payload dict with a single INSERT."""
+    if callable(task):
+        task = f"{task.__module__}.{task.__qualname__}"
+    run_at = run_at or timezone.now()
+    return Job.objects.bulk_create([
+        Job(task=task, payload=payload, run_at=run_at, max_attempts=max_attempts or JOB_MAX_ATTEMPTS)
+        for payload in payloads
+    ])
+
+
+def claim_job(worker_id):
+    """Atomically take the next due job for `worker_id`, or return None."""
+    now = timezone.now()
+    due = Job.objects.filter(status=Job.Status.QUEUED, run_at__lte=now).order_by('run_at', 'id')
+    if connection.features.has_select_for_update_skip_locked:
+        # Postgres: concurrent workers skip rows another worker is claiming
+        with transaction.atomic():
+            job = due.select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            job.status = Job.Status.RUNNING
+            job.locked_by = worker_id
+            job.locked_at = now
+            job.attempts += 1
+            job.save(update_fields=['status', 'locked_by', 'locked_at', 'attempts'])
+            return job
+    # SQLite: no row locks, so claim with a compare-and-set UPDATE and retry on a lost race
+    for job in due[:10]:
+        claimed = Job.objects.filter(pk=job.pk, status=Job.Status.QUEUED).update(
+            status=Job.Status.RUNNING, locked_by=worker_id, locked_at=now, attempts=job.attempts + 1,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def backoff(attempts):
+    delay = min(JOB_BACKOFF_SECONDS * 2 ** (attempts - 1), JOB_BACKOFF_MAX_SECONDS)
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def run_job(job):
+    """Run a claimed job and record the outcome; failures are retried with backoff."""
+    try:
+        import_string(job.task)(**job.payload)
+    except Exception:
+        job.last_error = traceback.format_exc()
+        if job.attempts < job.max_attempts:
+            job.status = Job.Status.QUEUED
+            job.run_at = timezone.now() + backoff(job.attempts)
+            logger.warning("Job %s failed (attempt %s/%s), retrying at %s",
+                           job.pk, job.attempts, job.max_attempts, job.run_at)
+        else:
+            job.status = Job.Status.FAILED
+            job.finished_at = timezone.now()
+            logger.error("Job %s failed permanently:\n%s", job.pk, job.last_error)
+    else:
+        job.status = Job.Status.DONE
+        job.finished_at = timezone.now()
+    job.locked_by = ''
+    job.locked_at = None
+    job.save(update_fields=['status', 'run_at', 'last_error', 'finished_at', 'locked_by', 'locked_at'])
+    return job
+
+
+def heartbeat(worker_prefix):
+    """Refresh the lock on the RUNNING jobs whose locked_by starts with `worker_prefix`.
+
+    A running worker process calls this well within JOB_LOCK_TIMEOUT, so only
+    the jobs of a process that died ever look stale, however long a job runs.
+    """
+    return Job.objects.filter(status=Job.Status.RUNNING, locked_by__startswith=worker_prefix).update(
+        locked_at=timezone.now(),
+    )
+
+
+def requeue_stale_jobs():
+    """Put RUNNING jobs whose worker died (no heartbeat for JOB_LOCK_TIMEOUT) back in the queue."""
+    cutoff = timezone.now() - timedelta(seconds=JOB_LOCK_TIMEOUT)
+    return Job.objects.filter(status=Job.Status.RUNNING, locked_at__lt=cutoff).update(
+        status=Job.Status.QUEUED, locked_by='', locked_at=None,
+    )
+
+
+def prune_finished_jobs():
+    """Delete DONE jobs finished more than JOB_RETENTION_DAYS ago, a batch at a time.
+
+    FAILED jobs are kept for inspection (and for the uploads still pointing at them).
+    """
+    cutoff = timezone.now() - timedelta(days=JOB_RETENTION_DAYS)
+    done = Job.objects.filter(status=Job.Status.DONE, finished_at__lt=cutoff).order_by()
+    pruned = 0
+    while ids := list(done.values_list('pk', flat=True)[:PRUNE_BATCH_SIZE]):
+        Job.objects.filter(pk__in=ids).delete()
+        pruned += len(ids)
+    return pruned
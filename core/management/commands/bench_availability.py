@@ -0,0 +1,49 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Listing, Booking, BookedNight
+
+
+class Command(BaseCommand):
+    help = "Compare the legacy bookings anti-join with the BookedNight lookup for a date-range search."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check-in', help='YYYY-MM-DD (default: 30 days from today)')
+        parser.add_argument('--nights', type=int, default=3)
+        parser.add_argument('--city', default='')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **opts):
+        check_in = date.fromisoformat(opts['check_in']) if opts['check_in'] else date.today() + timedelta(days=30)
+        if opts['nights'] < 1:
+            raise CommandError('--nights must be >= 1')
+        check_out = check_in + timedelta(days=opts['nights'])
+
+        base = Listing.objects.all()
+        if opts['city']:
+            base = base.filter(city__iexact=opts['city'])
+
+        legacy = base.exclude(
+            bookings__status=Booking.Status.APPROVED,
+            bookings__check_in__lt=check_out,
+            bookings__check_out__gt=check_in,
+        )
+        indexed = base.exclude(id__in=BookedNight.listing_ids_between(check_in, check_out))
+
+        self.stdout.write(
+            f"{Listing.objects.count()} listings, {Booking.objects.count()} bookings, "
+            f"{BookedNight.objects.count()} booked nights; {check_in} -> {check_out}"
+        )
+        for label, qs in (('legacy exclude', legacy), ('booked nights', indexed)):
+            timings = []
+            for _ in range(opts['repeat']):
+                start = time.perf_counter()
+                ids = list(qs.order_by('-created_at').values_list('id', flat=True)[:9])
+                timings.append((time.perf_counter() - start) * 1000)
+            timings.sort()
+            self.stdout.write(
+                f"{label:>15}: median {timings[len(timings) // 2]:.1f} ms, "
+                f"min {timings[0]:.1f} ms, first page {len(ids)} ids"
+            )
@@ -0,0 +1,66 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from core.models import Listing
+from core.search import keyword_search
+
+WORDS = ['nile', 'view', 'pyramids', 'sea', 'beach', 'villa', 'flat', 'garden', 'pool', 'quiet',
+         'family', 'downtown', 'desert', 'balcony', 'modern', 'cozy', 'temple', 'diving', 'market', 'terrace']
+CITIES = ['Cairo', 'Giza', 'Alexandria', 'Luxor', 'Aswan', 'Hurghada', 'Sharm El Sheikh', 'Dahab']
+
+
+class Command(BaseCommand):
+    help = "Time ranked keyword search against the legacy icontains filter."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--generate', type=int, default=0,
+                            help='Insert N synthetic listings first (rolled back afterwards).')
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('queries', nargs='*', default=['nile view', 'beach', 'hurghada', 'pool garden', 'zamalek'])
+
+    def handle(self, *args, **opts):
+        with transaction.atomic():
+            if opts['generate']:
+                self._generate(opts['generate'])
+            self.stdout.write(f"{connection.vendor}: {Listing.objects.count()} listings")
+            for q in opts['queries']:
+                legacy = lambda: Listing.objects.filter(
+                    Q(title__icontains=q) | Q(city__icontains=q) | Q(description__icontains=q)
+                ).order_by('-created_at', '-id')
+                ranked = lambda: keyword_search(Listing.objects.all(), q).order_by('-search_rank', '-id')
+                self.stdout.write(
+                    f"{q!r:>16}: icontains {self._time(legacy, opts['repeat']):.1f} ms, "
+                    f"ranked {self._time(ranked, opts['repeat']):.1f} ms"
+                )
+            transaction.set_rollback(True)
+
+    def _time(self, build, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(build().values_list('id', flat=True)[:9])
+            timings.append((time.perf_counter() - start) * 1000)
+        return sorted(timings)[len(timings) // 2]
+
+    def _generate(self, count):
+        host, _ = User.objects.get_or_create(username='bench-search-host')
+        rng = random.Random(42)
+        batch = []
+        for i in range(count):
+            batch.append(Listing(
+                host=host,
+                title=' '.join(rng.sample(WORDS, 3)).capitalize(),
+                description=' '.join(rng.choices(WORDS, k=40)),
+                city=rng.choice(CITIES),
+                address=f'{i} Bench street',
+                price_per_night=rng.randint(300, 5000),
+            ))
+            if len(batch) == 5000:
+                Listing.objects.bulk_create(batch)
+                batch = []
+        Listing.objects.bulk_create(batch)
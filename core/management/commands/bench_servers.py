@@ -0,0 +1,139 @@
+import http.client
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+
+from core.management.commands.perfreport import percentile
+from core.models import Listing
+
+# gunicorn command lines per serving path; ASYNC_VIEWS picks the views.
+# wsgi-sync is the previous render.yaml setup (one request per worker at a time).
+SERVERS = {
+    'wsgi-sync': (['rental_egypt.wsgi:application', '-k', 'sync'], '0'),
+    'wsgi-gthread': (['rental_egypt.wsgi:application', '-k', 'gthread', '--threads', '{threads}'], '0'),
+    'asgi': (['rental_egypt.asgi:application', '-k', 'uvicorn.workers.UvicornWorker'], '1'),
+}
+
+
+class Command(BaseCommand):
+    help = ("Start the WSGI (sync, gthread) and ASGI (uvicorn) servers against the current database, "
+            "hit each with the same concurrent load and report throughput and latency as JSON. "
+            "Every request carries a unique query string so whole-response caching is bypassed; "
+            "against a local SQLite file there is little I/O wait, so run it on Postgres for "
+            "representative numbers.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=32, help='Simultaneous client connections.')
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per path and server.')
+        parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes.')
+        parser.add_argument('--threads', type=int, default=4, help='Threads per WSGI worker.')
+        parser.add_argument('--port', type=int, default=8701, help='First port to bind; each server uses the next one.')
+        parser.add_argument('--only', choices=sorted(SERVERS), action='append', help='Benchmark only these servers.')
+        parser.add_argument('--output', help='Write the JSON report to this file as well.')
+
+    def handle(self, *args, **opts):
+        listing = Listing.objects.order_by('-created_at').first()
+        if listing is None:
+            raise CommandError('No listings: run `manage.py seed_perf` first.')
+        paths = [
+            reverse('home'),
+            reverse('listing_detail', args=[listing.pk]),
+            reverse('listings_feed'),
+            reverse('api_listing_availability', args=[listing.pk]),
+        ]
+
+        results = {}
+        for offset, name in enumerate(sorted(SERVERS)):
+            if opts['only'] and name not in opts['only']:
+                continue
+            port = opts['port'] + offset
+            server = self._start(name, port, opts)
+            try:
+                self._wait(port, server)
+                results[name] = {path: self._load(port, path, opts) for path in paths}
+            finally:
+                server.terminate()
+                server.wait(timeout=10)
+
+        report = {
+            'vendor': connection.vendor,
+            'concurrency': opts['concurrency'],
+            'workers': opts['workers'],
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if opts['output']:
+            with open(opts['output'], 'w') as fh:
+                fh.write(output)
+        self.stdout.write(output)
+
+    def _start(self, name, port, opts):
+        app_args, async_views = SERVERS[name]
+        cmd = [sys.executable, '-m', 'gunicorn', '-b', f'127.0.0.1:{port}', '-w', str(opts['workers'])]
+        cmd += [arg.format(threads=opts['threads']) for arg in app_args]
+        env = dict(os.environ, ASYNC_VIEWS=async_views, PERF_INSTRUMENTATION='0')
+        return subprocess.Popen(cmd, cwd=settings.BASE_DIR, env=env,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def _wait(self, port, server, timeout=30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'Server on port {port} exited with {server.returncode}.')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'Server on port {port} did not start within {timeout}s.')
+
+    def _load(self, port, path, opts):
+        counter = iter(range(opts['requests']))
+        lock = threading.Lock()
+        timings, errors = [], []
+
+        def client():
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            while True:
+                with lock:
+                    n = next(counter, None)
+                if n is None:
+                    break
+                sep = '&' if '?' in path else '?'
+                start = time.perf_counter()
+                try:
+                    conn.request('GET', f'{path}{sep}_bench={n}')
+                    response = conn.getresponse()
+                    response.read()
+                    status = response.status
+                except (OSError, http.client.HTTPException):
+                    conn.close()
+                    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+                    status = None
+                elapsed = (time.perf_counter() - start) * 1000
+                with lock:
+                    (timings if status == 200 else errors).append(elapsed)
+            conn.close()
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(opts['concurrency']) as pool:
+            for _ in range(opts['concurrency']):
+                pool.submit(client)
+        wall = time.perf_counter() - start
+        timings.sort()
+        return {
+            'requests_per_s': round(len(timings) / wall, 1),
+            'p50_ms': round(percentile(timings, 50), 2) if timings else None,
+            'p95_ms': round(percentile(timings, 95), 2) if timings else None,
+            'errors': len(errors),
+        }
@@ -0,0 +1,85 @@
+import json
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from core.caching import attach_cache_versions
+from core.management.commands.bench_views import Command as BenchViews
+from core.management.commands.perfreport import percentile
+from core.models import Listing
+
+LOADERS = settings.TEMPLATES[0]['OPTIONS']['loaders']
+PLAIN_LOADERS = LOADERS[0][1] if isinstance(LOADERS[0], tuple) else LOADERS
+
+
+class Command(BaseCommand):
+    help = ("Time rendering home.html with a grid of N listing cards, with and without the cached "
+            "template loader and with cold (rendered) or warm (cached) cards. Reports JSON.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--cards', type=int, action='append', help='Grid sizes (default: 9 and 90).')
+        parser.add_argument('--repeat', type=int, default=30, help='Renders per scenario.')
+        parser.add_argument('--output', help='Write the JSON report to this file as well.')
+
+    def handle(self, *args, **opts):
+        sizes = opts['cards'] or [9, 90]
+        if Listing.objects.count() < max(sizes):
+            raise CommandError(f'Need at least {max(sizes)} listings: run `manage.py seed_perf` first.')
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+
+        loaders = {
+            'cached_loader': [('django.template.loaders.cached.Loader', PLAIN_LOADERS)],
+            'uncached_loader': PLAIN_LOADERS,
+        }
+        results = {}
+        for size in sizes:
+            for loader_name, loaders_setting in loaders.items():
+                templates = [dict(settings.TEMPLATES[0], OPTIONS=dict(settings.TEMPLATES[0]['OPTIONS'], loaders=loaders_setting))]
+                # a private cache, so cold runs can clear it without touching the real one
+                caches = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                      'LOCATION': 'bench-templates'}}
+                with override_settings(TEMPLATES=templates, CACHES=caches):
+                    for cards in ('cold', 'warm'):
+                        results[f'home[{size}] {loader_name} {cards}_cards'] = self._run(request, size, cards, opts)
+
+        report = {
+            'commit': BenchViews()._commit(),
+            'vendor': connection.vendor,
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if opts['output']:
+            with open(opts['output'], 'w') as fh:
+                fh.write(output)
+        self.stdout.write(output)
+
+    def _run(self, request, size, cards, opts):
+        def context():
+            listings = attach_cache_versions(Listing.objects.select_related('host').order_by('-created_at')[:size])
+            return {'listings': listings, 'page_obj': None, 'cities': []}
+
+        render_to_string('core/home.html', context(), request)  # compile / fill the card cache
+        timings, queries = [], []
+        for _ in range(opts['repeat']):
+            if cards == 'cold':
+                cache.clear()
+            ctx = context()
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                render_to_string('core/home.html', ctx, request)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured.captured_queries))
+        timings.sort()
+        return {
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'queries': max(queries),
+        }
@@ -0,0 +1,112 @@
+import itertools
+import json
+import subprocess
+import time
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+
+from core.management.commands.perfreport import percentile
+from core.models import Booking, Listing, Profile
+
+
+class Command(BaseCommand):
+    help = "Drive the main views through the test client and report latency percentiles and query counts as JSON."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=30, help='Requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--cold', action='store_true', help='Run with a dummy cache (no fragment/response hits).')
+        parser.add_argument('--output', help='Write the JSON report to this file as well.')
+
+    def handle(self, *args, **opts):
+        listing = Listing.objects.order_by('-created_at').first()
+        if listing is None:
+            raise CommandError('No listings: run `manage.py seed_perf` first.')
+        host = (User.objects.filter(profile__role=Profile.Role.HOST)
+                .annotate(n=Count('listings__bookings')).order_by('-n').first())
+        guest = User.objects.annotate(n=Count('bookings')).order_by('-n').first()
+
+        overrides = {'ALLOWED_HOSTS': ['*']}
+        if opts['cold']:
+            overrides['CACHES'] = {'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with override_settings(**overrides):
+            anon = Client()
+            host_client = Client()
+            host_client.force_login(host)
+            guest_client = Client()
+            guest_client.force_login(guest)
+
+            results = {}
+            for name, params in self._home_scenarios(listing.city):
+                results[f'home[{name}]'] = self._run(anon, reverse('home'), params, opts)
+            results['listing_detail'] = self._run(anon, reverse('listing_detail', args=[listing.pk]), {}, opts)
+            results['host_bookings'] = self._run(host_client, reverse('host_bookings'), {}, opts)
+            results['my_bookings'] = self._run(guest_client, reverse('my_bookings'), {}, opts)
+
+        report = {
+            'commit': self._commit(),
+            'vendor': connection.vendor,
+            'cold_cache': opts['cold'],
+            'listings': Listing.objects.count(),
+            'bookings': Booking.objects.count(),
+            'results': results,
+        }
+        output = json.dumps(report, indent=2)
+        if opts['output']:
+            with open(opts['output'], 'w') as fh:
+                fh.write(output)
+        self.stdout.write(output)
+
+    def _home_scenarios(self, city):
+        check_in = date.today() + timedelta(days=45)
+        filters = {
+            'destination': {'destination': city},
+            'dates': {'check_in': check_in.isoformat(), 'check_out': (check_in + timedelta(days=3)).isoformat()},
+            'guests': {'guests': '3'},
+            'q': {'q': 'nile view'},
+        }
+        # every combination of the four filters, from none to all
+        for size in range(len(filters) + 1):
+            for combo in itertools.combinations(filters, size):
+                params = {}
+                for key in combo:
+                    params.update(filters[key])
+                yield '+'.join(combo) or 'none', params
+        # map searches: nearest first around a point, and a viewport
+        yield 'near', {'near': city, 'radius': '10'}
+        yield 'bbox', {'bbox': '29.9,31.1,30.2,31.4'}
+
+    def _run(self, client, url, params, opts):
+        for _ in range(opts['warmup']):
+            client.get(url, params)
+        timings, queries = [], []
+        for _ in range(opts['requests']):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                response = client.get(url, params)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(ctx.captured_queries))
+            if response.status_code != 200:
+                raise CommandError(f'{url} {params} returned {response.status_code}')
+        timings.sort()
+        return {
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'queries': max(queries),
+        }
+
+    def _commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                                  capture_output=True, text=True, timeout=5).stdout.strip() or None
+        except (OSError, subprocess.SubprocessError):
+            return None
@@ -0,0 +1,57 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.models import Booking
+from core.transfer import BOOKING_COLUMNS, ENCODERS, FORMATS, booking_rows
+
+
+class Command(BaseCommand):
+    help = "Stream bookings as CSV or JSONL, in id order, to a file or stdout; the summary goes to stderr."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='File to write (default: stdout).')
+        parser.add_argument('--format', choices=FORMATS, default='csv')
+        parser.add_argument('--host', help="Only this host's listings (username).")
+        parser.add_argument('--status', choices=Booking.Status.values)
+        parser.add_argument('--since', help='Check-in on or after this date (YYYY-MM-DD).')
+        parser.add_argument('--until', help='Check-in before this date (YYYY-MM-DD).')
+
+    def handle(self, *args, **opts):
+        bookings = Booking.objects.all()
+        if opts['host']:
+            bookings = bookings.filter(listing__host__username=opts['host'])
+        if opts['status']:
+            bookings = bookings.filter(status=opts['status'])
+        for option, lookup in (('since', 'check_in__gte'), ('until', 'check_in__lt')):
+            if opts[option]:
+                day = parse_date(opts[option])
+                if day is None:
+                    raise CommandError(f"--{option} must be a YYYY-MM-DD date.")
+                bookings = bookings.filter(**{lookup: day})
+
+        exported = 0
+
+        def counted(rows):
+            nonlocal exported
+            for row in rows:
+                exported += 1
+                yield row
+
+        encode, _ = ENCODERS[opts['format']]
+        started = time.perf_counter()
+        out = open(opts['output'], 'w', newline='', encoding='utf-8') if opts['output'] else None
+        try:
+            for chunk in encode(BOOKING_COLUMNS, counted(booking_rows(bookings))):
+                if out:
+                    out.write(chunk)
+                else:
+                    self.stdout.write(chunk, ending='')
+        finally:
+            if out:
+                out.close()
+        elapsed = time.perf_counter() - started
+        self.stderr.write(self.style.SUCCESS(
+            f"Exported {exported} booking(s) in {elapsed:.1f}s ({exported / elapsed if elapsed else 0:.0f} rows/s)."
+        ))
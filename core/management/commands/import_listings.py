@@ -0,0 +1,52 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Profile
+from core.transfer import BATCH_SIZE, FORMATS, guess_format, import_listings, read_rows
+
+
+class Command(BaseCommand):
+    help = ("Create listings for a host from a CSV or JSONL file (or - for stdin), streamed in batches. "
+            "Columns: title, description, city, address, price_per_night, capacity, latitude, longitude, "
+            "image_urls (space- or |-separated; a list in JSONL). Images are downloaded by `runworker`. "
+            "Each batch commits on its own, so check large files with --dry-run first.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--host', required=True, help='Username of the host who will own the listings.')
+        parser.add_argument('--format', choices=FORMATS, help='Default: from the file extension (jsonl unless .csv).')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help='Validate every row without writing anything.')
+
+    def handle(self, *args, **opts):
+        host = User.objects.select_related('profile').filter(username=opts['host']).first()
+        if host is None:
+            raise CommandError(f"No user named {opts['host']!r}.")
+        if host.profile.role != Profile.Role.HOST:
+            raise CommandError(f"{host.username} is not a host.")
+        path = opts['path']
+        fmt = opts['format'] or guess_format(path)
+        # utf-8-sig drops the byte order mark spreadsheet exports start with
+        fh = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8-sig')
+        try:
+            report = import_listings(host, read_rows(fh, fmt), opts['batch_size'], opts['dry_run'], self._progress)
+        finally:
+            if fh is not sys.stdin:
+                fh.close()
+
+        for line, message in report.errors:
+            self.stderr.write(f"  line {line}: {message}")
+        if report.error_count > len(report.errors):
+            self.stderr.write(f"  ... and {report.error_count - len(report.errors)} more invalid row(s)")
+        verb = 'Validated' if opts['dry_run'] else 'Imported'
+        count = report.valid if opts['dry_run'] else report.created
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {count} of {report.read} row(s) in {report.elapsed:.1f}s ({report.rate:.0f} rows/s); "
+            f"{report.error_count} invalid, {report.images} image(s) queued."
+        ))
+
+    def _progress(self, report):
+        self.stdout.write(f"  rows: {report.read} read, {report.created} created, "
+                          f"{report.error_count} invalid ({report.rate:.0f} rows/s)")
@@ -0,0 +1,73 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Command(BaseCommand):
+    help = "Aggregate PerfMiddleware samples per view over a rolling window."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=float, default=60, help='Window size (default 60).')
+        parser.add_argument('--file', default=None, help='Sample file (default PERF_LOG_FILE).')
+        parser.add_argument('--json', action='store_true', help='Print JSON instead of a table.')
+
+    def handle(self, *args, **opts):
+        path = opts['file'] or getattr(settings, 'PERF_LOG_FILE', None)
+        if not path:
+            raise CommandError('No sample file: set PERF_LOG_FILE or pass --file.')
+        since = time.time() - opts['minutes'] * 60
+        by_view = {}
+        for rotated in (f'{path}.1', path):
+            try:
+                with open(rotated) as fh:
+                    for line in fh:
+                        try:
+                            sample = json.loads(line)
+                        except ValueError:
+                            continue
+                        if sample.get('ts', 0) >= since:
+                            by_view.setdefault(sample['view'], []).append(sample)
+            except FileNotFoundError:
+                continue
+
+        report = {}
+        for view, samples in sorted(by_view.items()):
+            totals = sorted(s['total_ms'] for s in samples)
+            queries = [s['queries'] for s in samples]
+            report[view] = {
+                'requests': len(samples),
+                'p50_ms': percentile(totals, 50),
+                'p95_ms': percentile(totals, 95),
+                'p99_ms': percentile(totals, 99),
+                'avg_queries': round(sum(queries) / len(queries), 1),
+                'max_queries': max(queries),
+                'avg_db_ms': round(sum(s['db_ms'] for s in samples) / len(samples), 1),
+                'avg_template_ms': round(sum(s['template_ms'] for s in samples) / len(samples), 1),
+                'avg_python_ms': round(sum(s['python_ms'] for s in samples) / len(samples), 1),
+                'budget': getattr(settings, 'PERF_QUERY_BUDGETS', {}).get(view),
+            }
+
+        if opts['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        if not report:
+            self.stdout.write('No samples in window.')
+            return
+        self.stdout.write(f"{'view':<24}{'reqs':>6}{'p50':>9}{'p95':>9}{'p99':>9}{'queries':>9}{'max':>5}"
+                          f"{'db':>8}{'tpl':>8}{'py':>8}  budget")
+        for view, row in report.items():
+            over = row['budget'] is not None and row['max_queries'] > row['budget']
+            self.stdout.write(
+                f"{view:<24}{row['requests']:>6}{row['p50_ms']:>9.1f}{row['p95_ms']:>9.1f}{row['p99_ms']:>9.1f}"
+                f"{row['avg_queries']:>9}{row['max_queries']:>5}{row['avg_db_ms']:>8}{row['avg_template_ms']:>8}"
+                f"{row['avg_python_ms']:>8}  {row['budget'] if row['budget'] is not None else '-'}{' OVER' if over else ''}"
+            )
@@ -0,0 +1,84 @@
+import os
+import signal
+import socket
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+
+from core.jobs import JOB_LOCK_TIMEOUT, claim_job, heartbeat, prune_finished_jobs, requeue_stale_jobs, run_job
+
+
+class Command(BaseCommand):
+    help = "Run background jobs from the database queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=2, help='Number of worker threads.')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when idle.')
+        parser.add_argument('--burst', action='store_true', help='Exit once the queue is empty.')
+        parser.add_argument('--requeue-interval', type=float, default=60.0,
+                            help='Seconds between heartbeats for running jobs, checks for jobs left '
+                                 'RUNNING by a dead worker and pruning of old finished jobs.')
+
+    def handle(self, *args, **opts):
+        self.stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: self.stop.set())
+        signal.signal(signal.SIGINT, lambda *_: self.stop.set())
+
+        base_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.maintain(base_id)
+
+        threads = [
+            threading.Thread(target=self.work, args=(f"{base_id}:{i}", opts), daemon=True)
+            for i in range(max(1, opts['concurrency']))
+        ]
+        self.stdout.write(f"Worker {base_id} started with {len(threads)} thread(s).")
+        for thread in threads:
+            thread.start()
+        # while the threads work, this one refreshes the locks on their jobs,
+        # puts back jobs a killed worker left RUNNING once their lock has
+        # expired, and deletes old finished jobs; the heartbeat has to come
+        # well within the lock timeout, whatever the interval asked for
+        interval = min(opts['requeue_interval'], JOB_LOCK_TIMEOUT / 3)
+        next_tick = time.monotonic() + interval
+        try:
+            while not self.stop.is_set() and any(thread.is_alive() for thread in threads):
+                self.stop.wait(opts['poll_interval'])
+                if time.monotonic() >= next_tick:
+                    close_old_connections()
+                    self.maintain(base_id)
+                    next_tick = time.monotonic() + interval
+        finally:
+            connection.close()
+        for thread in threads:
+            thread.join()
+        self.stdout.write("Worker stopped.")
+
+    def maintain(self, base_id):
+        heartbeat(f"{base_id}:")  # this process's threads
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s).")
+        pruned = prune_finished_jobs()
+        if pruned:
+            self.stdout.write(f"Pruned {pruned} finished job(s).")
+
+    def work(self, worker_id, opts):
+        try:
+            while not self.stop.is_set():
+                close_old_connections()
+                job = claim_job(worker_id)
+                if job is None:
+                    if opts['burst']:
+                        return
+                    self.stop.wait(opts['poll_interval'])
+                    continue
+                started = time.perf_counter()
+                job = run_job(job)
+                self.stdout.write(
+                    f"[{worker_id}] {job.task} #{job.pk} {job.status} "
+                    f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+                )
+        finally:
+            connection.close()
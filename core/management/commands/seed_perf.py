@@ -0,0 +1,150 @@
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.facets import invalidate_facets
+from core.geo import PLACES, locate
+from core.models import BookedNight, Booking, Listing, ListingImage, Profile
+from core.stats import refresh_listing_stats
+
+# Rough share of Egyptian short-term rental supply per city.
+CITY_WEIGHTS = {
+    'Cairo': 28, 'Giza': 10, 'Alexandria': 16, 'Hurghada': 11, 'Sharm El Sheikh': 9,
+    'North Coast': 8, 'Dahab': 5, 'Luxor': 5, 'Aswan': 3, 'El Gouna': 3, 'Marsa Alam': 2,
+}
+PRICE_RANGE = {'Cairo': (600, 4000), 'Giza': (500, 3000), 'North Coast': (1500, 9000), 'El Gouna': (1500, 8000)}
+# Check-in month weights: summer on the coast, winter holidays in Upper Egypt.
+MONTH_WEIGHTS = [6, 5, 6, 8, 7, 10, 14, 14, 8, 7, 6, 9]
+WORDS = ['cozy', 'modern', 'sunny', 'quiet', 'family', 'nile', 'sea', 'garden', 'pool', 'balcony',
+         'downtown', 'view', 'studio', 'villa', 'chalet', 'apartment', 'rooftop', 'beach', 'desert', 'classic']
+BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = "Bulk-generate hosts, guests, listings, images and bookings for performance work."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hosts', type=int, default=200)
+        parser.add_argument('--guests', type=int, default=5000)
+        parser.add_argument('--listings', type=int, default=10000)
+        parser.add_argument('--images', type=int, default=5, help='Images per listing.')
+        parser.add_argument('--bookings', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--clear', action='store_true', help='Delete previously seeded perf-* users first.')
+
+    def handle(self, *args, **opts):
+        self.rng = random.Random(opts['seed'])
+        started = time.perf_counter()
+        if opts['clear']:
+            deleted, _ = User.objects.filter(username__startswith='perf-').delete()
+            self.stdout.write(f"Cleared {deleted} rows.")
+
+        with transaction.atomic():
+            hosts = self._users('host', opts['hosts'], Profile.Role.HOST)
+            guests = self._users('guest', opts['guests'], Profile.Role.GUEST)
+            listing_ids = self._listings(hosts, opts['listings'])
+            self._images(listing_ids, opts['images'])
+            self._bookings(listing_ids, guests, opts['bookings'])
+            # bulk_create skips the receivers that maintain the dashboard counters
+            refresh_listing_stats(listing_ids)
+            self._progress('listing stats', len(listing_ids), len(listing_ids))
+        invalidate_facets()
+        self.stdout.write(self.style.SUCCESS(f"Done in {time.perf_counter() - started:.1f}s."))
+
+    def _progress(self, label, done, total):
+        self.stdout.write(f"  {label}: {done}/{total}")
+
+    def _users(self, kind, count, role):
+        password = make_password('perf-password')
+        run = int(time.time())
+        users = User.objects.bulk_create(
+            [User(username=f'perf-{kind}-{run}-{i}', email=f'perf-{kind}-{run}-{i}@example.com', password=password)
+             for i in range(count)],
+            batch_size=BATCH,
+        )
+        # bulk_create skips the post_save signal that normally creates profiles
+        Profile.objects.bulk_create([Profile(user=u, role=role) for u in users], batch_size=BATCH)
+        self._progress(f'{kind}s', count, count)
+        return [u.pk for u in users]
+
+    def _listings(self, host_ids, count):
+        cities, weights = list(CITY_WEIGHTS), list(CITY_WEIGHTS.values())
+        # a few hosts own most listings
+        host_weights = [1 / (rank + 1) for rank in range(len(host_ids))]
+        ids = []
+        for start in range(0, count, BATCH):
+            batch = []
+            for i in range(start, min(start + BATCH, count)):
+                city = self.rng.choices(cities, weights)[0]
+                low, high = PRICE_RANGE.get(city, (400, 3500))
+                lat, lng = PLACES[city]
+                # bulk_create skips the pre_save geocoding, so set the grid cell here
+                batch.append(locate(Listing(
+                    host_id=self.rng.choices(host_ids, host_weights)[0],
+                    title=' '.join(self.rng.sample(WORDS, 3)).capitalize() + f' in {city}',
+                    description=' '.join(self.rng.choices(WORDS, k=60)),
+                    city=city,
+                    address=f'{self.rng.randint(1, 200)} Street {i}',
+                    price_per_night=Decimal(self.rng.randint(low, high)),
+                    capacity=self.rng.choices([1, 2, 3, 4, 6, 8], [5, 30, 15, 25, 15, 10])[0],
+                    # spread around the city centre, mostly within ~10 km
+                    latitude=lat + self.rng.gauss(0, 0.05),
+                    longitude=lng + self.rng.gauss(0, 0.05),
+                )))
+            ids.extend(l.pk for l in Listing.objects.bulk_create(batch))
+            self._progress('listings', len(ids), count)
+        return ids
+
+    def _images(self, listing_ids, per_listing):
+        batch, total = [], 0
+        for listing_id in listing_ids:
+            for order in range(self.rng.randint(0, per_listing)):
+                batch.append(ListingImage(listing_id=listing_id, image='image/upload/v1/sample.jpg',
+                                          sort_order=order, is_cover=order == 0))
+            if len(batch) >= BATCH:
+                total += len(ListingImage.objects.bulk_create(batch))
+                batch = []
+        total += len(ListingImage.objects.bulk_create(batch))
+        self._progress('images', total, total)
+
+    def _bookings(self, listing_ids, guest_ids, count):
+        today = date.today()
+        # popular listings get most of the demand
+        listing_weights = [1 / (rank + 1) ** 0.6 for rank in range(len(listing_ids))]
+        booked = {}  # listing_id -> set of approved nights
+        created = 0
+        while created < count:
+            bookings, nights = [], []
+            for _ in range(min(BATCH, count - created)):
+                listing_id = self.rng.choices(listing_ids, listing_weights)[0]
+                month = self.rng.choices(range(12), MONTH_WEIGHTS)[0]
+                year = today.year + self.rng.choice([-1, 0, 0, 1])
+                check_in = date(year, month + 1, self.rng.randint(1, 28))
+                check_out = check_in + timedelta(days=self.rng.choices([1, 2, 3, 4, 5, 7, 14], [10, 25, 25, 15, 10, 10, 5])[0])
+                status = self.rng.choices(
+                    [Booking.Status.APPROVED, Booking.Status.PENDING, Booking.Status.DECLINED], [55, 25, 20])[0]
+                stay = [check_in + timedelta(days=i) for i in range((check_out - check_in).days)]
+                taken = booked.setdefault(listing_id, set())
+                if status == Booking.Status.APPROVED and taken.intersection(stay):
+                    status = Booking.Status.DECLINED
+                booking = Booking(listing_id=listing_id, guest_id=self.rng.choice(guest_ids),
+                                  check_in=check_in, check_out=check_out,
+                                  guests_count=self.rng.randint(1, 4), status=status)
+                bookings.append(booking)
+                if status == Booking.Status.APPROVED:
+                    taken.update(stay)
+                    nights.append((booking, stay))
+            Booking.objects.bulk_create(bookings)
+            # bulk_create skips the receiver that maintains BookedNight
+            BookedNight.objects.bulk_create(
+                [BookedNight(listing_id=b.listing_id, booking_id=b.pk, night=n) for b, stay in nights for n in stay],
+                batch_size=BATCH,
+            )
+            created += len(bookings)
+            self._progress('bookings', created, count)
@@ -0,0 +1,90 @@
+import random
+import threading
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+
+from core.models import Booking, Listing
+
+
+class Command(BaseCommand):
+    help = "Approve overlapping bookings from many threads at once and verify none are double-booked."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--listings', type=int, default=5)
+        parser.add_argument('--bookings', type=int, default=100, help='Pending requests per listing.')
+        parser.add_argument('--keep', action='store_true', help='Keep the generated data.')
+
+    def handle(self, *args, **opts):
+        rng = random.Random(7)
+        host = User.objects.create_user(f'perf-stress-host-{int(time.time())}')
+        guest = User.objects.create_user(f'perf-stress-guest-{int(time.time())}')
+        try:
+            start_day = date.today() + timedelta(days=30)
+            booking_ids = []
+            for i in range(opts['listings']):
+                listing = Listing.objects.create(host=host, title=f'Stress {i}', description='-', city='Stress',
+                                                 address='-', price_per_night=100)
+                # dense, heavily overlapping requests within a 60-night window
+                bookings = Booking.objects.bulk_create([
+                    Booking(listing=listing, guest=guest, check_in=ci, check_out=ci + timedelta(days=rng.randint(1, 6)))
+                    for ci in (start_day + timedelta(days=rng.randint(0, 60)) for _ in range(opts['bookings']))
+                ])
+                booking_ids.extend(b.pk for b in bookings)
+            rng.shuffle(booking_ids)
+
+            work = list(booking_ids)
+            lock = threading.Lock()
+            counts = {'approved': 0, 'rejected': 0, 'retries': 0}
+
+            def worker():
+                try:
+                    while True:
+                        with lock:
+                            if not work:
+                                return
+                            pk = work.pop()
+                        booking = Booking.objects.get(pk=pk)
+                        while True:
+                            try:
+                                ok = booking.approve()
+                                break
+                            except OperationalError:
+                                # SQLite "database is locked" under write contention
+                                with lock:
+                                    counts['retries'] += 1
+                                time.sleep(0.01)
+                        with lock:
+                            counts['approved' if ok else 'rejected'] += 1
+                finally:
+                    connection.close()
+
+            started = time.perf_counter()
+            threads = [threading.Thread(target=worker) for _ in range(opts['threads'])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - started
+
+            approved = list(Booking.objects.filter(pk__in=booking_ids, status=Booking.Status.APPROVED)
+                            .order_by('listing_id', 'check_in'))
+            double_booked = sum(
+                1 for a, b in zip(approved, approved[1:])
+                if a.listing_id == b.listing_id and b.check_in < a.check_out
+            )
+            self.stdout.write(
+                f"{connection.vendor}: {len(booking_ids)} approvals tried by {opts['threads']} threads in {elapsed:.2f}s "
+                f"({len(booking_ids) / elapsed:.0f}/s): {counts['approved']} approved, {counts['rejected']} rejected, "
+                f"{counts['retries']} lock retries, {double_booked} double bookings"
+            )
+            if double_booked:
+                raise CommandError('Overlapping approved bookings found.')
+        finally:
+            if not opts['keep']:
+                host.delete()
+                guest.delete()
@@ -0,0 +1,244 @@
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template as DjangoTemplate
+from django.templatetags.static import static
+from django.utils.deprecation import MiddlewareMixin
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from .routers import REPLICA, STICKY_COOKIE
+
+_current = ContextVar('perf_stats', default=None)
+_install_lock = threading.Lock()
+_template_timer_installed = False
+_log_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class _RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_ms = 0.0
+        self.template_ms = 0.0
+        self.template_depth = 0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_ms += (time.perf_counter() - start) * 1000
+
+
+def _install_template_timer():
+    # Times outermost template renders only; includes, {% extends %} and form
+    # widget templates render inside them and are counted there.
+    global _template_timer_installed
+    with _install_lock:
+        if _template_timer_installed:
+            return
+        original = DjangoTemplate.render
+
+        def render(self, context=None, request=None):
+            stats = _current.get()
+            if stats is None or stats.template_depth:
+                return original(self, context, request)
+            stats.template_depth += 1
+            start = time.perf_counter()
+            try:
+                return original(self, context, request)
+            finally:
+                stats.template_depth -= 1
+                stats.template_ms += (time.perf_counter() - start) * 1000
+
+        DjangoTemplate.render = render
+        _template_timer_installed = True
+
+
+def record_sample(sample):
+    path = getattr(settings, 'PERF_LOG_FILE', None)
+    if not path:
+        return
+    line = json.dumps(sample, separators=(',', ':')) + '\n'
+    max_bytes = getattr(settings, 'PERF_LOG_MAX_BYTES', 10 * 1024 * 1024)
+    with _log_lock:
+        try:
+            if os.path.getsize(path) > max_bytes:
+                os.replace(path, f'{path}.1')
+        except OSError:
+            pass
+        with open(path, 'a') as fh:
+            fh.write(line)
+
+
+class PerfMiddleware:
+    """Opt-in (PERF_INSTRUMENTATION) per-view query count and timing.
+
+    Adds a Server-Timing header, appends one JSON sample per request to
+    PERF_LOG_FILE for `manage.py perfreport`, and checks PERF_QUERY_BUDGETS
+    ({url_name: max queries}); with PERF_ENFORCE_BUDGETS an overrun raises
+    QueryBudgetExceeded so test runs fail on query regressions.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERF_INSTRUMENTATION', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        _install_template_timer()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def _wrap_connections(stats):
+        stack = ExitStack()
+        for conn in connections.all():
+            stack.enter_context(conn.execute_wrapper(stats.db_wrapper))
+        return stack
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = _RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            with self._wrap_connections(stats):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._report(request, response, stats, start)
+
+    async def __acall__(self, request):
+        stats = _RequestStats()
+        token = _current.set(stats)
+        start = time.perf_counter()
+        try:
+            # connections are per thread: wrap the ones of the request's sync
+            # thread, where sync_to_async (and so the async ORM) runs queries
+            stack = await sync_to_async(self._wrap_connections)(stats)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+        return self._report(request, response, stats, start)
+
+    def _report(self, request, response, stats, start):
+        total_ms = (time.perf_counter() - start) * 1000
+        python_ms = max(total_ms - stats.db_ms - stats.template_ms, 0.0)
+
+        match = request.resolver_match
+        url_name = (match.url_name or match.view_name) if match else 'unresolved'
+        response['Server-Timing'] = ', '.join([
+            f'db;dur={stats.db_ms:.1f};desc="{stats.queries} queries"',
+            f'tpl;dur={stats.template_ms:.1f}',
+            f'app;dur={python_ms:.1f}',
+            f'total;dur={total_ms:.1f}',
+        ])
+        record_sample({
+            'ts': time.time(),
+            'view': url_name,
+            'status': response.status_code,
+            'queries': stats.queries,
+            'db_ms': round(stats.db_ms, 2),
+            'template_ms': round(stats.template_ms, 2),
+            'python_ms': round(python_ms, 2),
+            'total_ms': round(total_ms, 2),
+        })
+
+        budget = getattr(settings, 'PERF_QUERY_BUDGETS', {}).get(url_name)
+        if budget is not None and stats.queries > budget and getattr(settings, 'PERF_ENFORCE_BUDGETS', False):
+            raise QueryBudgetExceeded(f"{url_name} ran {stats.queries} queries (budget {budget})")
+        return response
+
+
+class ReplicaStickinessMiddleware(MiddlewareMixin):
+    """Pin a client's reads to the primary for REPLICA_STICKY_SECONDS after a successful write."""
+
+    def process_response(self, request, response):
+        if (REPLICA in settings.DATABASES and request.method not in ('GET', 'HEAD', 'OPTIONS')
+                and response.status_code < 400):
+            response.set_cookie(STICKY_COOKIE, '1', max_age=getattr(settings, 'REPLICA_STICKY_SECONDS', 15),
+                                httponly=True, samesite='Lax')
+        return response
+
+
+# Same-origin assets every page needs; announced in a Link header so the
+# browser (or a proxy sending 103 Early Hints) fetches them before the HTML
+# is parsed. Hashed names come from the staticfiles manifest.
+PRELOAD_ASSETS = [
+    ('vendor/bootstrap-5.3.3/css/bootstrap.min.css', 'style'),
+    ('css/styles.css', 'style'),
+    ('vendor/bootstrap-5.3.3/js/bootstrap.bundle.min.js', 'script'),
+    ('js/images.js', 'script'),
+]
+
+
+class PreloadHeadersMiddleware:
+    """Add `Link: <...>; rel=preload` for PRELOAD_ASSETS to HTML responses."""
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.link = None
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._add_link(self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._add_link(await self.get_response(request))
+
+    def _add_link(self, response):
+        if response.status_code == 200 and response.get('Content-Type', '').startswith('text/html'):
+            if self.link is None or settings.DEBUG:
+                self.link = ', '.join(f'<{static(path)}>; rel=preload; as={kind}' for path, kind in PRELOAD_ASSETS)
+            response.headers.setdefault('Link', self.link)
+        return response
+
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise that also runs natively under ASGI.
+
+    WhiteNoise's own middleware is sync-only, so as the outermost layer it
+    would send every ASGI request through a thread. Static files are looked
+    up in memory (or with finders in DEBUG) and served from a thread; other
+    requests go straight on to the async chain.
+    """
+    sync_capable = async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,80 @@
+# Generated by Django 5.0.6 on 2026-10-16 22:38
+
+import django.db.models.deletion
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef
+
+
+def _nights(booking):
+    return [booking.check_in + timedelta(days=i) for i in range((booking.check_out - booking.check_in).days)]
+
+
+def backfill_booked_nights(apps, schema_editor):
+    """One BookedNight per night of every APPROVED booking.
+
+    Approved bookings that overlap each other (double bookings the old
+    read-then-write approval let through) cannot all get rows under the
+    unique (listing, night) constraint: the earliest request keeps the
+    nights, and every clash is printed so the host can decline one side.
+    """
+    Booking = apps.get_model('core', 'Booking')
+    BookedNight = apps.get_model('core', 'BookedNight')
+    approved = Booking.objects.filter(status='APPROVED')
+    clashing = approved.filter(listing=OuterRef('listing'), check_in__lt=OuterRef('check_out'),
+                               check_out__gt=OuterRef('check_in')).exclude(pk=OuterRef('pk'))
+    approved = approved.annotate(clash=Exists(clashing))
+
+    batch = []
+    for booking in approved.filter(clash=False).iterator():
+        batch.extend(BookedNight(listing_id=booking.listing_id, booking_id=booking.pk, night=night)
+                     for night in _nights(booking))
+        if len(batch) >= 1000:
+            BookedNight.objects.bulk_create(batch)
+            batch = []
+    BookedNight.objects.bulk_create(batch)
+
+    taken = {}  # (listing id, night) -> booking id, for the clashing bookings only
+    for booking in approved.filter(clash=True).order_by('created_at', 'id'):
+        free, lost = [], {}
+        for night in _nights(booking):
+            owner = taken.setdefault((booking.listing_id, night), booking.pk)
+            if owner == booking.pk:
+                free.append(night)
+            else:
+                lost.setdefault(owner, []).append(night)
+        BookedNight.objects.bulk_create([
+            BookedNight(listing_id=booking.listing_id, booking_id=booking.pk, night=night) for night in free
+        ])
+        for owner, nights in lost.items():
+            print(f"\n  Double booking on listing {booking.listing_id}: approved booking {booking.pk} overlaps "
+                  f"approved booking {owner} on {', '.join(n.isoformat() for n in nights)}; "
+                  f"the nights stay with {owner}. Decline one of the two.")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_alter_listingimage_options_listingimage_is_cover_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookedNight',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('night', models.DateField()),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booked_nights', to='core.booking')),
+                ('listing', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='booked_nights', to='core.listing')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['night', 'listing'], name='core_booked_night_8aa063_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='bookednight',
+            constraint=models.UniqueConstraint(fields=('listing', 'night'), name='unique_listing_night'),
+        ),
+        migrations.RunPython(backfill_booked_nights, migrations.RunPython.noop),
+    ]
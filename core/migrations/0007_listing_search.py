@@ -0,0 +1,85 @@
+from django.db import migrations
+
+# Full-text search structures live outside the Django model state: a generated
+# tsvector column + GIN indexes on Postgres, an FTS5 external-content table
+# kept current by triggers on SQLite. Other backends fall back to icontains.
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE core_listing ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('arabic', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(city, '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'C') ||
+        setweight(to_tsvector('arabic', coalesce(description, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX core_listing_search_gin ON core_listing USING GIN (search_vector)",
+    "CREATE INDEX core_listing_city_trgm ON core_listing USING GIN (city gin_trgm_ops)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS core_listing_city_trgm",
+    "DROP INDEX IF EXISTS core_listing_search_gin",
+    "ALTER TABLE core_listing DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE core_listing_fts USING fts5(
+        title, city, description,
+        content='core_listing', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER core_listing_fts_ai AFTER INSERT ON core_listing BEGIN
+        INSERT INTO core_listing_fts(rowid, title, city, description)
+        VALUES (new.id, new.title, new.city, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER core_listing_fts_ad AFTER DELETE ON core_listing BEGIN
+        INSERT INTO core_listing_fts(core_listing_fts, rowid, title, city, description)
+        VALUES ('delete', old.id, old.title, old.city, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER core_listing_fts_au AFTER UPDATE OF title, city, description ON core_listing BEGIN
+        INSERT INTO core_listing_fts(core_listing_fts, rowid, title, city, description)
+        VALUES ('delete', old.id, old.title, old.city, old.description);
+        INSERT INTO core_listing_fts(rowid, title, city, description)
+        VALUES (new.id, new.title, new.city, new.description);
+    END
+    """,
+    "INSERT INTO core_listing_fts(core_listing_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS core_listing_fts_au",
+    "DROP TRIGGER IF EXISTS core_listing_fts_ad",
+    "DROP TRIGGER IF EXISTS core_listing_fts_ai",
+    "DROP TABLE IF EXISTS core_listing_fts",
+]
+
+
+def _run(statements):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        if vendor in statements:
+            for sql in statements[vendor]:
+                schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_bookednight'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            _run({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
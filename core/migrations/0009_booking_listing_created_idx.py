@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-16 22:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_job'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['listing', '-created_at'], name='core_bookin_listing_0d0562_idx'),
+        ),
+    ]
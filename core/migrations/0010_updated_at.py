@@ -0,0 +1,28 @@
+# Generated by Django 5.0.6 on 2026-10-16 22:51
+
+from django.db import migrations, models
+
+from core.fts import restore_listing_fts
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_booking_listing_created_idx'),
+    ]
+
+    operations = [
+        restore_listing_fts(on_reverse=True),
+        migrations.AddField(
+            model_name='booking',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        # the SQLite table rebuild above drops the FTS triggers
+        restore_listing_fts(),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.6 on 2026-10-16 23:06
+
+from django.db import migrations, models
+
+from core.fts import restore_listing_fts
+from core.geo import locate
+
+
+def geocode_listings(apps, schema_editor):
+    Listing = apps.get_model('core', 'Listing')
+    batch = []
+    for listing in Listing.objects.only('id', 'city', 'address', 'latitude', 'longitude').iterator():
+        batch.append(locate(listing))
+        if len(batch) >= 1000:
+            Listing.objects.bulk_update(batch, ['latitude', 'longitude', 'geo_cell'])
+            batch = []
+    Listing.objects.bulk_update(batch, ['latitude', 'longitude', 'geo_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_updated_at'),
+    ]
+
+    operations = [
+        restore_listing_fts(on_reverse=True),
+        migrations.AddField(
+            model_name='listing',
+            name='geo_cell',
+            field=models.IntegerField(db_index=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='listing',
+            name='longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='listing',
+            index=models.Index(fields=['latitude', 'longitude'], name='core_listin_latitud_0e8ecb_idx'),
+        ),
+        # the SQLite table rebuild above drops the FTS triggers
+        restore_listing_fts(),
+        migrations.RunPython(geocode_listings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.0.6 on 2026-10-16 23:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_listing_geo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListingStats',
+            fields=[
+                ('listing', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.listing')),
+                ('image_count', models.PositiveIntegerField(default=0)),
+                ('pending_count', models.PositiveIntegerField(default=0)),
+                ('approved_count', models.PositiveIntegerField(default=0)),
+                ('upcoming_nights', models.PositiveIntegerField(default=0)),
+                ('next_check_in', models.DateField(blank=True, null=True)),
+                ('as_of', models.DateField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.6 on 2026-10-16 23:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_listingstats'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['check_in', 'status'], name='core_bookin_check_i_74bad8_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.0.6 on 2026-10-17 10:12
+
+from django.core.files.base import ContentFile
+from django.db import migrations, models
+
+import core.models
+
+
+def stage_files(apps, schema_editor):
+    ImageUpload = apps.get_model('core', 'ImageUpload')
+    for upload in ImageUpload.objects.filter(file='').iterator():
+        upload.file.save(upload.name, ContentFile(bytes(upload.data)), save=False)
+        ImageUpload.objects.filter(pk=upload.pk).update(file=upload.file.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_imageupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imageupload',
+            name='file',
+            field=models.FileField(default='', max_length=255, storage=core.models.upload_staging_storage, upload_to='upload-staging/%Y/%m/%d/'),
+            preserve_default=False,
+        ),
+        migrations.RunPython(stage_files, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='imageupload',
+            name='data',
+        ),
+    ]
@@ -1,8 +1,12 @@
-from django.db import models
+from django.conf import settings
+from django.db import IntegrityError, models, router, transaction
 from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
 from cloudinary.models import CloudinaryField
+from datetime import timedelta
 
 class Profile(models.Model):
     class Role(models.TextChoices):
@@ -30,7 +34,12 @@ class Listing(models.Model):
     image = CloudinaryField('image', blank=True, null=True)  # Cloudinary upload
     image_url = models.URLField(blank=True)                  # optional fallback for old data
     capacity = models.PositiveIntegerField(default=1)
+    # filled in from city/address by core.geo when left blank
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geo_cell = models.IntegerField(null=True, editable=False, db_index=True)  # core.geo grid index
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.title
@@ -38,12 +47,18 @@ class Listing(models.Model):
     class Meta:
         indexes = [
             models.Index(fields=['city', '-created_at']),
+            models.Index(fields=['latitude', 'longitude']),
         ]
 
     @property
     def cover_image(self):
-        cover = self.images.filter(is_cover=True).first()
-        return cover or self.images.first()
+        # Resolve from images.all() so a prefetch_related('images') is reused;
+        # without one this is still a single query instead of two.
+        images = list(self.images.all())
+        for img in images:
+            if img.is_cover:
+                return img
+        return images[0] if images else None
 
 
 class ListingImage(models.Model):
@@ -79,6 +94,7 @@ class Booking(models.Model):
     message = models.TextField(blank=True)
     status = models.CharField(max_length=10, choices=Status.choices, default=Status.PENDING)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.listing.title} ({self.check_in} → {self.check_out})"
@@ -87,6 +103,9 @@ class Booking(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['listing', 'status', 'check_in', 'check_out']),
+            models.Index(fields=['listing', '-created_at']),
+            # admin changelist across all listings: date hierarchy + status filter
+            models.Index(fields=['check_in', 'status']),
         ]
 
     def clean(self):
@@ -106,3 +125,155 @@ class Booking(models.Model):
                 qs = qs.exclude(pk=self.pk)
             if qs.exists():
                 raise ValidationError("Selected dates are unavailable.")
+
+    # status as last read from or written to the database; None for a new booking
+    saved_status = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.saved_status = instance.__dict__.get('status')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # the post_save receivers (booked nights, stats) commit or roll back with the row
+        using = kwargs.get('using') or router.db_for_write(Booking, instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+        self.saved_status = self.status
+
+    def stay_dates(self):
+        return [self.check_in + timedelta(days=i) for i in range((self.check_out - self.check_in).days)]
+
+    def approve(self):
+        """Approve this booking; returns False (and leaves it unchanged) if its nights are taken.
+
+        The check is the unique (listing, night) constraint on BookedNight rather
+        than a read-then-write overlap query, so two overlapping approvals racing
+        each other cannot both commit: the loser's insert fails and rolls back.
+        """
+        previous = self.status
+        try:
+            with transaction.atomic():
+                self.status = Booking.Status.APPROVED
+                self.save()
+        except IntegrityError:
+            self.status = previous
+            return False
+        return True
+
+
+class BookedNight(models.Model):
+    """One row per night an APPROVED booking occupies a listing.
+
+    Kept in sync from Booking saves so date-range availability becomes an
+    indexed lookup on (night, listing) instead of an anti-join over bookings.
+    """
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='booked_nights')
+    booking = models.ForeignKey(Booking, on_delete=models.CASCADE, related_name='booked_nights')
+    night = models.DateField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['listing', 'night'], name='unique_listing_night'),
+        ]
+        indexes = [
+            models.Index(fields=['night', 'listing']),
+        ]
+
+    def __str__(self):
+        return f"{self.listing_id} @ {self.night}"
+
+    @staticmethod
+    def listing_ids_between(check_in, check_out):
+        """Listing ids with at least one occupied night in [check_in, check_out)."""
+        return (BookedNight.objects
+                .filter(night__gte=check_in, night__lt=check_out)
+                .values('listing_id'))
+
+
+class ListingStats(models.Model):
+    """Per-listing counters for the host dashboards, kept up to date by core.stats.
+
+    Rows are recomputed in the same transaction as the booking or image change
+    that affects them; `manage.py rebuild_listing_stats` backfills and repairs.
+    The upcoming_* fields depend on the day, so they are as of `as_of`; run
+    the command daily to move the rows on.
+    """
+    listing = models.OneToOneField(Listing, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    image_count = models.PositiveIntegerField(default=0)
+    pending_count = models.PositiveIntegerField(default=0)
+    approved_count = models.PositiveIntegerField(default=0)
+    upcoming_nights = models.PositiveIntegerField(default=0)  # booked nights in the next OCCUPANCY_DAYS
+    next_check_in = models.DateField(null=True, blank=True)
+    as_of = models.DateField()
+
+    def __str__(self):
+        return f"Stats for listing {self.listing_id}"
+
+
+@receiver(post_save, sender=Booking)
+def sync_booked_nights(sender, instance, created, raw=False, **kwargs):
+    if raw or (created and instance.status != Booking.Status.APPROVED):
+        return
+    instance.booked_nights.all().delete()
+    if instance.status == Booking.Status.APPROVED:
+        BookedNight.objects.bulk_create([
+            BookedNight(listing_id=instance.listing_id, booking=instance, night=night)
+            for night in instance.stay_dates()
+        ])
+
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by `manage.py runworker`."""
+    class Status(models.TextChoices):
+        QUEUED = 'QUEUED', 'Queued'
+        RUNNING = 'RUNNING', 'Running'
+        DONE = 'DONE', 'Done'
+        FAILED = 'FAILED', 'Failed'
+
+    task = models.CharField(max_length=200)  # dotted path to a function in core.tasks
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['run_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'run_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+
+def upload_staging_storage():
+    """Where ImageUpload files wait for the worker (settings.IMAGE_UPLOAD_STAGING_STORAGE)."""
+    return import_string(getattr(settings, 'IMAGE_UPLOAD_STAGING_STORAGE',
+                                 'django.core.files.storage.FileSystemStorage'))()
+
+
+class ImageUpload(models.Model):
+    """A gallery photo waiting for its background job (core.uploads) to store it.
+
+    The file is staged in IMAGE_UPLOAD_STAGING_STORAGE, which the web service
+    and the worker must share, and only its name is kept here; the row (and
+    the staged file) is deleted once the image is in the gallery, and kept
+    while its job is queued, running or failed.
+    """
+    listing = models.ForeignKey(Listing, on_delete=models.CASCADE, related_name='uploads')
+    job = models.ForeignKey(Job, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    name = models.CharField(max_length=255)
+    file = models.FileField(upload_to='upload-staging/%Y/%m/%d/', storage=upload_staging_storage, max_length=255)
+    position = models.PositiveIntegerField(default=0)  # order picked within one upload
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Upload {self.name} for listing {self.listing_id}"
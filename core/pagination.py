@@ -0,0 +1,152 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+from django.utils.functional import cached_property
+
+# Below this many (estimated) rows an exact COUNT(*) is cheap enough.
+EXACT_COUNT_LIMIT = 10000
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        # keyset pages only walk forward; any cursor means we're past page one
+        return bool(self.cursor)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+class KeysetPaginator:
+    """Cursor pagination over `keys` (default newest first, then id).
+
+    Unlike Paginator there is no COUNT(*) and no OFFSET: each page is a range
+    scan starting after the last row of the previous page, so pages stay
+    stable while new rows are inserted. The cursor is an opaque url-safe token.
+    """
+
+    def __init__(self, queryset, per_page, keys=('-created_at', '-id')):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = keys
+
+    def get_page(self, cursor=None):
+        qs, values = self._page_queryset(cursor)
+        return self._page(list(qs), cursor, values)
+
+    async def aget_page(self, cursor=None):
+        qs, values = self._page_queryset(cursor)
+        return self._page([row async for row in qs], cursor, values)
+
+    def _page_queryset(self, cursor):
+        qs = self.queryset.order_by(*self.keys)
+        values = self.decode(cursor) if cursor else None
+        if values is not None:
+            qs = qs.filter(self._after(values))
+        return qs[:self.per_page + 1], values
+
+    def _page(self, rows, cursor, values):
+        next_cursor = self.encode(rows[self.per_page - 1]) if len(rows) > self.per_page else None
+        return KeysetPage(rows[:self.per_page], next_cursor, cursor if values is not None else None)
+
+    def encode(self, obj):
+        # obj is a model instance, or a dict when paginating .values()
+        values = []
+        for key in self.keys:
+            name = key.lstrip('-')
+            value = obj[name] if isinstance(obj, dict) else getattr(obj, name)
+            if isinstance(value, (date, datetime)):
+                value = value.isoformat()
+            elif not isinstance(value, (int, float, str, type(None))):
+                value = str(value)
+            values.append(value)
+        raw = json.dumps(values, separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode(self, cursor):
+        """Return the key values in `cursor`, or None if it is not a valid token."""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+            values = json.loads(raw)
+        except (binascii.Error, ValueError):
+            return None
+        if not isinstance(values, list) or len(values) != len(self.keys):
+            return None
+        try:
+            return [self._to_python(key.lstrip('-'), value) for key, value in zip(self.keys, values)]
+        except (TypeError, ValueError):
+            return None
+
+    def _to_python(self, name, value):
+        try:
+            field = self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # annotation (e.g. a search rank); JSON already round-trips it
+            return value
+        if isinstance(field, models.DateTimeField):
+            parsed = parse_datetime(value)
+        elif isinstance(field, models.DateField):
+            parsed = parse_date(value)
+        else:
+            parsed = field.to_python(value)
+        if parsed is None:
+            raise ValueError(value)
+        return parsed
+
+    def _after(self, values):
+        # (a, b) after (x, y) in DESC order  <=>  a < x OR (a = x AND b < y)
+        condition = Q()
+        for i, key in enumerate(self.keys):
+            name = key.lstrip('-')
+            lookup = 'lt' if key.startswith('-') else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[i]})
+            for prev_key, prev_value in zip(self.keys[:i], values[:i]):
+                step &= Q(**{prev_key.lstrip('-'): prev_value})
+            condition |= step
+        return condition
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator that takes large counts from the Postgres planner instead of COUNT(*).
+
+    For the admin changelists: counting a million filtered bookings scans them
+    all, while EXPLAIN answers from table statistics. Results past the first
+    EXACT_COUNT_LIMIT rows are therefore approximate (page links near the end
+    may come up short or empty); smaller results and other databases are
+    counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        connection = connections[getattr(qs, 'db', 'default')]
+        if connection.vendor == 'postgresql' and hasattr(qs, 'query'):
+            sql, params = qs.order_by().query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+            if estimate > EXACT_COUNT_LIMIT:
+                return estimate
+        return super().count
@@ -0,0 +1,62 @@
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Reads go to the `replica` database (DATABASE_REPLICA_URL) only inside views
+# wrapped with @read_from_replica; everything else, and every write, uses the
+# primary. After a successful POST the client gets a short-lived cookie
+# (core.middleware.ReplicaStickinessMiddleware) that pins its reads to the
+# primary, so a guest sees their own booking (and a host their own edits)
+# even while the replica lags behind.
+REPLICA = 'replica'
+STICKY_COOKIE = 'db_primary'
+
+_read_db = ContextVar('read_db', default=DEFAULT_DB_ALIAS)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return _read_db.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def _replica_for(request):
+    if (REPLICA not in settings.DATABASES or request.method not in ('GET', 'HEAD')
+            or STICKY_COOKIE in request.COOKIES):
+        return DEFAULT_DB_ALIAS
+    return REPLICA
+
+
+def read_from_replica(view):
+    """Serve this view's reads from the replica, if one is configured and the client isn't pinned."""
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _read_db.set(_replica_for(request))
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _read_db.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _read_db.set(_replica_for(request))
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _read_db.reset(token)
+    return wrapper
+
@@ -0,0 +1,206 @@
+import math
+import re
+from datetime import datetime
+
+from django.db import connections
+from django.db.models import BooleanField, ExpressionWrapper, F, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from . import geo
+from .models import Listing, BookedNight
+
+DATE_FMT = "%Y-%m-%d"
+
+DEFAULT_KEYS = ('-created_at', '-id')
+RANKED_KEYS = ('-search_rank', '-id')
+NEAREST_KEYS = ('distance_sq', 'id')
+
+DEFAULT_RADIUS_KM = 5
+RADIUS_CHOICES = (2, 5, 10, 25, 50)
+PLACE_NAMES = sorted(geo.PLACES)  # suggestions for the "near" box
+
+_PG_TSQUERY = "(websearch_to_tsquery('english', %s) || websearch_to_tsquery('arabic', %s))"
+
+
+def _postgres_search(listings, q):
+    # search_vector is a generated column (migration 0007); city also gets
+    # trigram similarity so misspelt destinations ("Hurgada") still match.
+    # Both functions return float4 `real`; the rank is cast to double precision
+    # so the value a keyset cursor carries compares equal to the column again
+    # and rows tied on rank aren't skipped between pages.
+    match = RawSQL(
+        f"core_listing.search_vector @@ {_PG_TSQUERY} OR core_listing.city %% %s",
+        [q, q, q], output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        f"(ts_rank_cd(core_listing.search_vector, {_PG_TSQUERY}) + similarity(core_listing.city, %s))::double precision",
+        [q, q, q], output_field=FloatField(),
+    )
+    return listings.filter(match).annotate(search_rank=rank)
+
+
+def _sqlite_search(listings, q):
+    terms = re.findall(r'\w+', q)
+    if not terms:
+        return listings.none().annotate(search_rank=Value(0.0))
+    # prefix match every term; bm25 weights title > city > description. The
+    # match and the rank are both part of the listing query, so destination,
+    # dates and guests filter every match before anything is ranked or paged.
+    # The ranked matches are materialised once (LIMIT -1 keeps SQLite from
+    # flattening them into a per-row MATCH) and looked up by automatic index.
+    match = ' '.join(f'"{term}"*' for term in terms)
+    matched = RawSQL(
+        "core_listing.id IN (SELECT rowid FROM core_listing_fts WHERE core_listing_fts MATCH %s)",
+        [match], output_field=BooleanField(),
+    )
+    rank = RawSQL(
+        "(SELECT fts.score FROM (SELECT rowid AS listing_id, -bm25(core_listing_fts, 10.0, 5.0, 1.0) AS score "
+        "FROM core_listing_fts WHERE core_listing_fts MATCH %s LIMIT -1) AS fts "
+        "WHERE fts.listing_id = core_listing.id)",
+        [match], output_field=FloatField(),
+    )
+    return listings.filter(matched).annotate(search_rank=rank)
+
+
+def _fallback_search(listings, q):
+    return listings.filter(
+        Q(title__icontains=q) | Q(city__icontains=q) | Q(description__icontains=q)
+    ).annotate(search_rank=Value(0.0))
+
+
+def keyword_search(listings, q):
+    """Filter `listings` to matches for `q`, annotated with `search_rank` (higher is better)."""
+    vendor = connections[listings.db].vendor  # the replica when the view reads from one
+    if vendor == 'postgresql':
+        return _postgres_search(listings, q)
+    if vendor == 'sqlite':
+        return _sqlite_search(listings, q)
+    return _fallback_search(listings, q)
+
+
+def _float(value):
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if math.isfinite(number) else None
+
+
+def _wants_radius(params):
+    return bool(params.get('near', '').strip() or (params.get('lat') and params.get('lng')))
+
+
+def geo_point(params):
+    """(lat, lng) for a radius search: `near` (a known place) or `lat`/`lng`; None if absent or unknown."""
+    near = params.get('near', '').strip()
+    if near:
+        return geo.lookup(near)
+    lat, lng = _float(params.get('lat')), _float(params.get('lng'))
+    if lat is None or lng is None or not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        return None
+    return lat, lng
+
+
+def geo_radius(params):
+    radius = _float(params.get('radius'))
+    if radius is None or radius <= 0:
+        return DEFAULT_RADIUS_KM
+    return min(radius, geo.MAX_RADIUS_KM)
+
+
+def geo_bbox(params):
+    """(south, west, north, east) from `bbox=south,west,north,east`, or None if absent or malformed."""
+    parts = [_float(p) for p in params.get('bbox', '').split(',')]
+    if len(parts) != 4 or None in parts:
+        return None
+    south, west, north, east = parts
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        return None
+    return south, west, north, east
+
+
+def within_bbox(listings, south, west, north, east):
+    # the grid cells narrow the scan through the geo_cell index; huge
+    # viewports fall back to the (latitude, longitude) index alone
+    cells = geo.cells_in_bbox(south, west, north, east)
+    if cells is not None:
+        listings = listings.filter(geo_cell__in=cells)
+    return listings.filter(latitude__range=(south, north), longitude__range=(west, east))
+
+
+def within_radius(listings, lat, lng, radius_km):
+    """Listings within `radius_km` of (lat, lng), annotated with `distance_sq` (km²).
+
+    Distances use the equirectangular approximation, which is well inside a
+    percent of the great-circle distance at these radii and is plain
+    arithmetic on every database.
+    """
+    listings = within_bbox(listings, *geo.bbox_around(lat, lng, radius_km))
+    x = (F('longitude') - lng) * (geo.EARTH_KM_PER_DEG_LNG * math.cos(math.radians(lat)))
+    y = (F('latitude') - lat) * geo.EARTH_KM_PER_DEG_LAT
+    distance_sq = ExpressionWrapper(x * x + y * y, output_field=FloatField())
+    return listings.annotate(distance_sq=distance_sq).filter(distance_sq__lte=radius_km ** 2)
+
+
+def search_keys(params):
+    """Keyset ordering for a search: by rank for a keyword, nearest first for a radius, else newest first."""
+    if params.get('q', '').strip():
+        return RANKED_KEYS
+    if _wants_radius(params):
+        return NEAREST_KEYS
+    return DEFAULT_KEYS
+
+
+def parse_date_range(check_in_str, check_out_str):
+    """Return (check_in, check_out) dates, or (None, None) if missing, malformed or reversed."""
+    if not (check_in_str and check_out_str):
+        return None, None
+    try:
+        check_in = datetime.strptime(check_in_str, DATE_FMT).date()
+        check_out = datetime.strptime(check_out_str, DATE_FMT).date()
+    except ValueError:
+        # bad date format: ignore dates
+        return None, None
+    if check_in >= check_out:
+        return None, None
+    return check_in, check_out
+
+
+def search_listings(params):
+    """Apply the `home` search filters found in `params` (e.g. request.GET)."""
+    destination = params.get('destination', '').strip()
+    check_in, check_out = parse_date_range(params.get('check_in', '').strip(),
+                                           params.get('check_out', '').strip())
+    guests = params.get('guests', '').strip()
+    q = params.get('q', '').strip()
+
+    listings = Listing.objects.all()
+
+    # destination dropdown filter
+    if destination:
+        listings = listings.filter(city__iexact=destination)  # exact city from dropdown
+
+    # optional keyword search (title/desc/city), ranked
+    if q:
+        listings = keyword_search(listings, q)
+
+    # date filtering: exclude listings with a booked night inside the range
+    if check_in:
+        listings = listings.exclude(id__in=BookedNight.listing_ids_between(check_in, check_out))
+
+    # capacity filter if guests provided
+    if guests.isdigit():
+        listings = listings.filter(capacity__gte=int(guests))
+
+    # map viewport and "near a place" filters
+    bbox = geo_bbox(params)
+    if bbox:
+        listings = within_bbox(listings, *bbox)
+    if _wants_radius(params):
+        point = geo_point(params)
+        if point is None:
+            # unknown place or bad coordinates: nothing is near it
+            return listings.none().annotate(distance_sq=Value(0.0))
+        listings = within_radius(listings, *point, geo_radius(params))
+
+    return listings
@@ -0,0 +1,7 @@
+// Host bookings: the header checkbox selects every booking on the page.
+const selectAll = document.getElementById('select-all');
+if (selectAll) {
+  selectAll.addEventListener('change', () => {
+    document.querySelectorAll('input[name=booking_ids]').forEach((cb) => { cb.checked = selectAll.checked; });
+  });
+}
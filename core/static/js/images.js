@@ -0,0 +1,5 @@
+// {% responsive_img %}: show each photo's blurred placeholder (data-placeholder)
+// behind it until the photo itself has loaded.
+document.querySelectorAll('img[data-placeholder]').forEach((img) => {
+  if (!img.complete) img.style.backgroundImage = `url("${img.dataset.placeholder}")`;
+});
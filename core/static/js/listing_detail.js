@@ -0,0 +1,54 @@
+// Listing page: booking date guard and drag-and-drop gallery ordering.
+// reject stays overlapping a booked range before they reach the server
+const bookingForm = document.getElementById('booking-form');
+const blocked = JSON.parse(document.getElementById('blocked-ranges').textContent);
+bookingForm.addEventListener('submit', (e) => {
+  const checkIn = bookingForm.elements.check_in.value;
+  const checkOut = bookingForm.elements.check_out.value;
+  if (checkIn && checkOut && blocked.some(([start, end]) => checkIn < end && checkOut > start)) {
+    e.preventDefault();
+    document.getElementById('booking-status').textContent = 'Some of those nights are already booked; see the calendar below.';
+  }
+});
+const gallery = document.getElementById('gallery');
+const orderInput = document.getElementById('order-input');
+if (gallery) {
+  let dragSrc;
+  gallery.addEventListener('dragstart', (e) => {
+    const card = e.target.closest('[data-id]');
+    if (!card) return;
+    dragSrc = card;
+    e.dataTransfer.effectAllowed = 'move';
+  });
+  gallery.addEventListener('dragover', (e) => {
+    e.preventDefault();
+    const over = e.target.closest('[data-id]');
+    if (!over || over === dragSrc) return;
+    const rect = over.getBoundingClientRect();
+    const before = (e.clientY - rect.top) / (rect.bottom - rect.top) < 0.5;
+    gallery.insertBefore(dragSrc, before ? over : over.nextSibling);
+  });
+  const serialize = () => Array.from(gallery.querySelectorAll('[data-id]')).map(el => el.dataset.id).join(',');
+  const orderForm = document.getElementById('order-form');
+  const orderStatus = document.getElementById('order-status');
+  gallery.addEventListener('drop', (e) => {
+    e.preventDefault();
+    orderInput.value = serialize();
+    const url = orderForm.dataset.jsonUrl;
+    if (!url) return;
+    // save in place; the "Save order" button remains as a no-JS fallback
+    fetch(url, {
+      method: 'POST',
+      headers: {
+        'Content-Type': 'application/json',
+        'X-CSRFToken': orderForm.querySelector('[name=csrfmiddlewaretoken]').value,
+      },
+      body: JSON.stringify({order: orderInput.value.split(',').map(Number)}),
+    })
+      .then(r => r.json().then(data => ({ok: r.ok, data})))
+      .then(({ok, data}) => { orderStatus.textContent = ok ? 'Order saved. First photo is the cover.' : data.error; })
+      .catch(() => { orderStatus.textContent = 'Could not save order; use the button below.'; });
+  });
+  // initialize order on load
+  orderInput.value = serialize();
+}
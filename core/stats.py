@@ -0,0 +1,134 @@
+from datetime import date, timedelta
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Count, F, Min, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import BookedNight, Booking, Listing, ListingImage, ListingStats
+
+# ListingStats rows are recomputed from the source tables (a few grouped,
+# indexed queries per batch) rather than incremented, so a recompute is also
+# the repair for any drift. Saves and deletes recompute through the receivers
+# below, inside the saving transaction (Booking.save is atomic); the set-based
+# paths that skip signals (core.bookings) call refresh_listing_stats
+# themselves. Two booking saves skip the recompute: a new pending request,
+# which only adds one to pending_count, and a save that leaves the status as
+# it was, which changes no counter.
+OCCUPANCY_DAYS = 30
+BATCH_SIZE = 500
+
+STAT_FIELDS = ('image_count', 'pending_count', 'approved_count', 'upcoming_nights', 'next_check_in', 'as_of')
+
+
+def _compute(listing_ids, today, using=DEFAULT_DB_ALIAS):
+    stats = {
+        pk: ListingStats(listing_id=pk, as_of=today)
+        for pk in Listing.objects.using(using).filter(pk__in=listing_ids).values_list('pk', flat=True)
+    }
+    if not stats:
+        return []
+    images = (ListingImage.objects.using(using)
+              .filter(listing_id__in=stats).values('listing_id')
+              .annotate(n=Count('id')).order_by())
+    for row in images:
+        stats[row['listing_id']].image_count = row['n']
+    approved = Q(status=Booking.Status.APPROVED)
+    bookings = (Booking.objects.using(using)
+                .filter(listing_id__in=stats).values('listing_id')
+                .annotate(pending=Count('id', filter=Q(status=Booking.Status.PENDING)),
+                          approved=Count('id', filter=approved),
+                          next_check_in=Min('check_in', filter=approved & Q(check_in__gte=today)))
+                .order_by())
+    for row in bookings:
+        s = stats[row['listing_id']]
+        s.pending_count, s.approved_count, s.next_check_in = row['pending'], row['approved'], row['next_check_in']
+    nights = (BookedNight.objects.using(using)
+              .filter(listing_id__in=stats, night__gte=today, night__lt=today + timedelta(days=OCCUPANCY_DAYS))
+              .values('listing_id').annotate(n=Count('id')).order_by())
+    for row in nights:
+        stats[row['listing_id']].upcoming_nights = row['n']
+    return list(stats.values())
+
+
+def refresh_listing_stats(listing_ids, today=None):
+    """Recompute and save the ListingStats rows for `listing_ids`; returns them by listing id."""
+    today = today or date.today()
+    ids = sorted(set(listing_ids))
+    refreshed = {}
+    for start in range(0, len(ids), BATCH_SIZE):
+        with transaction.atomic():
+            # from the primary, where the rows are written back
+            rows = _compute(ids[start:start + BATCH_SIZE], today)
+            ListingStats.objects.bulk_create(rows, update_conflicts=True,
+                                             unique_fields=['listing'], update_fields=STAT_FIELDS)
+        refreshed.update((s.listing_id, s) for s in rows)
+    return refreshed
+
+
+def attach_listing_stats(listings):
+    """Give each listing its `stats`, computing fresh ones where the row is missing or from an earlier day.
+
+    Expects `listings` loaded with select_related('stats'); on an ordinary
+    day this costs no queries beyond that join. Nothing is saved, so pages
+    can call it on a GET (and on a replica); `rebuild_listing_stats` moves
+    the rows on to the new day.
+    """
+    listings = list(listings)
+    today = date.today()
+    stale = []
+    for listing in listings:
+        try:
+            if listing.stats.as_of == today:
+                continue
+        except ListingStats.DoesNotExist:
+            pass
+        stale.append(listing)
+    if stale:
+        computed = {s.listing_id: s for s in _compute([l.pk for l in stale], today, using=stale[0]._state.db)}
+        for listing in stale:
+            listing.stats = computed[listing.pk]
+    return listings
+
+
+def _refresh_on_delete(instance, origin):
+    if origin is None or isinstance(origin, type(instance)) or getattr(origin, 'model', None) is type(instance):
+        refresh_listing_stats([instance.listing_id])
+        return
+    # part of a cascade (a listing or user being deleted): the listing may be
+    # gone by commit time, so collect the ids on the delete's origin and
+    # refresh once afterwards; refresh_listing_stats skips missing listings
+    ids = getattr(origin, '_stats_listing_ids', None)
+    if ids is None:
+        ids = origin._stats_listing_ids = set()
+        transaction.on_commit(lambda: refresh_listing_stats(ids))
+    ids.add(instance.listing_id)
+
+
+@receiver(post_save, sender=Listing)
+def _listing_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ListingStats.objects.create(listing=instance, as_of=date.today())
+
+
+@receiver(post_save, sender=Booking)
+def _booking_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or (not created and instance.status == instance.saved_status):
+        return
+    if created and instance.status == Booking.Status.PENDING:
+        ListingStats.objects.filter(listing_id=instance.listing_id).update(pending_count=F('pending_count') + 1)
+        return
+    refresh_listing_stats([instance.listing_id])
+
+
+@receiver(post_save, sender=ListingImage)
+def _image_saved(sender, instance, created, raw=False, **kwargs):
+    # image edits (cover, ordering) change no counts
+    if created and not raw:
+        refresh_listing_stats([instance.listing_id])
+
+
+@receiver(post_delete, sender=Booking)
+@receiver(post_delete, sender=ListingImage)
+def _child_deleted(sender, instance, origin=None, **kwargs):
+    _refresh_on_delete(instance, origin)
@@ -0,0 +1,47 @@
+"""Background tasks run by `manage.py runworker` (see core.jobs.enqueue)."""
+from django.conf import settings
+from django.core.mail import send_mail
+
+from .caching import bump_listing_version
+from .models import Booking
+from .uploads import store_remote_image, store_uploads
+
+
+def notify_booking_request(booking_id):
+    booking = Booking.objects.select_related('listing__host', 'guest').filter(pk=booking_id).first()
+    if booking is None or not booking.listing.host.email:
+        return
+    send_mail(
+        f"New booking request for {booking.listing.title}",
+        f"{booking.guest.username} asked to stay {booking.check_in} → {booking.check_out} "
+        f"({booking.guests_count} guest(s)).",
+        settings.DEFAULT_FROM_EMAIL,
+        [booking.listing.host.email],
+    )
+
+
+def notify_booking_status(booking_id):
+    booking = Booking.objects.select_related('listing', 'guest').filter(pk=booking_id).first()
+    if booking is None or not booking.guest.email:
+        return
+    send_mail(
+        f"Your booking for {booking.listing.title} was {booking.get_status_display().lower()}",
+        f"{booking.listing.title}: {booking.check_in} → {booking.check_out}, status {booking.get_status_display()}.",
+        settings.DEFAULT_FROM_EMAIL,
+        [booking.guest.email],
+    )
+
+
+def expire_replica_reads(listing_id, search=True):
+    """Second version bump queued by bump_listing_version when a read replica is configured."""
+    bump_listing_version(listing_id, search=search, replica_recheck=False)
+
+
+def fetch_listing_image(listing_id, url, sort_order=0):
+    """Download a gallery image named by URL in a bulk listing import (core.transfer)."""
+    store_remote_image(listing_id, url, sort_order)
+
+
+def store_listing_uploads(upload_ids):
+    """Store gallery photos staged by an upload (core.uploads.queue_listing_images)."""
+    store_uploads(upload_ids)
@@ -0,0 +1,58 @@
+from django import template
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from django.template.loader import get_template
+from django.utils.safestring import mark_safe
+
+from core.caching import listing_versions
+
+register = template.Library()
+
+# Rendered card HTML per (kind, listing, cache version). A grid fetches all of
+# its cards with one get_many and renders only the misses; saving a listing or
+# its gallery bumps the version, so stale cards are never looked up again.
+CARD_TEMPLATES = {
+    'home': 'core/includes/listing_card.html',    # the whole search result card
+    'host': 'core/includes/listing_cover.html',   # cover only; the dashboard body is live
+}
+CARD_TIMEOUT = 60 * 60 * 24
+
+_KEY = 'listing-card:{}:{}:{}'
+
+
+def card_image(listing):
+    """Which picture a card shows: gallery cover, legacy upload, legacy URL, else None."""
+    cover = listing.cover_image
+    if cover:
+        return {'image': cover.image}
+    if listing.image:
+        return {'image': listing.image}
+    if listing.image_url:
+        return {'url': listing.image_url}
+    return None
+
+
+@register.simple_tag
+def listing_cards(listings, kind='home'):
+    """[(listing, card html)] for `listings`, from the cache where possible.
+
+    Usage: {% listing_cards listings 'home' as cards %}{% for l, card in cards %}{{ card }}{% endfor %}
+    """
+    listings = list(listings)
+    missing = [l.pk for l in listings if getattr(l, 'cache_version', None) is None]
+    if missing:
+        versions = listing_versions(missing)
+        for l in listings:
+            if l.pk in versions:
+                l.cache_version = versions[l.pk]
+    keys = [_KEY.format(kind, l.pk, l.cache_version) for l in listings]
+    cards = cache.get_many(keys)
+    # galleries are only needed (and loaded, in one query) for cards not in the cache
+    stale = [(key, listing) for key, listing in zip(keys, listings) if key not in cards]
+    if stale:
+        prefetch_related_objects([listing for _, listing in stale], 'images')
+        card = get_template(CARD_TEMPLATES[kind])
+        rendered = {key: card.render({'l': listing, 'picture': card_image(listing)}) for key, listing in stale}
+        cards.update(rendered)
+        cache.set_many(rendered, CARD_TIMEOUT)
+    return [(listing, mark_safe(cards[key])) for key, listing in zip(keys, listings)]
@@ -0,0 +1,37 @@
+from django import template
+from django.templatetags.static import static
+
+from core.images import VARIANTS, placeholder_url, srcset, variant_url
+
+register = template.Library()
+
+SIZES = {
+    'thumb': '(min-width: 768px) 20vw, 50vw',
+    'card': '(min-width: 768px) 33vw, 100vw',
+    'full': '100vw',
+}
+
+
+@register.inclusion_tag('core/includes/responsive_img.html')
+def responsive_img(image, variant='card', alt='', css_class='', size='', lazy=True):
+    """<img> for a CloudinaryField value with srcset, lazy loading and a blur placeholder.
+
+    The box is 200px tall, or as tall as the img-cover-`size` class in
+    css/critical.css; js/images.js paints the placeholder behind it.
+    """
+    width = VARIANTS[variant]
+    src = variant_url(image, width)
+    if not src:
+        # local mode with the source file missing
+        return {'src': static('img/placeholder.jpg'), 'alt': alt, 'css_class': css_class,
+                'size': size, 'lazy': lazy}
+    return {
+        'src': src,
+        'srcset': srcset(image, width),
+        'sizes': SIZES[variant],
+        'placeholder': placeholder_url(image),
+        'alt': alt,
+        'css_class': css_class,
+        'size': size,
+        'lazy': lazy,
+    }
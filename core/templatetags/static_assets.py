@@ -0,0 +1,29 @@
+from functools import lru_cache
+
+from django import template
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.utils.safestring import mark_safe
+
+register = template.Library()
+
+
+@lru_cache(maxsize=None)
+def _read(path):
+    found = finders.find(path)
+    if not found:
+        raise template.TemplateSyntaxError(f'inline_static: static file {path!r} not found')
+    with open(found, encoding='utf-8') as fh:
+        return fh.read()
+
+
+@register.simple_tag
+def inline_static(path):
+    """Contents of a (small, trusted) static file, for inlining critical CSS.
+
+    Read once per process; with DEBUG every render rereads it so edits show up.
+    Usage: <style>{% inline_static 'css/critical.css' %}</style>
+    """
+    if settings.DEBUG:
+        _read.cache_clear()
+    return mark_safe(_read(path))
@@ -0,0 +1,1067 @@
+import importlib
+import io
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from contextlib import redirect_stdout
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from PIL import Image
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.cache import cache
+from django.core.management import call_command
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connection, connections, router, transaction
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import path, reverse
+from django.utils import timezone
+
+from core.middleware import QueryBudgetExceeded
+from core import async_views, transfer, urls
+from core.availability import blocked_ranges
+from core.caching import bump_listing_version, search_generation
+from core.bookings import approve_bookings, decline_bookings
+from core.facets import FACET_TTL, city_facets, invalidate_facets
+from core.gallery import reorder_images, set_cover
+from core.images import placeholder_url, srcset, variant_url
+from core.jobs import JOB_LOCK_TIMEOUT, claim_job, heartbeat, prune_finished_jobs, requeue_stale_jobs, run_job
+from core.models import BookedNight, Booking, ImageUpload, Job, Listing, ListingImage, ListingStats, Profile
+from core.pagination import KeysetPaginator
+from core.routers import REPLICA, STICKY_COOKIE, read_from_replica
+from core.geo import PLACES, cell_for
+from core.search import RANKED_KEYS, search_keys, search_listings
+from core.stats import refresh_listing_stats
+from core.templatetags.listing_cards import card_image, listing_cards
+from core.uploads import queue_listing_images, upload_status
+
+
+# pages render {% static %} without a collectstatic manifest
+renders_pages = override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+
+
+def make_listings(host, count, **fields):
+    fields = {'title': 'Listing', 'description': 'A place to stay', 'city': 'Cairo',
+              'address': '1 Nile street', 'price_per_night': 500, **fields}
+    return Listing.objects.bulk_create([Listing(host=host, **fields) for _ in range(count)])
+
+
+def make_booking(listing, guest, days_ahead, nights=2, status=Booking.Status.PENDING):
+    check_in = date.today() + timedelta(days=days_ahead)
+    return Booking.objects.create(listing=listing, guest=guest, check_in=check_in,
+                                  check_out=check_in + timedelta(days=nights), status=status)
+
+
+def make_user(username, role=Profile.Role.GUEST, **extra):
+    user = User.objects.create_user(username, f'{username}@example.com', 'pw-12345-secret', **extra)
+    Profile.objects.filter(user=user).update(role=role)
+    return User.objects.select_related('profile').get(pk=user.pk)
+
+
+# A `replica` connection mirroring the test database, as settings.py sets one up
+# with DATABASE_REPLICA_URL; registered before the runner creates the test
+# databases. connections.settings is settings.DATABASES itself, so it gets a
+# copy: the app only routes to the replica where a test adds it to the latter.
+if REPLICA not in connections.settings:
+    _default = connections.settings[DEFAULT_DB_ALIAS]
+    connections.settings = {**connections.settings,
+                            REPLICA: {**_default, 'TEST': {**_default['TEST'], 'MIRROR': DEFAULT_DB_ALIAS}}}
+
+
+class SignupTests(TestCase):
+    def test_signup_creates_account_and_logs_in(self):
+        response = self.client.post(reverse('signup'), {
+            'username': 'newhost', 'email': 'newhost@example.com',
+            'password1': 'a-Long-pass-123', 'password2': 'a-Long-pass-123', 'role': Profile.Role.HOST,
+        })
+        self.assertRedirects(response, reverse('home'), fetch_redirect_response=False)
+        user = User.objects.get(username='newhost')
+        self.assertEqual(user.profile.role, Profile.Role.HOST)
+        self.assertEqual(int(self.client.session['_auth_user_id']), user.pk)
+        self.assertEqual(self.client.session['_auth_user_backend'], 'core.backends.ProfileBackend')
+
+
+class KeywordSearchTests(TestCase):
+    def setUp(self):
+        self.host = make_user('host', Profile.Role.HOST)
+
+    def test_other_filters_apply_to_every_match(self):
+        # plenty of better-ranked matches elsewhere must not crowd out the Aswan ones
+        make_listings(self.host, 600, title='Villa with a pool')
+        aswan = make_listings(self.host, 3, city='Aswan', description='A quiet villa by the river')
+        results = search_listings({'q': 'villa', 'destination': 'Aswan'})
+        self.assertCountEqual([l.pk for l in results], [l.pk for l in aswan])
+
+    def test_ranks_title_matches_first(self):
+        in_description = make_listings(self.host, 1, description='Not far from the villa district')[0]
+        in_title = make_listings(self.host, 1, title='Garden villa')[0]
+        results = list(search_listings({'q': 'villa'}).order_by('-search_rank', '-id'))
+        self.assertEqual(results, [in_title, in_description])
+
+    def test_pages_through_tied_ranks(self):
+        tied = make_listings(self.host, 7, title='Beach villa')
+        paginator = KeysetPaginator(search_listings({'q': 'villa'}), per_page=3, keys=RANKED_KEYS)
+        seen, cursor = [], None
+        while True:
+            page = paginator.get_page(cursor)
+            seen += [l.pk for l in page]
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        self.assertEqual(seen, sorted((l.pk for l in tied), reverse=True))
+
+
+class CityFacetTests(TestCase):
+    def setUp(self):
+        invalidate_facets()
+        self.host = make_user('host', Profile.Role.HOST)
+        make_listings(self.host, 2, city='Cairo', price_per_night=300)
+        make_listings(self.host, 1, city='Aswan', price_per_night=900)
+
+    def test_facets_are_loaded_once_and_dropped_when_a_listing_changes(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(city_facets(), [
+                {'city': 'Aswan', 'count': 1, 'min_price': 900, 'max_price': 900},
+                {'city': 'Cairo', 'count': 2, 'min_price': 300, 'max_price': 300},
+            ])
+        with self.assertNumQueries(0):
+            city_facets()
+        Listing.objects.create(host=self.host, title='New', description='x', city='Luxor',
+                               address='1 Temple street', price_per_night=400)
+        self.assertEqual([f['city'] for f in city_facets()], ['Aswan', 'Cairo', 'Luxor'])
+
+    def test_facets_are_reloaded_after_the_ttl(self):
+        city_facets()
+        with mock.patch('core.facets.time.monotonic', return_value=time.monotonic() + FACET_TTL + 1), \
+                self.assertNumQueries(1):
+            city_facets()
+
+    def test_guests_filter_on_capacity_without_probing_the_schema(self):
+        roomy = make_listings(self.host, 1, capacity=6)[0]
+        with self.assertNumQueries(1):
+            self.assertEqual([l.pk for l in search_listings({'guests': '5'})], [roomy.pk])
+
+
+class GeoSearchTests(TestCase):
+    def setUp(self):
+        self.host = make_user('host', Profile.Role.HOST)
+        self.zamalek = self._listing('Cairo', '12 Brazil street, Zamalek')  # ~2.4 km from central Cairo
+        self.maadi = self._listing('Cairo', 'Road 9, Maadi')                # ~9.5 km
+        self.alex = self._listing('الإسكندرية', '3 Corniche road')
+
+    def _listing(self, city, address):
+        return Listing.objects.create(host=self.host, title='Flat', description='A place to stay', city=city,
+                                      address=address, price_per_night=500)
+
+    def _ids(self, params):
+        return [l.pk for l in search_listings(params).order_by(*search_keys(params))]
+
+    def test_geocodes_the_most_specific_known_place(self):
+        self.assertEqual((self.zamalek.latitude, self.zamalek.longitude), PLACES['Zamalek'])
+        self.assertEqual((self.alex.latitude, self.alex.longitude), PLACES['Alexandria'])
+        self.assertEqual(self.alex.geo_cell, cell_for(*PLACES['Alexandria']))
+
+    def test_radius_search_is_nearest_first(self):
+        self.assertEqual(self._ids({'near': 'Cairo', 'radius': '5'}), [self.zamalek.pk])
+        self.assertEqual(self._ids({'near': 'Cairo', 'radius': '15'}), [self.zamalek.pk, self.maadi.pk])
+        self.assertEqual(self._ids({'lat': '31.2', 'lng': '29.9', 'radius': '5'}), [self.alex.pk])
+        self.assertEqual(self._ids({'near': 'Atlantis'}), [])
+
+    def test_bbox_search(self):
+        self.assertCountEqual(self._ids({'bbox': '29.9,31.1,30.2,31.4'}), [self.zamalek.pk, self.maadi.pk])
+        self.assertEqual(self._ids({'bbox': 'not,a,box'}), self._ids({}))
+
+    def test_feed_reports_distances(self):
+        response = self.client.get(reverse('listings_feed'), {'near': 'Cairo', 'radius': '15'})
+        distances = [row['distance_km'] for row in response.json()['results']]
+        self.assertEqual(len(distances), 2)
+        self.assertAlmostEqual(distances[0], 2.4, delta=0.3)
+        self.assertAlmostEqual(distances[1], 9.5, delta=0.5)
+
+
+@renders_pages
+class ListingCardQueryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_facets()  # process-level, and bulk_create sends no signals
+        self.host = make_user('host', Profile.Role.HOST)
+
+    def _add_gallery(self, listings):
+        ListingImage.objects.bulk_create([
+            ListingImage(listing=listing, image=f'listing_images/{listing.pk}-{i}.jpg', is_cover=i == 1, sort_order=i)
+            for listing in listings for i in range(3)
+        ])
+
+    def test_cover_image_uses_prefetched_gallery(self):
+        self._add_gallery(make_listings(self.host, 5))
+        with self.assertNumQueries(2):
+            covers = [l.cover_image for l in Listing.objects.prefetch_related('images')]
+        self.assertEqual([c.sort_order for c in covers], [1] * 5)
+
+    def test_home_page_query_count_does_not_grow_with_cards(self):
+        self._add_gallery(make_listings(self.host, 9))
+        # listings page, city facets, one gallery prefetch for the whole grid
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('home'))
+        self.assertEqual(len(response.context['listings']), 9)
+
+    def test_warm_cards_load_no_images_and_only_changed_cards_are_rendered(self):
+        listings = make_listings(self.host, 3)
+        self._add_gallery(listings)
+        with self.assertNumQueries(2):  # listings, then one gallery prefetch for the cold grid
+            listing_cards(Listing.objects.filter(pk__in=[l.pk for l in listings]).order_by('pk'))
+        with self.assertNumQueries(1):  # only the listings: no image query for warm cards
+            cards = listing_cards(Listing.objects.filter(pk__in=[l.pk for l in listings]).order_by('pk'))
+        self.assertEqual(len(cards), 3)
+        Listing.objects.filter(pk=listings[1].pk).update(title='Renamed')
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_listing_version(listings[1].pk)
+        with self.assertNumQueries(2):  # listings, then the gallery of the one stale card
+            cards = listing_cards(Listing.objects.filter(pk__in=[l.pk for l in listings]).order_by('pk'))
+        self.assertEqual(['Renamed' in html for _, html in cards], [False, True, False])
+
+    def test_card_picture_falls_back_from_cover_to_upload_to_url(self):
+        with_url, with_upload, with_gallery, bare = make_listings(self.host, 4)
+        self._add_gallery([with_gallery])
+        Listing.objects.filter(pk=with_url.pk).update(image_url='https://example.com/a.jpg')
+        Listing.objects.filter(pk=with_upload.pk).update(image='listing_images/upload.jpg')
+        listings = {l.pk: l for l in Listing.objects.prefetch_related('images')}
+        self.assertEqual(card_image(listings[with_url.pk]), {'url': 'https://example.com/a.jpg'})
+        self.assertEqual(str(card_image(listings[with_upload.pk])['image']), 'listing_images/upload')
+        self.assertEqual(card_image(listings[with_gallery.pk])['image'].public_id, f'listing_images/{with_gallery.pk}-1')
+        self.assertIsNone(card_image(listings[bare.pk]))
+
+    def test_empty_page_still_links_back_to_the_first(self):
+        listings = make_listings(self.host, 10)
+        cursor = self.client.get(reverse('home'), {'guests': 1}).context['page_obj'].next_cursor
+        Listing.objects.filter(pk=listings[0].pk).delete()  # the last one in the default order
+        response = self.client.get(reverse('home'), {'guests': 1, 'cursor': cursor})
+        self.assertEqual(len(response.context['page_obj']), 0)
+        self.assertContains(response, 'href="?guests=1">First page')
+
+
+@renders_pages
+@override_settings(PERF_INSTRUMENTATION=True, PERF_ENFORCE_BUDGETS=True, PERF_LOG_FILE='')
+class QueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = make_user('host', Profile.Role.HOST)
+        self.guest = make_user('guest')
+        self.listings = make_listings(self.host, 12)
+        for i, listing in enumerate(self.listings[:4]):
+            make_booking(listing, self.guest, days_ahead=10 + i, status=Booking.Status.APPROVED)
+            make_booking(listing, self.guest, days_ahead=20 + i)
+        refresh_listing_stats([l.pk for l in self.listings])
+
+    def test_views_stay_within_their_budgets(self):
+        pk = self.listings[0].pk
+        anonymous = [reverse('home'), reverse('home') + '?q=listing&guests=2', reverse('listing_detail', args=[pk]),
+                     reverse('listings_feed'), reverse('api_listing_detail', args=[pk]),
+                     reverse('api_listing_availability', args=[pk])]
+        for url in anonymous:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('db;dur=', response['Server-Timing'])
+        for user, names in ((self.host, ['my_listings', 'host_bookings']), (self.guest, ['my_bookings'])):
+            self.client.force_login(user)
+            for name in names:
+                with self.subTest(view=name):
+                    self.assertEqual(self.client.get(reverse(name)).status_code, 200)
+
+    @override_settings(PERF_QUERY_BUDGETS={'home': 1})
+    def test_overrun_raises(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'home ran'):
+            self.client.get(reverse('home'))
+
+
+class ListingStatsTests(TestCase):
+    def setUp(self):
+        self.host = make_user('host', Profile.Role.HOST)
+        self.guest = make_user('guest')
+        self.listing = make_listings(self.host, 1)[0]
+        refresh_listing_stats([self.listing.pk])
+
+    def stats(self):
+        return ListingStats.objects.get(listing=self.listing)
+
+    def test_new_request_counts_without_a_recompute(self):
+        with mock.patch('core.stats.refresh_listing_stats') as refresh:
+            make_booking(self.listing, self.guest, days_ahead=10)
+        refresh.assert_not_called()
+        self.assertEqual(self.stats().pending_count, 1)
+
+    def test_save_without_status_change_skips_the_recompute(self):
+        booking = Booking.objects.get(pk=make_booking(self.listing, self.guest, days_ahead=10).pk)
+        booking.message = 'Arriving late'
+        with mock.patch('core.stats.refresh_listing_stats') as refresh:
+            booking.save()
+        refresh.assert_not_called()
+
+    def test_decline_view_recomputes_in_the_booking_transaction(self):
+        booking = make_booking(self.listing, self.guest, days_ahead=10)
+        self.client.force_login(self.host)
+        with mock.patch('core.stats._compute', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.client.post(reverse('decline_booking', args=[booking.pk]))
+        booking.refresh_from_db()
+        self.assertEqual(booking.status, Booking.Status.PENDING)
+        self.client.post(reverse('decline_booking', args=[booking.pk]))
+        self.assertEqual(self.stats().pending_count, 0)
+
+    @renders_pages
+    def test_dashboard_computes_stale_rows_without_saving(self):
+        make_booking(self.listing, self.guest, days_ahead=10)
+        yesterday = date.today() - timedelta(days=1)
+        ListingStats.objects.update(as_of=yesterday, pending_count=0)
+        self.client.force_login(self.host)
+        response = self.client.get(reverse('my_listings'))
+        self.assertEqual(response.context['listings'][0].stats.pending_count, 1)
+        self.assertEqual(self.stats().as_of, yesterday)
+
+
+class AsyncMiddlewareTests(TestCase):
+    @override_settings(DEBUG=True)  # the handler only logs adaptations with DEBUG
+    def test_middleware_chain_stays_async(self):
+        with mock.patch('django.core.handlers.base.logger') as log:
+            ASGIHandler()
+        adapted = [call.args[1] for call in log.debug.call_args_list if 'adapted' in call.args[0]]
+        self.assertEqual(adapted, [])
+
+    @renders_pages
+    async def test_preload_header_under_asgi(self):
+        response = await self.async_client.get(reverse('home'))
+        self.assertIn('rel=preload', response['Link'])
+
+    @renders_pages
+    @override_settings(PERF_INSTRUMENTATION=True, PERF_LOG_FILE='')
+    async def test_queries_are_counted_under_asgi(self):
+        make = sync_to_async(lambda: make_listings(make_user('host', Profile.Role.HOST), 2))
+        await make()
+        response = await self.async_client.get(reverse('listing_detail', args=[(await Listing.objects.afirst()).pk]))
+        queries = int(re.search(r'"(\d+) queries"', response['Server-Timing']).group(1))
+        self.assertGreater(queries, 0)
+
+
+class AsyncUrls:
+    """The read-heavy routes served by core.async_views, whatever ASYNC_VIEWS says."""
+    urlpatterns = [
+        path('', async_views.home, name='home'),
+        path('listing/<int:pk>/', async_views.listing_detail, name='listing_detail'),
+        path('api/listings/', async_views.listings_feed, name='listings_feed'),
+        path('api/listings/<int:pk>/', async_views.api_listing_detail, name='api_listing_detail'),
+        path('api/listings/<int:pk>/availability', async_views.api_listing_availability,
+             name='api_listing_availability'),
+    ] + urls.urlpatterns
+
+
+@renders_pages
+@override_settings(ROOT_URLCONF=AsyncUrls)
+class AsyncViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        invalidate_facets()
+        self.host = make_user('host', Profile.Role.HOST)
+        self.listings = make_listings(self.host, 3, capacity=4)
+        self.listing = self.listings[0]
+
+    async def test_home_lists_the_listings(self):
+        response = await self.async_client.get(reverse('home'), {'guests': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['listings']), 3)
+        self.assertContains(response, 'Cairo')
+
+    async def test_detail(self):
+        response = await self.async_client.get(reverse('listing_detail', args=[self.listing.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['listing'], self.listing)
+        missing = await self.async_client.get(reverse('listing_detail', args=[0]))
+        self.assertEqual(missing.status_code, 404)
+
+    async def test_booking_post_is_delegated_to_the_sync_view(self):
+        guest = await sync_to_async(make_user)('guest')
+        await self.async_client.aforce_login(guest)
+        check_in = date.today() + timedelta(days=5)
+        response = await self.async_client.post(reverse('listing_detail', args=[self.listing.pk]), {
+            'check_in': check_in, 'check_out': check_in + timedelta(days=2), 'guests_count': 1})
+        self.assertRedirects(response, reverse('my_bookings'), fetch_redirect_response=False)
+        self.assertTrue(await Booking.objects.filter(listing=self.listing, guest=guest).aexists())
+
+    async def test_feed_pages_as_json(self):
+        response = await self.async_client.get(reverse('listings_feed'), {'limit': 2})
+        page = json.loads(response.content)
+        self.assertEqual(len(page['results']), 2)
+        rest = json.loads((await self.async_client.get(reverse('listings_feed'), {'cursor': page['next']})).content)
+        self.assertEqual({r['id'] for r in page['results'] + rest['results']}, {l.pk for l in self.listings})
+
+    async def test_feed_streams_ndjson(self):
+        response = await self.async_client.get(reverse('listings_feed'), {'format': 'ndjson'})
+        self.assertTrue(response.is_async)
+        body = b''.join([chunk async for chunk in response.streaming_content]).decode()
+        self.assertEqual(sorted(json.loads(line)['id'] for line in body.splitlines()),
+                         sorted(l.pk for l in self.listings))
+
+    async def test_unchanged_resources_answer_304(self):
+        for url in (reverse('listings_feed'), reverse('api_listing_detail', args=[self.listing.pk]),
+                    reverse('api_listing_availability', args=[self.listing.pk])):
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                again = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+                self.assertEqual(again.status_code, 304)
+                self.assertEqual(again.content, b'')
+
+
+class BookingOverlapTests(TestCase):
+    def setUp(self):
+        self.host = make_user('host', Profile.Role.HOST)
+        self.listing = make_listings(self.host, 1)[0]
+        self.first = make_booking(self.listing, make_user('first'), days_ahead=10, nights=3)
+        self.second = make_booking(self.listing, make_user('second'), days_ahead=11, nights=3)
+
+    def test_booked_nights_are_unique_per_listing(self):
+        self.first.approve()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            BookedNight.objects.create(listing=self.listing, booking=self.second, night=self.first.check_out - timedelta(days=1))
+
+    def test_overlapping_approval_is_refused(self):
+        self.assertTrue(self.first.approve())
+        self.assertFalse(self.second.approve())
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.status, Booking.Status.PENDING)
+        self.assertEqual(set(BookedNight.objects.values_list('booking_id', flat=True)), {self.first.pk})
+
+    def test_approve_view_reports_taken_dates(self):
+        self.first.approve()
+        self.client.force_login(self.host)
+        response = self.client.post(reverse('approve_booking', args=[self.second.pk]))
+        self.assertRedirects(response, reverse('host_bookings'), fetch_redirect_response=False)
+        self.second.refresh_from_db()
+        self.assertEqual(self.second.status, Booking.Status.PENDING)
+
+    def test_bulk_approval_losing_a_race_keeps_the_winner(self):
+        # the other approval commits after approve_bookings read the taken nights
+        stay_dates = Booking.stay_dates
+        raced = []
+
+        def racing_stay_dates(booking):
+            if not raced:
+                raced.append(True)
+                self.first.approve()
+            return stay_dates(booking)
+
+        with mock.patch.object(Booking, 'stay_dates', racing_stay_dates):
+            approved, declined = approve_bookings(self.host, [self.second.pk])
+        self.assertEqual((approved, declined), ([], []))
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.status, self.second.status), (Booking.Status.APPROVED, Booking.Status.PENDING))
+        self.assertEqual(set(BookedNight.objects.values_list('booking_id', flat=True)), {self.first.pk})
+
+    def test_bulk_approval_leaves_a_concurrent_decline_alone(self):
+        stay_dates = Booking.stay_dates
+
+        def declined_meanwhile(booking):
+            # the decline commits after approve_bookings read the request as pending
+            Booking.objects.filter(pk=self.first.pk).update(status=Booking.Status.DECLINED)
+            return stay_dates(booking)
+
+        with mock.patch.object(Booking, 'stay_dates', declined_meanwhile):
+            self.assertEqual(approve_bookings(self.host, [self.first.pk]), ([], []))
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.status, Booking.Status.DECLINED)
+        self.assertFalse(BookedNight.objects.exists())
+
+
+@renders_pages
+class BookingAdminTests(TestCase):
+    def setUp(self):
+        self.client.force_login(make_user('admin', is_staff=True, is_superuser=True))
+        self.listing = make_listings(make_user('host', Profile.Role.HOST), 1)[0]
+        self.guest = make_user('guest')
+        self.approved = make_booking(self.listing, self.guest, days_ahead=10, nights=3)
+        self.approved.approve()
+
+    def test_status_is_read_only_when_adding(self):
+        response = self.client.get(reverse('admin:core_booking_add'))
+        self.assertNotContains(response, 'name="status"')
+
+    def test_approved_stay_cannot_be_moved(self):
+        pending = make_booking(self.listing, self.guest, days_ahead=20, nights=3)
+        url = reverse('admin:core_booking_change', args=[self.approved.pk])
+        response = self.client.post(url, {
+            'listing': self.listing.pk, 'guest': self.guest.pk, 'guests_count': 1, 'message': '',
+            'check_in': pending.check_in, 'check_out': pending.check_out,
+        })
+        self.assertEqual(response.status_code, 302)
+        self.approved.refresh_from_db()
+        self.assertEqual(self.approved.check_in, date.today() + timedelta(days=10))
+        editable = self.client.get(reverse('admin:core_booking_change', args=[pending.pk]))
+        self.assertContains(editable, 'name="check_in"')
+
+
+@renders_pages
+class PerfCommandTests(TestCase):
+    def setUp(self):
+        invalidate_facets()
+        call_command('seed_perf', hosts=3, guests=5, listings=40, images=2, bookings=300, seed=7, stdout=io.StringIO())
+
+    def test_seed_writes_what_the_receivers_would(self):
+        self.assertEqual(Listing.objects.count(), 40)
+        self.assertEqual(Booking.objects.count(), 300)
+        self.assertEqual(set(Profile.objects.filter(user__listings__isnull=False).values_list('role', flat=True)),
+                         {Profile.Role.HOST})
+        self.assertFalse(Listing.objects.filter(geo_cell__isnull=True).exists())
+        approved = Booking.objects.filter(status=Booking.Status.APPROVED)
+        # one booked night per approved night, and no two approved stays share one
+        self.assertEqual(BookedNight.objects.count(), sum((b.check_out - b.check_in).days for b in approved))
+        self.assertEqual(ListingStats.objects.count(), 40)
+        self.assertEqual(sum(ListingStats.objects.values_list('approved_count', flat=True)), approved.count())
+
+    def test_bench_reports_every_scenario(self):
+        out = io.StringIO()
+        call_command('bench_views', requests=1, warmup=0, stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['listings'], 40)
+        # 16 filter combinations, two map searches and the three other pages
+        self.assertEqual(len(report['results']), 21)
+        self.assertEqual(set(report['results']['home[none]']), {'p50_ms', 'p95_ms', 'p99_ms', 'queries'})
+
+
+class BookedNightBackfillTests(TestCase):
+    backfill = staticmethod(importlib.import_module('core.migrations.0006_bookednight').backfill_booked_nights)
+
+    def test_double_bookings_are_reported_not_dropped(self):
+        listing = make_listings(make_user('host', Profile.Role.HOST), 1)[0]
+        guest = make_user('guest')
+        first = make_booking(listing, guest, days_ahead=10, nights=3)
+        second = make_booking(listing, guest, days_ahead=12, nights=3)   # shares one night with first
+        alone = make_booking(listing, guest, days_ahead=30, nights=2)
+        # approved the way the old read-then-write approval let through
+        Booking.objects.update(status=Booking.Status.APPROVED)
+        BookedNight.objects.all().delete()
+
+        out = io.StringIO()
+        with redirect_stdout(out):
+            self.backfill(apps, None)
+        nights = dict(BookedNight.objects.values_list('night', 'booking_id'))
+        self.assertEqual(sorted(nights.values()), sorted([first.pk] * 3 + [second.pk] * 2 + [alone.pk] * 2))
+        self.assertEqual(nights[second.check_in], first.pk)
+        self.assertIn(f'approved booking {second.pk} overlaps approved booking {first.pk} on {second.check_in}',
+                      out.getvalue())
+
+
+class BulkBookingActionTests(TestCase):
+    def setUp(self):
+        self.host = make_user('host', Profile.Role.HOST)
+        self.guest = make_user('guest')
+        self.listing, self.other = make_listings(self.host, 2)
+        self.older = make_booking(self.listing, self.guest, days_ahead=10, nights=3)
+        self.newer = make_booking(self.listing, self.guest, days_ahead=12, nights=3)  # overlaps older
+        self.elsewhere = make_booking(self.other, self.guest, days_ahead=10, nights=3)
+        self.client.force_login(self.host)
+
+    def _post(self, action, bookings):
+        return self.client.post(reverse('bulk_booking_action'),
+                                {'action': action, 'booking_ids': [b.pk for b in bookings]})
+
+    def _statuses(self):
+        return dict(Booking.objects.values_list('pk', 'status'))
+
+    def test_approve_takes_oldest_and_declines_overlaps(self):
+        response = self._post('approve', [self.newer, self.older, self.elsewhere])
+        self.assertRedirects(response, reverse('host_bookings'), fetch_redirect_response=False)
+        self.assertEqual(self._statuses(), {
+            self.older.pk: Booking.Status.APPROVED,
+            self.newer.pk: Booking.Status.DECLINED,
+            self.elsewhere.pk: Booking.Status.APPROVED,
+        })
+        self.assertEqual(BookedNight.objects.count(), 6)
+        self.assertEqual(ListingStats.objects.get(listing=self.listing).approved_count, 1)
+        self.assertEqual(Job.objects.filter(task='core.tasks.notify_booking_status').count(), 3)
+
+    def test_decline_releases_approved_nights(self):
+        approve_bookings(self.host, [self.older.pk])
+        self.assertCountEqual(decline_bookings(self.host, [self.older.pk, self.elsewhere.pk]),
+                         [self.older.pk, self.elsewhere.pk])
+        self.assertFalse(BookedNight.objects.exists())
+        self.assertEqual(ListingStats.objects.get(listing=self.listing).approved_count, 0)
+
+    def test_other_hosts_bookings_are_untouched(self):
+        self.client.force_login(make_user('intruder', Profile.Role.HOST))
+        self._post('decline', [self.older, self.elsewhere])
+        self.assertEqual(set(self._statuses().values()), {Booking.Status.PENDING})
+
+
+@renders_pages
+class ReplicaRoutingTests(TransactionTestCase):
+    """Reads through a `replica` alias mirroring the test database, as configured
+    when DATABASE_REPLICA_URL is set. Data must be committed for the second
+    connection to see it, hence TransactionTestCase."""
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        patched = mock.patch.dict(settings.DATABASES, {REPLICA: connections[REPLICA].settings_dict})
+        patched.start()
+        self.addCleanup(patched.stop)
+        self.addCleanup(connections[REPLICA].close)
+        cache.clear()
+        self.listing = make_listings(make_user('host', Profile.Role.HOST), 1)[0]
+        self.url = reverse('listing_detail', args=[self.listing.pk])
+
+    def _reads(self, alias, request):
+        with CaptureQueriesContext(connections[alias]) as ctx:
+            response = request()
+            if response.streaming:
+                content = response.streaming_content
+                if response.is_async:
+                    async def gather():
+                        return [chunk async for chunk in content]
+                    content = async_to_sync(gather)()
+                b''.join(content)
+        return [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+
+    def test_router_sends_only_wrapped_safe_reads_to_the_replica(self):
+        @read_from_replica
+        def view(request):
+            return router.db_for_read(Listing), router.db_for_write(Listing)
+
+        factory = RequestFactory()
+        self.assertEqual(router.db_for_read(Listing), DEFAULT_DB_ALIAS)
+        self.assertEqual(view(factory.get('/')), (REPLICA, DEFAULT_DB_ALIAS))
+        self.assertEqual(view(factory.post('/')), (DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS))
+        pinned = factory.get('/')
+        pinned.COOKIES[STICKY_COOKIE] = '1'
+        self.assertEqual(view(pinned), (DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS))
+        with mock.patch.dict(settings.DATABASES):
+            del settings.DATABASES[REPLICA]
+            self.assertEqual(view(factory.get('/')), (DEFAULT_DB_ALIAS, DEFAULT_DB_ALIAS))
+
+    def test_reads_after_a_post_stick_to_the_primary(self):
+        self.assertTrue(any('"core_listing"' in sql for sql in self._reads(REPLICA, lambda: self.client.get(self.url))))
+        self.client.force_login(make_user('guest'))
+        check_in = date.today() + timedelta(days=5)
+        response = self.client.post(self.url, {'check_in': check_in, 'check_out': check_in + timedelta(days=2),
+                                               'guests_count': 1})
+        self.assertEqual(response.cookies[STICKY_COOKIE]['max-age'], settings.REPLICA_STICKY_SECONDS)
+        self.assertTrue(Booking.objects.filter(listing=self.listing).exists())
+        self.assertEqual(self._reads(REPLICA, lambda: self.client.get(self.url)), [])
+        self.assertNotIn(STICKY_COOKIE, self.client.get(self.url).cookies)  # reads do not renew the pin
+
+    def test_failed_posts_do_not_pin(self):
+        self.client.force_login(make_user('guest'))
+        response = self.client.post(reverse('reorder_listing_images_json', args=[self.listing.pk]),
+                                    {'order': []}, content_type='application/json')
+        self.assertEqual(response.status_code, 403)
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_streamed_feed_reads_from_the_replica(self):
+        url = reverse('listings_feed') + '?format=ndjson'
+        self.assertTrue(any('"core_listing"' in sql for sql in self._reads(REPLICA, lambda: self.client.get(url))))
+        self.assertFalse(any('"core_listing"' in sql for sql in self._reads(DEFAULT_DB_ALIAS,
+                                                                             lambda: self.client.get(url))))
+
+
+class ImportListingsTests(TestCase):
+    def setUp(self):
+        self.host = make_user('host', Profile.Role.HOST)
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def _file(self, name, text):
+        path = os.path.join(self.dir, name)
+        with open(path, 'w', encoding='utf-8') as fh:
+            fh.write(text)
+        return path
+
+    def _import(self, path, **opts):
+        out, err = io.StringIO(), io.StringIO()
+        call_command('import_listings', path, host='host', stdout=out, stderr=err, **opts)
+        return out.getvalue(), err.getvalue()
+
+    def test_valid_csv_creates_listings_with_what_the_receivers_would_add(self):
+        path = self._file('listings.csv', (
+            'title,description,city,address,price_per_night,capacity,image_urls\n'
+            'Nile flat,Quiet,Cairo,"5 Street, Zamalek",800,3,https://example.com/a.jpg|https://example.com/b.jpg\n'
+            'Sea chalet,By the beach,Hurghada,Marina,1200,,\n'
+        ))
+        out, err = self._import(path)
+        self.assertIn('Imported 2 of 2 row(s)', out)
+        self.assertEqual(err, '')
+        flat = Listing.objects.get(title='Nile flat')
+        self.assertEqual((flat.host, flat.capacity, flat.latitude), (self.host, 3, PLACES['Zamalek'][0]))
+        self.assertEqual(Listing.objects.get(title='Sea chalet').capacity, 1)
+        self.assertEqual(ListingStats.objects.filter(listing__host=self.host).count(), 2)
+        self.assertEqual([job.payload['sort_order'] for job in Job.objects.filter(task='core.tasks.fetch_listing_image')],
+                         [0, 1])
+
+    def test_malformed_rows_are_reported_and_skipped(self):
+        path = self._file('listings.jsonl', '\n'.join([
+            json.dumps({'title': 'Good', 'description': 'x', 'city': 'Luxor', 'address': '1 Road', 'price_per_night': 300}),
+            '{not json',
+            json.dumps({'title': 'Cheap', 'description': 'x', 'city': 'Luxor', 'address': '2 Road',
+                        'price_per_night': 'free'}),
+        ]))
+        out, err = self._import(path)
+        self.assertIn('Imported 1 of 3 row(s)', out)
+        self.assertIn('line 2: not a JSON object', err)
+        self.assertIn('line 3: price_per_night:', err)
+        self.assertEqual(list(Listing.objects.values_list('title', flat=True)), ['Good'])
+
+    def test_each_batch_commits_on_its_own(self):
+        path = self._file('listings.jsonl', '\n'.join(
+            json.dumps({'title': f'Flat {i}', 'description': 'x', 'city': 'Cairo', 'address': f'{i} Road',
+                        'price_per_night': 500}) for i in range(5)
+        ))
+        save_batch = transfer._save_batch
+        calls = []
+
+        def fail_third(*args):
+            calls.append(1)
+            if len(calls) == 3:
+                raise RuntimeError('database went away')
+            save_batch(*args)
+
+        with mock.patch('core.transfer._save_batch', side_effect=fail_third), self.assertRaises(RuntimeError):
+            self._import(path, batch_size=2)
+        # the first two batches stay imported
+        self.assertEqual(sorted(Listing.objects.values_list('title', flat=True)), [f'Flat {i}' for i in range(4)])
+
+    def test_dry_run_writes_nothing(self):
+        path = self._file('listings.jsonl', json.dumps(
+            {'title': 'Flat', 'description': 'x', 'city': 'Cairo', 'address': '1 Road', 'price_per_night': 500}))
+        out, _ = self._import(path, dry_run=True)
+        self.assertIn('Validated 1 of 1 row(s)', out)
+        self.assertFalse(Listing.objects.exists())
+
+
+class ExportStreamingTests(TestCase):
+    def setUp(self):
+        self.host = make_user('host', Profile.Role.HOST)
+        guest = make_user('guest')
+        for listing in make_listings(self.host, 3):
+            make_booking(listing, guest, days_ahead=5)
+
+    def test_wsgi_streams_sync_chunks(self):
+        self.client.force_login(self.host)
+        response = self.client.get(reverse('export_bookings'), {'format': 'jsonl'})
+        self.assertFalse(response.is_async)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        self.assertEqual([row['guest'] for row in rows], ['guest'] * 3)
+
+    async def test_asgi_streams_async_chunks(self):
+        await self.async_client.aforce_login(self.host)
+        # the CSV exports start with a header line
+        expected = {reverse('export_bookings'): 4, reverse('export_listings'): 4,
+                    reverse('listings_feed') + '?format=ndjson': 3}
+        for url, lines in expected.items():
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertTrue(response.is_async)
+                body = b''.join([chunk async for chunk in response.streaming_content])
+                self.assertEqual(len(body.decode().splitlines()), lines)
+
+
+@renders_pages
+class CacheInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.listing = make_listings(make_user('host', Profile.Role.HOST), 1)[0]
+        self.booking = make_booking(self.listing, make_user('guest'), days_ahead=3)
+        self.url = reverse('listing_detail', args=[self.listing.pk])
+
+    def blocked(self):
+        return 'Booked' in self.client.get(self.url).content.decode()
+
+    def test_detail_changes_only_after_the_approval_commits(self):
+        self.assertFalse(self.blocked())
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertTrue(self.booking.approve())
+            # a reader before the commit sees the old rows; they must stay
+            # cached under the old version
+            self.assertFalse(self.blocked())
+        self.assertTrue(self.blocked())
+
+    def test_request_is_checked_against_the_database_not_the_cached_calendar(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.booking.approve()
+        self.assertEqual(blocked_ranges(self.listing.pk), [(self.booking.check_in, self.booking.check_out)])
+        with self.captureOnCommitCallbacks() as callbacks:
+            decline_bookings(self.listing.host, [self.booking.pk])
+        # until the decline commits, readers keep the approved stay cached
+        self.assertEqual(blocked_ranges(self.listing.pk), [(self.booking.check_in, self.booking.check_out)])
+        self.client.force_login(make_user('other'))
+        self.client.post(self.url, {'check_in': self.booking.check_in, 'check_out': self.booking.check_out,
+                                    'guests_count': 1})
+        self.assertEqual(Booking.objects.filter(listing=self.listing, status=Booking.Status.PENDING).count(), 1)
+        for callback in callbacks:
+            callback()
+        self.assertEqual(blocked_ranges(self.listing.pk), [])
+
+
+    def _bumps_search(self, change):
+        before = search_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        return search_generation() != before
+
+    def test_search_generation_moves_only_for_changes_search_shows(self):
+        self.assertFalse(self._bumps_search(lambda: make_booking(self.listing, make_user('guest2'), days_ahead=20)))
+        self.assertTrue(self._bumps_search(self.booking.approve))
+        first, behind = (ListingImage(listing=self.listing, image=f'listing_images/{i}.jpg', sort_order=i)
+                         for i in range(2))
+        self.assertTrue(self._bumps_search(first.save))
+        self.assertFalse(self._bumps_search(behind.save))
+        self.assertTrue(self._bumps_search(lambda: set_cover(self.listing, behind.pk)))
+        self.assertFalse(self._bumps_search(first.delete))
+        self.assertTrue(self._bumps_search(behind.delete))
+
+
+class CacheSettingsTests(TestCase):
+    def test_production_without_a_shared_cache_warns_and_uses_local_memory(self):
+        env = {**os.environ, 'DEBUG': '0', 'CACHE_URL': '', 'SESSION_BACKEND': 'db'}
+        result = subprocess.run(
+            [sys.executable, '-c', 'from rental_egypt import settings; print(settings.CACHES["default"]["BACKEND"])'],
+            env=env, capture_output=True, text=True, check=True,
+        )
+        self.assertEqual(result.stdout.strip(), 'django.core.cache.backends.locmem.LocMemCache')
+        self.assertIn('RuntimeWarning: CACHE_URL names no shared cache', result.stderr)
+
+
+class GalleryOrderTests(TestCase):
+    def setUp(self):
+        self.listing = make_listings(make_user('host', Profile.Role.HOST), 1)[0]
+        self.images = ListingImage.objects.bulk_create([
+            ListingImage(listing=self.listing, image=f'listing_images/{i}.jpg', sort_order=i, is_cover=i == 0)
+            for i in range(6)
+        ])
+
+    def _gallery(self):
+        return list(ListingImage.objects.filter(listing=self.listing)
+                    .order_by('sort_order', 'pk').values_list('pk', 'is_cover'))
+
+    def _image_updates(self, change):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertNotEqual(change(), False)
+        return [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('UPDATE "core_listingimage"')]
+
+    def test_reorder_is_one_update_for_the_whole_gallery(self):
+        order = [image.pk for image in reversed(self.images)]
+        self.assertEqual(len(self._image_updates(lambda: reorder_images(self.listing, order))), 1)
+        self.assertEqual(self._gallery(), [(pk, pk == order[0]) for pk in order])
+
+    def test_reorder_rejects_ids_from_elsewhere(self):
+        other = make_listings(self.listing.host, 1)[0]
+        stranger = ListingImage.objects.create(listing=other, image='listing_images/x.jpg')
+        before = self._gallery()
+        self.assertFalse(reorder_images(self.listing, [self.images[1].pk, stranger.pk]))
+        self.assertFalse(reorder_images(self.listing, [self.images[1].pk, self.images[1].pk]))
+        self.assertEqual(self._gallery(), before)
+
+    def test_set_cover_leaves_exactly_one_cover(self):
+        self.assertEqual(len(self._image_updates(lambda: set_cover(self.listing, self.images[3].pk))), 1)
+        self.assertEqual([pk for pk, cover in self._gallery() if cover], [self.images[3].pk])
+
+    def test_json_endpoint(self):
+        url = reverse('reorder_listing_images_json', args=[self.listing.pk])
+        order = [self.images[2].pk, self.images[0].pk]
+        self.client.force_login(make_user('guest'))
+        self.assertEqual(self.client.post(url, {'order': order}, content_type='application/json').status_code, 403)
+        self.client.force_login(self.listing.host)
+        self.assertEqual(self.client.post(url, {'order': 'x'}, content_type='application/json').status_code, 400)
+        response = self.client.post(url, {'order': order}, content_type='application/json')
+        self.assertEqual(response.json(), {'order': order, 'cover': order[0]})
+        self.assertEqual(self._gallery()[:2], [(order[0], True), (order[1], False)])
+
+
+class ApiConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.host = make_user('host', Profile.Role.HOST)
+        self.listing, self.other = make_listings(self.host, 2)
+        self.images = ListingImage.objects.bulk_create([
+            ListingImage(listing=self.listing, image=f'listing_images/{i}.jpg', is_cover=i == 0, sort_order=i)
+            for i in range(3)
+        ])
+
+    def _etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': response['ETag']}).status_code, 304)
+        return response
+
+    def test_detail_changes_with_the_gallery(self):
+        url = reverse('api_listing_detail', args=[self.listing.pk])
+        etags = [self._etag(url)['ETag']]
+        stamps = [Listing.objects.get(pk=self.listing.pk).updated_at]
+        for change in (lambda: set_cover(self.listing, self.images[2].pk),
+                       lambda: reorder_images(self.listing, [self.images[1].pk, self.images[0].pk]),
+                       lambda: self.images[0].delete()):
+            change()
+            response = self._etag(url)
+            self.assertIn('Last-Modified', response)
+            etags.append(response['ETag'])
+            stamps.append(Listing.objects.get(pk=self.listing.pk).updated_at)
+        self.assertEqual(len(set(etags)), 4)
+        self.assertEqual(stamps, sorted(set(stamps)))
+
+    def test_feed_changes_when_a_listing_is_deleted(self):
+        url = reverse('listings_feed')
+        before = self._etag(url)
+        self.assertNotIn('Last-Modified', before)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, headers={'If-None-Match': before['ETag']}).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.other.delete()
+        self.assertNotEqual(self._etag(url)['ETag'], before['ETag'])
+
+    def test_availability_changes_when_a_stay_is_deleted(self):
+        booking = make_booking(self.listing, make_user('guest'), days_ahead=3, status=Booking.Status.APPROVED)
+        url = reverse('api_listing_availability', args=[self.listing.pk])
+        before = self._etag(url)
+        self.assertNotIn('Last-Modified', before)
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+        after = self._etag(url)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertEqual(after.json()['blocked'], [])
+
+    def test_missing_listing_is_404(self):
+        self.assertEqual(self.client.get(reverse('api_listing_availability', args=[0])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('api_listing_detail', args=[0])).status_code, 404)
+
+
+class JobQueueTests(TestCase):
+    def _running(self, worker_id, seconds_ago):
+        job = Job.objects.create(task='core.tasks.noop')
+        locked_at = timezone.now() - timedelta(seconds=seconds_ago)
+        Job.objects.filter(pk=job.pk).update(status=Job.Status.RUNNING, locked_by=worker_id, locked_at=locked_at)
+        return job
+
+    def test_heartbeat_keeps_a_long_running_job_claimed(self):
+        alive = self._running('host:1:0', JOB_LOCK_TIMEOUT + 60)
+        dead = self._running('host:12:0', JOB_LOCK_TIMEOUT + 60)
+        self.assertEqual(heartbeat('host:1:'), 1)
+        self.assertEqual(requeue_stale_jobs(), 1)
+        alive.refresh_from_db()
+        dead.refresh_from_db()
+        self.assertEqual((alive.status, alive.locked_by), (Job.Status.RUNNING, 'host:1:0'))
+        self.assertEqual((dead.status, dead.locked_by), (Job.Status.QUEUED, ''))
+
+    def test_prune_deletes_only_old_done_jobs(self):
+        old = timezone.now() - timedelta(days=30)
+        for status, finished_at in [(Job.Status.DONE, old), (Job.Status.DONE, old), (Job.Status.DONE, timezone.now()),
+                                    (Job.Status.FAILED, old), (Job.Status.QUEUED, None)]:
+            Job.objects.create(task='core.tasks.noop', status=status, finished_at=finished_at)
+        with mock.patch('core.jobs.PRUNE_BATCH_SIZE', 1):
+            self.assertEqual(prune_finished_jobs(), 2)
+        self.assertEqual(sorted(Job.objects.values_list('status', flat=True)),
+                         [Job.Status.DONE, Job.Status.FAILED, Job.Status.QUEUED])
+
+
+@mock.patch('core.uploads.UPLOAD_BACKEND', 'core.uploads.local_backend')
+class GalleryUploadTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        media_root = override_settings(MEDIA_ROOT=self.media)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        self.listing = make_listings(make_user('host', Profile.Role.HOST), 1)[0]
+        ListingImage.objects.create(listing=self.listing, image='listing_images/existing.jpg', sort_order=4)
+
+    def _jpeg(self, name):
+        photo = io.BytesIO()
+        Image.new('RGB', (8, 6), (len(name) * 40 % 256, ord(name[0]), 90)).save(photo, 'JPEG')
+        return photo.getvalue()
+
+    def _files(self, *names):
+        return [SimpleUploadedFile(name, self._jpeg(name), content_type='image/jpeg') for name in names]
+
+    def _run_jobs(self):
+        while (job := claim_job('test-worker')) is not None:
+            run_job(job)
+
+    def _gallery(self):
+        images = ListingImage.objects.filter(listing=self.listing).order_by('sort_order')
+        return [(img.sort_order, str(img.image)) for img in images]
+
+    def test_upload_is_staged_then_stored_by_the_worker(self):
+        self.assertEqual(queue_listing_images(self.listing, self._files('a.jpg', 'b.jpg')), 2)
+        self.assertEqual(upload_status(self.listing.pk), {'pending': 2, 'failed': 0})
+        self.assertEqual(len(self._gallery()), 1)
+        # the row keeps a reference; the bytes wait in the staging storage
+        staged = [upload.file.path for upload in ImageUpload.objects.order_by('position')]
+        self.assertTrue(all(path.startswith(os.path.join(self.media, 'upload-staging')) for path in staged))
+        with self.captureOnCommitCallbacks(execute=True):
+            self._run_jobs()
+        self.assertFalse(any(os.path.exists(path) for path in staged))
+        # CloudinaryField values print as their public id (no extension)
+        self.assertEqual(self._gallery(), [(4, 'listing_images/existing'),
+                                           (5, 'listing_images/a'), (6, 'listing_images/b')])
+        with open(os.path.join(self.media, 'listing_images', 'b.jpg'), 'rb') as fh:
+            self.assertEqual(fh.read(), self._jpeg('b.jpg'))
+        self.assertFalse(ImageUpload.objects.exists())
+        self.assertEqual(ListingStats.objects.get(listing=self.listing).image_count, 3)
+
+    def test_concurrent_uploads_get_distinct_orders(self):
+        queue_listing_images(self.listing, self._files('a.jpg', 'b.jpg'))
+        queue_listing_images(self.listing, self._files('c.jpg'))
+        # the later upload's job runs first
+        run_job(Job.objects.order_by('-id').first())
+        self._run_jobs()
+        self.assertEqual([order for order, _ in self._gallery()], [4, 5, 6, 7])
+        self.assertEqual([image for _, image in self._gallery()][1:],
+                         ['listing_images/c', 'listing_images/a', 'listing_images/b'])
+
+    def test_failed_upload_is_kept_and_reported(self):
+        queue_listing_images(self.listing, self._files('a.jpg'))
+        with mock.patch('core.uploads.local_backend', side_effect=OSError('disk full')), \
+                self.assertLogs('core.jobs', 'ERROR') as logs:
+            Job.objects.update(max_attempts=1)
+            self._run_jobs()
+        self.assertIn('disk full', logs.output[0])
+        self.assertEqual(upload_status(self.listing.pk), {'pending': 0, 'failed': 1})
+        self.assertEqual(Job.objects.get().status, Job.Status.FAILED)
+        # uploading again replaces the failed attempt
+        queue_listing_images(self.listing, self._files('a.jpg'))
+        self._run_jobs()
+        self.assertEqual(upload_status(self.listing.pk), {'pending': 0, 'failed': 0})
+        self.assertEqual(len(self._gallery()), 2)
+
+    def test_upload_view_queues_the_files(self):
+        self.client.force_login(self.listing.host)
+        response = self.client.post(reverse('upload_listing_images', args=[self.listing.pk]),
+                                    {'images': self._files('a.jpg', 'b.jpg')})
+        self.assertRedirects(response, reverse('listing_detail', args=[self.listing.pk]), fetch_redirect_response=False)
+        self.assertEqual(list(Job.objects.values_list('task', flat=True)), ['core.tasks.store_listing_uploads'])
+        self.assertEqual(ImageUpload.objects.filter(listing=self.listing).count(), 2)
+
+    @renders_pages
+    @mock.patch('core.images.cloudinary_enabled', return_value=False)
+    @mock.patch('core.uploads.cloudinary_enabled', return_value=False)
+    def test_local_variants_are_built_when_stored_not_when_rendered(self, *_):
+        photo = io.BytesIO()
+        Image.new('RGB', (1600, 1200), 'teal').save(photo, 'JPEG')
+        queue_listing_images(self.listing, [SimpleUploadedFile('photo.jpg', photo.getvalue(), content_type='image/jpeg')])
+        self._run_jobs()
+        image = ListingImage.objects.get(listing=self.listing, sort_order=5).image
+        self.assertEqual(variant_url(image, 640), '/media/variants/640/listing_images/photo.webp')
+        self.assertIn('/media/variants/320/listing_images/photo.webp 320w', srcset(image, 640))
+        self.assertTrue(placeholder_url(image).startswith('data:image/webp;base64,'))
+        # without built variants pages serve the original and write nothing
+        shutil.rmtree(os.path.join(self.media, 'variants'))
+        self.assertEqual(variant_url(image, 640), '/media/listing_images/photo.jpg')
+        self.assertEqual(srcset(image, 640), '')
+        self.client.get(reverse('listing_detail', args=[self.listing.pk]))
+        self.assertFalse(os.path.exists(os.path.join(self.media, 'variants')))
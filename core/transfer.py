@@ -0,0 +1,226 @@
+import csv
+import json
+import time
+from datetime import date
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.http import StreamingHttpResponse
+
+from .caching import bump_search_generation
+from .facets import invalidate_facets
+from .forms import ListingImportForm
+from .geo import locate
+from .images import VARIANTS, variant_url
+from .jobs import enqueue_many
+from .models import Listing, ListingStats
+from .tasks import fetch_listing_image
+
+# Bulk listing import and listing/booking export as CSV or JSONL. Files are
+# read and written one row at a time and the database is hit once per batch
+# (bulk_create in, iterator() chunks out), so memory stays flat however big
+# the file is, under WSGI and ASGI alike (see streaming_response). Imports skip the model signals, so the side effects they would
+# have had are applied per batch here.
+FORMATS = ('csv', 'jsonl')
+BATCH_SIZE = 1000
+STREAM_CHUNK_SIZE = 2000
+MAX_REPORTED_ERRORS = 100
+
+LISTING_COLUMNS = ('id', 'title', 'description', 'city', 'address', 'price_per_night', 'capacity',
+                   'latitude', 'longitude', 'image_urls')
+# (column, values_list() field)
+BOOKING_EXPORT = (
+    ('id', 'id'),
+    ('listing_id', 'listing_id'),
+    ('listing', 'listing__title'),
+    ('guest', 'guest__username'),
+    ('check_in', 'check_in'),
+    ('check_out', 'check_out'),
+    ('guests_count', 'guests_count'),
+    ('status', 'status'),
+    ('created_at', 'created_at'),
+)
+BOOKING_COLUMNS = tuple(column for column, _ in BOOKING_EXPORT)
+
+
+def guess_format(path):
+    return 'csv' if str(path).lower().endswith('.csv') else 'jsonl'
+
+
+def read_rows(fh, fmt):
+    """Yield (line number, row dict) from an open text file; the row is None if the line isn't a JSON object."""
+    if fmt == 'csv':
+        reader = csv.DictReader(fh)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for number, line in enumerate(fh, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+class ImportReport:
+    def __init__(self):
+        self.read = self.valid = self.created = self.images = 0
+        self.errors = []  # (line, message), the first MAX_REPORTED_ERRORS only
+        self.error_count = 0
+        self.started = time.perf_counter()
+
+    def error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def rate(self):
+        return self.read / self.elapsed if self.elapsed else 0.0
+
+
+def _validate(line, row, report):
+    if row is None:
+        report.error(line, 'not a JSON object')
+        return None
+    urls = row.get('image_urls')
+    if isinstance(urls, list):
+        row = dict(row, image_urls=' '.join(map(str, urls)))
+    form = ListingImportForm(row)
+    if not form.is_valid():
+        messages = [f'{field}: {" ".join(errors)}' if field != '__all__' else ' '.join(errors)
+                    for field, errors in form.errors.items()]
+        report.error(line, '; '.join(messages))
+        return None
+    return form.save(commit=False), form.cleaned_data['image_urls']
+
+
+def _save_batch(host, batch, report, today):
+    # bulk_create skips the pre_save geocoding and the post_save receivers
+    listings = [locate(listing) for listing, _ in batch]
+    for listing in listings:
+        listing.host = host
+    with transaction.atomic():
+        Listing.objects.bulk_create(listings)
+        ListingStats.objects.bulk_create([ListingStats(listing_id=l.pk, as_of=today) for l in listings])
+        jobs = enqueue_many(fetch_listing_image, [
+            {'listing_id': listing.pk, 'url': url, 'sort_order': order}
+            for listing, urls in batch for order, url in enumerate(urls)
+        ])
+    report.created += len(listings)
+    report.images += len(jobs)
+
+
+def import_listings(host, rows, batch_size=BATCH_SIZE, dry_run=False, progress=None):
+    """Create `host`'s listings from (line, row) pairs (see read_rows), batch_size at a time.
+
+    Invalid rows are reported and skipped; each batch commits on its own.
+    Image URLs become fetch_listing_image jobs. With dry_run nothing is
+    written. `progress(report)` is called after every batch.
+    """
+    report = ImportReport()
+    today = date.today()
+    batch = []
+    for line, row in rows:
+        report.read += 1
+        result = _validate(line, row, report)
+        if result is not None:
+            report.valid += 1
+            batch.append(result)
+        if report.read % batch_size == 0:
+            if batch and not dry_run:
+                _save_batch(host, batch, report, today)
+            batch = []
+            if progress:
+                progress(report)
+    if batch and not dry_run:
+        _save_batch(host, batch, report, today)
+    if report.created:
+        invalidate_facets()
+        bump_search_generation()
+    return report
+
+
+def booking_rows(bookings):
+    """BOOKING_COLUMNS tuples for `bookings`, read in chunks in id order."""
+    return (bookings.order_by('id')
+            .values_list(*(field for _, field in BOOKING_EXPORT))
+            .iterator(chunk_size=STREAM_CHUNK_SIZE))
+
+
+def listing_rows(listings, absolute_url=None):
+    """LISTING_COLUMNS tuples for `listings` (the import format plus id), read in chunks in id order.
+
+    `absolute_url` (e.g. request.build_absolute_uri) turns local media paths
+    into URLs an import can fetch; Cloudinary URLs are absolute already.
+    """
+    listings = listings.order_by('id').prefetch_related('images')
+    for l in listings.iterator(chunk_size=STREAM_CHUNK_SIZE):
+        urls = [variant_url(img.image, VARIANTS['full']) for img in l.images.all()]
+        urls = [absolute_url(url) if absolute_url else url for url in urls if url]
+        yield (l.pk, l.title, l.description, l.city, l.address, l.price_per_night, l.capacity,
+               l.latitude, l.longitude, ' '.join(urls))
+
+
+async def _in_thread(chunks):
+    # next() runs in the request's sync thread, where the queryset iterator
+    # holds its database cursor; the event loop only forwards the chunks
+    chunks = iter(chunks)
+    next_chunk = sync_to_async(next)
+    while (chunk := await next_chunk(chunks, None)) is not None:
+        yield chunk
+
+
+def streaming_response(request, chunks, content_type):
+    """StreamingHttpResponse over `chunks`, a sync iterator of str.
+
+    Under ASGI Django reads a sync iterator to the end before sending a byte,
+    so there the chunks are served through an async iterator instead.
+    """
+    if isinstance(request, ASGIRequest):
+        chunks = _in_thread(chunks)
+    return StreamingHttpResponse(chunks, content_type=content_type)
+
+
+def chunked(lines):
+    """Join `lines` into one string per STREAM_CHUNK_SIZE, so a streamed response writes per chunk, not per row."""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= STREAM_CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+    if chunk:
+        yield ''.join(chunk)
+
+
+class _Echo:
+    """csv.writer target that returns each formatted line instead of storing it."""
+
+    def write(self, value):
+        return value
+
+
+def encode_csv(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    yield from chunked(writer.writerow(row) for row in rows)
+
+
+def encode_jsonl(columns, rows):
+    encoder = DjangoJSONEncoder(separators=(',', ':'), ensure_ascii=False)
+    yield from chunked(encoder.encode(dict(zip(columns, row))) + '\n' for row in rows)
+
+
+ENCODERS = {
+    'csv': (encode_csv, 'text/csv; charset=utf-8'),
+    'jsonl': (encode_jsonl, 'application/x-ndjson'),
+}
@@ -0,0 +1,166 @@
+import posixpath
+import tempfile
+import urllib.request
+from functools import partial
+from urllib.parse import urlparse
+
+import cloudinary.uploader
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+from .caching import bump_listing_version
+from .gallery import touch_listing
+from .images import build_local_variants, cloudinary_enabled
+from .jobs import enqueue
+from .models import ImageUpload, Job, Listing, ListingImage
+from .stats import refresh_listing_stats
+
+# Gallery uploads leave the request: the view stages each file in
+# IMAGE_UPLOAD_STAGING_STORAGE behind an ImageUpload row and queues one
+# store_uploads job per request, so the work survives restarts, is retried
+# with backoff, and the listing page shows what is still pending or has
+# failed. The job hands the files to the storage backend in the order they
+# were picked, then appends the batch to the gallery in one INSERT, taking
+# the next sort orders under a lock on the listing row.
+UPLOAD_ASYNC = getattr(settings, 'IMAGE_UPLOAD_ASYNC', True)  # off: store during the request (no worker needed)
+UPLOAD_BACKEND = getattr(settings, 'IMAGE_UPLOAD_BACKEND', 'core.uploads.cloudinary_backend')
+SPOOL_MAX_BYTES = 1024 * 1024
+# Images named by URL (bulk imports) are downloaded by a background job.
+FETCH_TIMEOUT = 30
+FETCH_MAX_BYTES = 5 * 1024 * 1024  # the upload form's limit
+
+
+def cloudinary_backend(file):
+    return cloudinary.uploader.upload_resource(file, type='upload', resource_type='image')
+
+
+def local_backend(file):
+    """Store under MEDIA_ROOT instead of Cloudinary (local development and tests)."""
+    return FileSystemStorage().save(f'listing_images/{file.name}', file)
+
+
+def _store(backend, file):
+    stored = backend(file)
+    if not cloudinary_enabled():
+        # Cloudinary resizes on request; local files get their variants now
+        build_local_variants(stored)
+    return stored
+
+
+def queue_listing_images(listing, files):
+    """Stage `files` for `listing`'s gallery and queue the job that stores them.
+
+    Returns the number of files queued. The images appear after the existing
+    ones once the job has run (before this returns with IMAGE_UPLOAD_ASYNC
+    off). Uploads that failed earlier are dropped: the new upload replaces them.
+    """
+    if not files:
+        return 0
+    uploads = []
+    for i, f in enumerate(files):
+        upload = ImageUpload(listing=listing, name=f.name, position=i)
+        upload.file.save(f.name, f, save=False)  # writes to the staging storage
+        uploads.append(upload)
+    with transaction.atomic():
+        ImageUpload.objects.filter(listing=listing, job__status=Job.Status.FAILED).delete()
+        staged = ImageUpload.objects.bulk_create(uploads)
+        upload_ids = [upload.pk for upload in staged]
+        if UPLOAD_ASYNC:
+            job = enqueue('core.tasks.store_listing_uploads', upload_ids=upload_ids)
+            ImageUpload.objects.filter(pk__in=upload_ids).update(job=job)
+    if not UPLOAD_ASYNC:
+        store_uploads(upload_ids)
+    return len(staged)
+
+
+def _append(listing_id, stored):
+    """Append `stored` ([(upload, image), ...] in order) to the listing's gallery."""
+    with transaction.atomic():
+        # concurrent jobs for one listing queue up here, so each batch gets
+        # its own sort orders after everything already in the gallery
+        if not Listing.objects.select_for_update().filter(pk=listing_id).exists():
+            return
+        last = ListingImage.objects.filter(listing_id=listing_id).aggregate(last=Max('sort_order'))['last']
+        start = 0 if last is None else last + 1
+        ListingImage.objects.bulk_create([
+            ListingImage(listing_id=listing_id, image=image, sort_order=start + i)
+            for i, (_, image) in enumerate(stored)
+        ])
+        ImageUpload.objects.filter(pk__in=[upload.pk for upload, _ in stored]).delete()
+        # bulk_create sends no post_save, so do what the receivers would
+        refresh_listing_stats([listing_id])
+        touch_listing(listing_id)
+    # appended images only change the cover of a listing that had none
+    bump_listing_version(listing_id, search=last is None)
+
+
+def store_uploads(upload_ids):
+    """Hand staged uploads to the storage backend and append them to their galleries.
+
+    Files go one at a time, in the order they were picked; a failure appends
+    what was stored so far and leaves the rest staged for the job's next attempt.
+    """
+    backend = import_string(UPLOAD_BACKEND)
+    stored = {}  # listing id -> [(upload, image), ...]
+    try:
+        for upload in ImageUpload.objects.filter(pk__in=upload_ids).order_by('position', 'id'):
+            with upload.file.open('rb'):
+                image = _store(backend, File(upload.file, name=upload.name))
+            stored.setdefault(upload.listing_id, []).append((upload, image))
+    finally:
+        for listing_id, batch in stored.items():
+            _append(listing_id, batch)
+
+
+@receiver(post_delete, sender=ImageUpload)
+def _upload_deleted(sender, instance, **kwargs):
+    # the staged file goes once the row's deletion commits; a file left behind
+    # is only wasted space, so a storage error must not fail the commit
+    if instance.file:
+        transaction.on_commit(partial(instance.file.delete, save=False), robust=True)
+
+
+def upload_status(listing_id):
+    """Counts of the listing's staged uploads, for the host: {'pending': n, 'failed': n}."""
+    statuses = list(ImageUpload.objects.filter(listing_id=listing_id).values_list('job__status', flat=True))
+    failed = statuses.count(Job.Status.FAILED)
+    return {'pending': len(statuses) - failed, 'failed': failed}
+
+
+def fetch_image(url):
+    """Download `url` into a spooled temp File; ValueError if it is over FETCH_MAX_BYTES."""
+    if urlparse(url).scheme not in ('http', 'https'):
+        raise ValueError(f"Not an http(s) URL: {url}")
+    spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+    size = 0
+    try:
+        with urllib.request.urlopen(url, timeout=FETCH_TIMEOUT) as response:
+            while chunk := response.read(64 * 1024):
+                size += len(chunk)
+                if size > FETCH_MAX_BYTES:
+                    raise ValueError(f"{url} is larger than {FETCH_MAX_BYTES} bytes")
+                spooled.write(chunk)
+    except BaseException:
+        spooled.close()
+        raise
+    spooled.seek(0)
+    return File(spooled, name=posixpath.basename(urlparse(url).path) or 'image.jpg')
+
+
+def store_remote_image(listing_id, url, sort_order=0):
+    """Fetch `url` into the listing's gallery at `sort_order`; None if the listing is gone."""
+    if not Listing.objects.filter(pk=listing_id).exists():
+        return None
+    file = fetch_image(url)
+    try:
+        stored = _store(import_string(UPLOAD_BACKEND), file)
+    finally:
+        file.close()
+    # a regular save: the receivers refresh the counters and cached cards
+    return ListingImage.objects.create(listing_id=listing_id, image=stored, sort_order=sort_order)
@@ -1,24 +1,46 @@
+from django.conf import settings
 from django.urls import path
 from django.contrib.auth import views as auth_views
-from . import views
+from . import api, views
+
+# read-heavy views: async versions under ASGI (ASYNC_VIEWS=1), sync otherwise
+if settings.ASYNC_VIEWS:
+    from . import async_views
+    home, listing_detail = async_views.home, async_views.listing_detail
+    listings_feed = async_views.listings_feed
+    api_listing_detail = async_views.api_listing_detail
+    api_listing_availability = async_views.api_listing_availability
+else:
+    home, listing_detail = views.home, views.listing_detail
+    listings_feed = api.listings_feed
+    api_listing_detail = api.listing_detail
+    api_listing_availability = api.listing_availability
 
 urlpatterns = [
-    path('', views.home, name='home'),
+    path('', home, name='home'),
     path('signup/', views.signup, name='signup'),
     path('accounts/login/', auth_views.LoginView.as_view(template_name='core/login.html'), name='login'),
     path('accounts/logout/', auth_views.LogoutView.as_view(), name='logout'),
 
     path('listing/new/', views.create_listing, name='create_listing'),
-    path('listing/<int:pk>/', views.listing_detail, name='listing_detail'),
+    path('listing/<int:pk>/', listing_detail, name='listing_detail'),
     path('listing/<int:pk>/images/upload/', views.upload_listing_images, name='upload_listing_images'),
     path('listing/<int:pk>/images/reorder/', views.reorder_listing_images, name='reorder_listing_images'),
+    path('api/listings/<int:pk>/images/order/', views.reorder_listing_images_json, name='reorder_listing_images_json'),
     path('listing/<int:pk>/images/<int:image_id>/cover/', views.set_cover_image, name='set_cover_image'),
     path('listing/<int:pk>/images/<int:image_id>/delete/', views.delete_listing_image, name='delete_listing_image'),
 
     path('host/listings/', views.my_listings, name='my_listings'),
+    path('host/listings/export/', views.export_listings, name='export_listings'),
     path('host/bookings/', views.host_bookings, name='host_bookings'),
+    path('host/bookings/export/', views.export_bookings, name='export_bookings'),
+    path('host/bookings/bulk/', views.bulk_booking_action, name='bulk_booking_action'),
     path('booking/<int:pk>/approve/', views.approve_booking, name='approve_booking'),
     path('booking/<int:pk>/decline/', views.decline_booking, name='decline_booking'),
 
     path('bookings/', views.my_bookings, name='my_bookings'),
+
+    path('api/listings/', listings_feed, name='listings_feed'),
+    path('api/listings/<int:pk>/', api_listing_detail, name='api_listing_detail'),
+    path('api/listings/<int:pk>/availability', api_listing_availability, name='api_listing_availability'),
 ]
@@ -1,18 +1,35 @@
+import json
+from datetime import date
+from functools import partial
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
-from django.db.models import Q
 from django.contrib import messages
-from .models import Listing, Booking, Profile, ListingImage
+from .models import BookedNight, Listing, Booking, Profile, ListingImage
 from .forms import SignUpForm, ListingForm, BookingForm, ListingImageUploadForm
-from django.core.paginator import Paginator
-from datetime import datetime
-from django.db import connection
+from .facets import city_facets
+from .pagination import KeysetPaginator
+from .search import PLACE_NAMES, RADIUS_CHOICES, geo_radius, search_listings, search_keys
+from .uploads import queue_listing_images, upload_status
+from .jobs import enqueue
+from .bookings import approve_bookings, decline_bookings
+from .gallery import reorder_images, set_cover
+from .routers import read_from_replica
+from .availability import availability_calendar
+from .caching import attach_cache_versions, cache_anonymous_response, listing_versions
+from .stats import OCCUPANCY_DAYS, attach_listing_stats
+from .tasks import notify_booking_request, notify_booking_status
+from .transfer import BOOKING_COLUMNS, ENCODERS, LISTING_COLUMNS, booking_rows, listing_rows, streaming_response
+from django.http import JsonResponse
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.views.decorators.http import require_POST
 
 
-DATE_FMT = "%Y-%m-%d"
+PAGE_SIZE = 9
+HOST_BOOKINGS_PAGE_SIZE = 25
 
+@read_from_replica
+@cache_anonymous_response
 def home(request):
     try:
         # New Airbnb-style params
@@ -26,76 +43,46 @@ def home(request):
 
         # Wrap database queries in try-catch to handle schema issues
         try:
-            listings = (Listing.objects
-                        .all()
-                        .order_by('-created_at')
-                        .select_related('host')
-                        .prefetch_related('images'))
-
-            # destination dropdown filter
-            if destination:
-                listings = listings.filter(city__iexact=destination)  # exact city from dropdown
-
-            # optional keyword search (title/desc/city)
-            if q:
-                listings = listings.filter(
-                    Q(title__icontains=q) | Q(city__icontains=q) | Q(description__icontains=q)
-                )
-
-            # date filtering: exclude listings that have an APPROVED overlapping booking
-            check_in = check_out = None
-            if check_in_str and check_out_str:
-                try:
-                    check_in = datetime.strptime(check_in_str, DATE_FMT).date()
-                    check_out = datetime.strptime(check_out_str, DATE_FMT).date()
-                    if check_in < check_out:
-                        listings = listings.exclude(
-                            bookings__status=Booking.Status.APPROVED,
-                            bookings__check_in__lt=check_out,
-                            bookings__check_out__gt=check_in,
-                        )
-                except ValueError:
-                    # bad date format: ignore dates
-                    pass
-
-            # capacity filter if guests provided (check DB schema to avoid 500 before migration)
-            if guests.isdigit():
-                # Inspect DB table columns safely
-                try:
-                    with connection.cursor() as cursor:
-                        cols = [col.name for col in connection.introspection.get_table_description(cursor, Listing._meta.db_table)]
-                    if 'capacity' in cols:
-                        listings = listings.filter(capacity__gte=int(guests))
-                except Exception:
-                    # Any unexpected DB error: skip the filter to keep the page working
-                    pass
-
-            # build city list for dropdown
-            cities = (Listing.objects
-                      .values_list('city', flat=True)
-                      .distinct()
-                      .order_by('city'))
+            # galleries are loaded by {% listing_cards %}, only for cards it has to render
+            listings = search_listings(request.GET).select_related('host')
+            # keyset pagination: no COUNT(*) and no OFFSET scan on deep pages
+            page_obj = KeysetPaginator(listings, PAGE_SIZE, search_keys(request.GET)).get_page(request.GET.get('cursor'))
+
+            # cached city list (with counts and price ranges) for the dropdown
+            cities = city_facets()
 
         except Exception as e:
             # If there's a DB schema issue, return empty results
-            listings = Listing.objects.none()
+            page_obj = None
             cities = []
             messages.warning(request, "Database is being prepared. Please try again in a moment.")
 
-        # paginate
-        page = request.GET.get('page', 1)
-        paginator = Paginator(listings, 9)
-        page_obj = paginator.get_page(page)
+        next_query = first_query = ''
+        # an empty page past the end is falsy but still needs its links
+        if page_obj is not None:
+            params = request.GET.copy()
+            params.pop('cursor', None)
+            first_query = params.urlencode()
+            if page_obj.has_next:
+                params['cursor'] = page_obj.next_cursor
+                next_query = params.urlencode()
 
         return render(request, 'core/home.html', {
-            'listings': page_obj.object_list,
+            'listings': attach_cache_versions(page_obj.object_list) if page_obj is not None else [],
             'page_obj': page_obj,
+            'next_query': next_query,
+            'first_query': first_query,
             'cities': cities,
             'destination': destination,
             'check_in': check_in_str,
             'check_out': check_out_str,
             'guests': guests,
             'q': q,  # keep if you want the keyword box too
+            'near': request.GET.get('near', '').strip(),
+            'radius': geo_radius(request.GET),
+            'radius_choices': RADIUS_CHOICES,
+            'places': PLACE_NAMES,
+            'bbox': request.GET.get('bbox', '').strip(),
         })
     except Exception as e:
         # Catch any other unexpected errors and return a safe response
@@ -112,7 +99,6 @@ def home(request):
         })
 
 
-
 # Auth
 
 def signup(request):
@@ -126,7 +112,8 @@ def signup(request):
             profile = user.profile
             profile.role = form.cleaned_data['role']
             profile.save()
-            login(request, user)
+            # two backends are configured (settings.AUTHENTICATION_BACKENDS), so name ours
+            login(request, user, backend='core.backends.ProfileBackend')
             messages.success(request, 'Welcome to Rental Egypt!')
             return redirect('home')
     else:
@@ -147,15 +134,9 @@ def create_listing(request):
             listing = form.save(commit=False)
             listing.host = request.user
             listing.save()
-            # handle optional gallery images at creation
+            # handle optional gallery images at creation (uploaded in the background)
             images = request.FILES.getlist('images')
-            if images:
-                for f in images[:10]:
-                    ListingImage.objects.create(
-                        listing=listing,
-                        image=f,
-                        sort_order=ListingImage.compute_next_order(listing),
-                    )
+            queue_listing_images(listing, images[:10])
             messages.success(request, 'Listing created!')
             return redirect('listing_detail', pk=listing.pk)
     else:
@@ -165,8 +146,12 @@ def create_listing(request):
 
 
 
+@read_from_replica
 def listing_detail(request, pk):
+    # images are loaded inside the cached gallery fragment, only on a cache miss
     listing = get_object_or_404(Listing, pk=pk)
+    listing.cache_version = listing_versions([listing.pk])[listing.pk]
+    is_host = request.user.is_authenticated and listing.host_id == request.user.id
     form = BookingForm()
     image_form = ListingImageUploadForm()
     if request.method == 'POST':
@@ -178,20 +163,26 @@ def listing_detail(request, pk):
             booking = form.save(commit=False)
             booking.listing = listing
             booking.guest = request.user
-            # Ensure no overlap with approved bookings
-            overlaps = Booking.objects.filter(
+            # Ensure no overlap with approved bookings, from their booked
+            # nights: the cached calendar may lag a commit, so it is only shown
+            overlaps = BookedNight.objects.filter(
                 listing=listing,
-                status=Booking.Status.APPROVED,
-                check_in__lt=booking.check_out,
-                check_out__gt=booking.check_in,
+                night__gte=booking.check_in,
+                night__lt=booking.check_out,
             ).exists()
             if overlaps:
                 messages.error(request, 'Selected dates are unavailable.')
             else:
                 booking.save()
+                enqueue(notify_booking_request, booking_id=booking.pk)
                 messages.success(request, 'Booking request sent!')
                 return redirect('my_bookings')
-    return render(request, 'core/listing_detail.html', { 'listing': listing, 'form': form, 'image_form': image_form })
+    return render(request, 'core/listing_detail.html', {
+        'listing': listing, 'form': form, 'image_form': image_form, 'is_host': is_host,
+        # called by the template only when the calendar fragment is not cached
+        'availability': partial(availability_calendar, listing.pk), 'today': date.today(),
+        'uploads': partial(upload_status, listing.pk),  # host only
+    })
 
 
 @login_required
@@ -204,15 +195,8 @@ def upload_listing_images(request, pk):
         form = ListingImageUploadForm(request.POST, request.FILES)
         if form.is_valid():
             files = form.cleaned_data['images']
-            created = 0
-            for f in files:
-                ListingImage.objects.create(
-                    listing=listing,
-                    image=f,
-                    sort_order=ListingImage.compute_next_order(listing),
-                )
-                created += 1
-            messages.success(request, f'Uploaded {created} image(s).')
+            queued = queue_listing_images(listing, files)
+            messages.success(request, f'Uploading {queued} image(s). They will appear in the gallery once processed.')
         else:
             for err in form.errors.get('__all__', []):
                 messages.error(request, err)
@@ -234,20 +218,28 @@ def reorder_listing_images(request, pk):
     except ValueError:
         messages.error(request, 'Invalid order data.')
         return redirect('listing_detail', pk=pk)
-    # Fetch only images of this listing and ensure ids match
-    images = list(ListingImage.objects.filter(listing=listing, id__in=image_ids))
-    if len(images) != len(image_ids):
+    # one atomic UPDATE; rejects ids that aren't images of this listing
+    if not reorder_images(listing, image_ids):
         messages.error(request, 'Some images were not found for this listing.')
         return redirect('listing_detail', pk=pk)
-    # Apply sort order according to provided list
-    id_to_image = {img.id: img for img in images}
-    for idx, img_id in enumerate(image_ids):
-        img = id_to_image[img_id]
-        img.sort_order = idx
-        img.is_cover = (idx == 0)
-        img.save(update_fields=['sort_order', 'is_cover'])
     messages.success(request, 'Image order updated. Cover set to first image.')
     return redirect('listing_detail', pk=pk)
+
+@require_POST
+@login_required
+def reorder_listing_images_json(request, pk):
+    """Drag-and-drop endpoint: POST {"order": [image ids]}; first becomes the cover."""
+    listing = get_object_or_404(Listing, pk=pk)
+    if request.user.profile.role != Profile.Role.HOST or listing.host_id != request.user.id:
+        return JsonResponse({'error': 'Only the host can modify this listing.'}, status=403)
+    try:
+        image_ids = [int(x) for x in json.loads(request.body)['order']]
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'Invalid order data.'}, status=400)
+    if not reorder_images(listing, image_ids):
+        return JsonResponse({'error': 'Some images were not found for this listing.'}, status=400)
+    return JsonResponse({'order': image_ids, 'cover': image_ids[0]})
+
 @login_required
 def set_cover_image(request, pk, image_id):
     listing = get_object_or_404(Listing, pk=pk)
@@ -255,9 +247,7 @@ def set_cover_image(request, pk, image_id):
         messages.error(request, 'Only the host can modify this listing.')
         return redirect('listing_detail', pk=pk)
     img = get_object_or_404(ListingImage, pk=image_id, listing=listing)
-    ListingImage.objects.filter(listing=listing, is_cover=True).update(is_cover=False)
-    img.is_cover = True
-    img.save(update_fields=['is_cover'])
+    set_cover(listing, img.pk)
     messages.success(request, 'Cover photo updated.')
     return redirect('listing_detail', pk=pk)
 
@@ -272,6 +262,7 @@ def delete_listing_image(request, pk, image_id):
     messages.info(request, 'Image deleted.')
     return redirect('listing_detail', pk=pk)
 
+@read_from_replica
 @login_required
 def my_listings(request):
     if request.user.profile.role != Profile.Role.HOST:
@@ -280,17 +271,84 @@ def my_listings(request):
     listings = (Listing.objects
                 .filter(host=request.user)
                 .order_by('-created_at')
-                .prefetch_related('images'))
-    return render(request, 'core/my_listings.html', { 'listings': listings })
-
+                .select_related('stats'))
+    # dashboard counters come from ListingStats instead of per-listing aggregates
+    listings = attach_listing_stats(attach_cache_versions(listings))
+    return render(request, 'core/my_listings.html', { 'listings': listings, 'occupancy_days': OCCUPANCY_DAYS })
+
+def _filter_host_bookings(bookings, params):
+    status = params.get('status', '')
+    if status in Booking.Status.values:
+        bookings = bookings.filter(status=status)
+    listing_id = params.get('listing', '')
+    if listing_id.isdigit():
+        bookings = bookings.filter(listing_id=int(listing_id))
+    return bookings, status, listing_id
+
+@read_from_replica
 @login_required
 def host_bookings(request):
     if request.user.profile.role != Profile.Role.HOST:
         messages.error(request, 'Only hosts can view this page.')
         return redirect('home')
-    bookings = Booking.objects.filter(listing__host=request.user).select_related('listing', 'guest')
-    return render(request, 'core/host_bookings.html', { 'bookings': bookings })
+    bookings = (Booking.objects
+                .filter(listing__host=request.user)
+                .select_related('listing', 'guest')
+                .only('id', 'check_in', 'check_out', 'guests_count', 'status', 'created_at',
+                      'listing__id', 'listing__title', 'guest__id', 'guest__username'))
+    bookings, status, listing_id = _filter_host_bookings(bookings, request.GET)
+    page_obj = KeysetPaginator(bookings, HOST_BOOKINGS_PAGE_SIZE).get_page(request.GET.get('cursor'))
+
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    first_query = params.urlencode()
+    next_query = ''
+    if page_obj.has_next:
+        params['cursor'] = page_obj.next_cursor
+        next_query = params.urlencode()
+    return render(request, 'core/host_bookings.html', {
+        'bookings': page_obj.object_list,
+        'page_obj': page_obj,
+        'first_query': first_query,
+        'next_query': next_query,
+        'statuses': Booking.Status.choices,
+        'status': status,
+        'host_listings': (Listing.objects.filter(host=request.user).order_by('title')
+                          .values_list('id', 'title', 'stats__pending_count')),
+        'listing_id': listing_id,
+    })
+
+def _download(request, name, columns, rows):
+    fmt = 'jsonl' if request.GET.get('format') == 'jsonl' else 'csv'
+    encode, content_type = ENCODERS[fmt]
+    response = streaming_response(request, encode(columns, rows), content_type)
+    response['Content-Disposition'] = f'attachment; filename="{name}-{date.today()}.{fmt}"'
+    return response
+
+@read_from_replica
+@login_required
+def export_bookings(request):
+    """The host's bookings (same filters as host_bookings) as a streamed CSV, or JSONL with ?format=jsonl."""
+    if request.user.profile.role != Profile.Role.HOST:
+        messages.error(request, 'Only hosts can view this page.')
+        return redirect('home')
+    bookings = Booking.objects.filter(listing__host=request.user)
+    bookings, _, _ = _filter_host_bookings(bookings, request.GET)
+    # rows are read while the response streams, after read_from_replica has
+    # returned, so fix the database now
+    return _download(request, 'bookings', BOOKING_COLUMNS, booking_rows(bookings.using(bookings.db)))
+
+@read_from_replica
+@login_required
+def export_listings(request):
+    """The host's listings in the `import_listings` format, streamed as CSV or JSONL."""
+    if request.user.profile.role != Profile.Role.HOST:
+        messages.error(request, 'Only hosts can view this page.')
+        return redirect('home')
+    listings = Listing.objects.filter(host=request.user)
+    return _download(request, 'listings', LISTING_COLUMNS, listing_rows(listings.using(listings.db), request.build_absolute_uri))
 
+@read_from_replica
 @login_required
 def my_bookings(request):
     bookings = Booking.objects.filter(guest=request.user).select_related('listing')
@@ -303,19 +361,38 @@ def approve_booking(request, pk):
         messages.error(request, 'Only hosts can modify bookings.')
         return redirect('home')
     booking = get_object_or_404(Booking, pk=pk, listing__host=request.user)
-    # final overlap check before approval
-    overlaps = Booking.objects.filter(
-        listing=booking.listing,
-        status=Booking.Status.APPROVED,
-        check_in__lt=booking.check_out,
-        check_out__gt=booking.check_in,
-    ).exclude(pk=booking.pk).exists()
-    if overlaps:
+    # the BookedNight unique constraint rejects overlaps atomically
+    if booking.approve():
+        enqueue(notify_booking_status, booking_id=booking.pk)
+        messages.success(request, 'Booking approved.')
+    else:
         messages.error(request, 'Selected dates are unavailable.')
+    return redirect('host_bookings')
+
+@require_POST
+@login_required
+def bulk_booking_action(request):
+    if request.user.profile.role != Profile.Role.HOST:
+        messages.error(request, 'Only hosts can modify bookings.')
+        return redirect('home')
+    ids = [int(x) for x in request.POST.getlist('booking_ids') if x.isdigit()]
+    action = request.POST.get('action')
+    if not ids:
+        messages.error(request, 'Select at least one booking.')
+    elif action == 'approve':
+        approved, declined = approve_bookings(request.user, ids)
+        skipped = len(ids) - len(approved) - len([pk for pk in declined if pk in ids])
+        messages.success(request, f'Approved {len(approved)} booking(s); auto-declined {len(declined)} conflicting request(s).')
+        if skipped:
+            messages.warning(request, f'{skipped} selected booking(s) were not pending or their dates are unavailable.')
+    elif action == 'decline':
+        declined = decline_bookings(request.user, ids)
+        messages.info(request, f'Declined {len(declined)} booking(s).')
     else:
-        booking.status = Booking.Status.APPROVED
-        booking.save()
-        messages.success(request, 'Booking approved.')
+        messages.error(request, 'Unknown action.')
+    next_url = request.POST.get('next', '')
+    if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
     return redirect('host_bookings')
 
 @require_POST
@@ -327,5 +404,6 @@ def decline_booking(request, pk):
     booking = get_object_or_404(Booking, pk=pk, listing__host=request.user)
     booking.status = Booking.Status.DECLINED
     booking.save()
+    enqueue(notify_booking_status, booking_id=booking.pk)
     messages.info(request, 'Booking declined.')
     return redirect('host_bookings')
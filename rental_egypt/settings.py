@@ -1,6 +1,8 @@
 from pathlib import Path
 import os
+import warnings
 import dj_database_url
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 BASE_DIR = Path(__file__).resolve().parent.parent
 load_dotenv(BASE_DIR / ".env")
@@ -26,8 +28,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.PerfMiddleware',  # no-op unless PERF_INSTRUMENTATION=1
+    'core.middleware.ReplicaStickinessMiddleware',  # no-op unless DATABASE_REPLICA_URL is set
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'core.middleware.StaticFilesMiddleware',  # WhiteNoise, async-capable
+    'core.middleware.PreloadHeadersMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -36,14 +41,39 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Per-view query/timing instrumentation (core/middleware.py, `manage.py perfreport`)
+PERF_INSTRUMENTATION = os.environ.get('PERF_INSTRUMENTATION', '0') == '1'
+PERF_LOG_FILE = os.environ.get('PERF_LOG_FILE', str(BASE_DIR / 'perf.jsonl'))
+PERF_ENFORCE_BUDGETS = os.environ.get('PERF_ENFORCE_BUDGETS', '0') == '1'
+PERF_QUERY_BUDGETS = {
+    'home': 6,
+    'listings_feed': 7,
+    'api_listing_detail': 4,
+    'api_listing_availability': 4,
+    'listing_detail': 8,
+    'my_listings': 8,
+    'host_bookings': 8,
+    'my_bookings': 6,
+}
+
 ROOT_URLCONF = 'rental_egypt.urls'
 
+# Templates are compiled once per process by the cached loader (with DEBUG the
+# autoreloader resets it when a template file changes). TEMPLATE_CACHE=0
+# recompiles on every render, for comparison in `manage.py bench_templates`.
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+if os.environ.get('TEMPLATE_CACHE', '1') == '1':
+    TEMPLATE_LOADERS = [('django.template.loaders.cached.Loader', TEMPLATE_LOADERS)]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [BASE_DIR / 'core' / 'templates'],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': TEMPLATE_LOADERS,
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -62,9 +92,82 @@ DATABASES = {
         'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
+# ASGI deployments (gunicorn + uvicorn workers, see render.yaml) set ASYNC_VIEWS=1
+# so home, listing_detail and the JSON API are served by core/async_views.py.
+ASYNC_VIEWS = os.environ.get('ASYNC_VIEWS', '0') == '1'
+
+# Connections persist for DB_CONN_MAX_AGE seconds and are health-checked before
+# reuse. Async views run queries on per-request threads, which would each keep
+# a connection open, so ASGI closes them after every request; put PgBouncer in
+# front (DATABASE_POOL=pgbouncer) to make that cheap. In transaction pooling
+# mode server-side cursors can't outlive a transaction, so they are disabled.
+DB_CONN_MAX_AGE = 0 if ASYNC_VIEWS else int(os.environ.get('DB_CONN_MAX_AGE', '600'))
+DATABASE_POOL = os.environ.get('DATABASE_POOL', '')
+
+
+def _database(url):
+    db = dj_database_url.parse(url, conn_max_age=DB_CONN_MAX_AGE, conn_health_checks=True,
+                               ssl_require=not DEBUG and not url.startswith('sqlite'))
+    if DATABASE_POOL == 'pgbouncer':
+        db['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return db
+
+
 # Override with DATABASE_URL in production (for Heroku)
 if os.environ.get('DATABASE_URL'):
-    DATABASES['default'] = dj_database_url.config(conn_max_age=600, ssl_require=not DEBUG)
+    DATABASES['default'] = _database(os.environ['DATABASE_URL'])
+
+# Optional read replica: views wrapped with core.routers.read_from_replica read
+# from it; a client that just wrote is pinned to the primary for
+# REPLICA_STICKY_SECONDS (longer than the expected replication lag).
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', '15'))
+if os.environ.get('DATABASE_REPLICA_URL'):
+    DATABASES['replica'] = _database(os.environ['DATABASE_REPLICA_URL'])
+    # tests see the primary's data through the replica alias
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+# Cache: CACHE_URL=redis://host:6379/0 (requires the `redis` package) or
+# file:///path, shared by every web and worker process; local memory otherwise.
+# The version counters in core.caching are bumped by whichever process changes
+# a listing (runworker, import_listings, ...), so a per-process cache would
+# keep serving stale pages elsewhere. Without DEBUG and a shared cache the app
+# still starts on local memory, but warns, unless CACHE_URL=locmem:// says a
+# single process with no worker is intended.
+CACHE_URL = os.environ.get('CACHE_URL', '')
+SHARED_CACHE = CACHE_URL.startswith(('redis://', 'rediss://', 'file://'))
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': CACHE_URL}}
+elif CACHE_URL.startswith('file://'):
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': CACHE_URL[len('file://'):]}}
+else:
+    if not (DEBUG or CACHE_URL == 'locmem://'):
+        warnings.warn(
+            'CACHE_URL names no shared cache (redis://... or file://...), so each process caches on its own '
+            'and pages may stay stale after changes made in another (set CACHE_URL=locmem:// if that is intended).',
+            RuntimeWarning,
+        )
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'rental-egypt'}}
+RESPONSE_CACHE_TIMEOUT = int(os.environ.get('RESPONSE_CACHE_TIMEOUT', '300'))
+
+# Sessions: SESSION_BACKEND=cached_db (reads hit the cache, writes go through to
+# the database), cache, signed_cookies (no server-side storage) or db. The two
+# cache-backed engines need the shared CACHE_URL: in a per-process cache a
+# logout only ends the session in the process that served it. So the default
+# is cached_db with a shared cache and db without one.
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'cached_db' if SHARED_CACHE else 'db')
+if SESSION_BACKEND in ('cache', 'cached_db') and not (SHARED_CACHE or DEBUG):
+    raise ImproperlyConfigured(
+        f'SESSION_BACKEND={SESSION_BACKEND} needs a shared CACHE_URL (redis://... or file://...).'
+    )
+SESSION_ENGINE = 'django.contrib.sessions.backends.' + SESSION_BACKEND
+
+# The session user is loaded with their profile in one query. ModelBackend
+# stays listed so sessions created before the switch remain valid.
+AUTHENTICATION_BACKENDS = [
+    'core.backends.ProfileBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
 
 AUTH_PASSWORD_VALIDATORS = [
     { 'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator' },
@@ -82,6 +185,10 @@ STATIC_URL = '/static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 STATICFILES_DIRS = [BASE_DIR / 'core' / 'static']
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+# Bootstrap is vendored under core/static/vendor, so pages make no third-party
+# requests. collectstatic writes content-hashed copies (plus gzip/brotli) and
+# WhiteNoise serves those with `Cache-Control: max-age=315360000, public,
+# immutable` (unhashed URLs get WhiteNoise's short default max-age).
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -105,6 +212,29 @@ if _cloud_name and _cloud_key and _cloud_secret:
     }
 
 MEDIA_URL = '/media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Gallery upload pipeline (core/uploads.py). Set IMAGE_UPLOAD_BACKEND to
+# core.uploads.local_backend to store files under MEDIA_ROOT instead of Cloudinary.
+# Uploads are stored by `manage.py runworker`; IMAGE_UPLOAD_ASYNC=0 stores them
+# during the request instead, for running without a worker.
+IMAGE_UPLOAD_BACKEND = os.environ.get('IMAGE_UPLOAD_BACKEND', 'core.uploads.cloudinary_backend')
+IMAGE_UPLOAD_ASYNC = os.environ.get('IMAGE_UPLOAD_ASYNC', '1') == '1'
+# Files wait here until the worker stores them, so the web service and the
+# worker must both reach it: the local default only works on one machine.
+# Render sets cloudinary_storage.storage.RawMediaCloudinaryStorage.
+IMAGE_UPLOAD_STAGING_STORAGE = os.environ.get('IMAGE_UPLOAD_STAGING_STORAGE',
+                                              'django.core.files.storage.FileSystemStorage')
+
+# Email (booking notifications are sent from background jobs)
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'Rental Egypt <no-reply@rentalegypt.com>')
+
+# Background jobs (core/jobs.py, run with `manage.py runworker`)
+JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', '5'))
+JOB_BACKOFF_SECONDS = int(os.environ.get('JOB_BACKOFF_SECONDS', '10'))
+JOB_LOCK_TIMEOUT = int(os.environ.get('JOB_LOCK_TIMEOUT', '600'))  # seconds without a heartbeat before a RUNNING job is requeued
+JOB_RETENTION_DAYS = int(os.environ.get('JOB_RETENTION_DAYS', '7'))  # DONE jobs older than this are deleted
 
 # Security settings suitable for production when DEBUG is False
 # Only redirect to HTTPS if we're sure we're behind a proxy (Render)